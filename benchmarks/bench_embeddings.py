@@ -0,0 +1,41 @@
+# benchmarks/bench_embeddings.py
+"""
+Embedding throughput against the local fake server, sequential vs batched
+concurrent requests.
+
+    python -m benchmarks.bench_embeddings --chunks 5000
+"""
+import argparse
+import time
+
+from benchmarks.fake_embedding_server import FakeEmbeddingServer
+from benchmarks.fakes import synthetic_texts
+from models.batched_embeddings import BatchedOpenAIEmbeddings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--max-inflight", type=int, default=6)
+    args = parser.parse_args()
+
+    server = FakeEmbeddingServer(("127.0.0.1", 0), latency=args.latency, max_inflight=args.max_inflight).start()
+    texts = synthetic_texts(args.chunks)
+    print(f"{args.chunks} chunks, server latency {args.latency * 1000:.0f} ms, max in-flight {args.max_inflight}")
+    for concurrency, batch_items in ((1, 16), (1, 512), (4, 512), (8, 128), (16, 128)):
+        emb = BatchedOpenAIEmbeddings(api_key="fake", base_url=server.base_url, concurrency=concurrency, max_batch_items=batch_items)
+        t0 = time.perf_counter()
+        vectors = emb.embed_documents(texts)
+        elapsed = time.perf_counter() - t0
+        assert len(vectors) == len(texts)
+        print(
+            f"concurrency={concurrency:<3} batch_items={batch_items:<4} "
+            f"{len(texts) / elapsed:9.1f} chunks/s  requests={emb.requests:<5} retries={emb.retries}"
+        )
+    print(f"server: {server.requests} requests, {server.rejected} rejected with 429")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
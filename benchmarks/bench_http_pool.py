@@ -0,0 +1,46 @@
+# benchmarks/bench_http_pool.py
+"""
+Connection reuse check against the local fake embedding server: a fresh
+OpenAI client per call (old Whisper path) vs the pooled registry client.
+
+    python -m benchmarks.bench_http_pool --calls 200
+"""
+import argparse
+import time
+
+from openai import OpenAI
+
+from benchmarks.fake_embedding_server import FakeEmbeddingServer
+from models.http_pool import get_http_client, pool_stats
+
+
+def _run(make_client, base_url, calls):
+    t0 = time.perf_counter()
+    for i in range(calls):
+        make_client().embeddings.create(model="fake", input=[f"ping {i}"])
+    return (time.perf_counter() - t0) / calls * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=200)
+    args = parser.parse_args()
+    server = FakeEmbeddingServer(("127.0.0.1", 0), latency=0.0, max_inflight=64).start()
+    url = server.base_url
+
+    fresh = _run(lambda: OpenAI(api_key="fake", base_url=url), url, args.calls)
+    shared = OpenAI(api_key="fake", base_url=url, http_client=get_http_client())
+    pooled = _run(lambda: shared, url, args.calls)
+
+    print(f"fresh client per call: {fresh:7.2f} ms/call")
+    print(f"pooled shared client:  {pooled:7.2f} ms/call")
+    stats = pool_stats()
+    print(f"pool: {stats}")
+    # Sequential calls on a keep-alive pool should never need more than one connection.
+    assert stats["requests"] == args.calls, stats
+    assert stats["sync"]["connections"] in (None, 1), stats
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+# benchmarks/bench_index_types.py
+"""
+Recall@k vs latency vs memory for each FAISS index kind on synthetic
+clustered vectors, sweeping the nprobe / efSearch knobs.
+
+    python -m benchmarks.bench_index_types --sizes 100000 1000000 --dim 384
+"""
+import argparse
+import time
+
+import faiss
+import numpy as np
+
+from utils.faiss_index import apply_search_params, build_index
+
+
+def _dataset(n: int, dim: int, queries: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((max(16, n // 1000), dim)).astype("float32")
+    assign = rng.integers(0, len(centers), n)
+    data = centers[assign] + 0.3 * rng.standard_normal((n, dim)).astype("float32")
+    q_assign = rng.integers(0, len(centers), queries)
+    q = centers[q_assign] + 0.3 * rng.standard_normal((queries, dim)).astype("float32")
+    return np.ascontiguousarray(data), np.ascontiguousarray(q)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    return float(np.mean([len(set(f) & set(t)) / len(t) for f, t in zip(found, truth)]))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100_000])
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        data, queries = _dataset(n, args.dim, args.queries)
+        truth = None
+        print(f"\n{n} vectors, dim {args.dim}")
+        print(f"{'kind':<9} {'knob':<12} {'build s':>8} {'recall@' + str(args.k):>10} {'ms/query':>9} {'MB':>8}")
+        for kind in ("flat", "hnsw", "ivf_flat", "ivf_pq"):
+            t0 = time.perf_counter()
+            index = build_index(kind, data)
+            build_s = time.perf_counter() - t0
+            mb = len(faiss.serialize_index(index)) / 1e6
+            if kind == "flat":
+                knobs = [("-", None)]
+            elif kind == "hnsw":
+                knobs = [(f"efSearch={e}", {"ef_search": e}) for e in (16, 64, 256)]
+            else:
+                knobs = [(f"nprobe={p}", {"nprobe": p}) for p in (4, 16, 64)]
+            for label, params in knobs:
+                if params:
+                    apply_search_params(index, **params)
+                t0 = time.perf_counter()
+                _, found = index.search(queries, args.k)
+                ms = (time.perf_counter() - t0) * 1000 / len(queries)
+                if truth is None:
+                    truth = found
+                print(f"{kind:<9} {label:<12} {build_s:8.1f} {_recall(found, truth):10.3f} {ms:9.3f} {mb:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
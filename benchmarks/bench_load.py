@@ -0,0 +1,252 @@
+# benchmarks/bench_load.py
+"""
+Offline end-to-end load test of the chat pipeline. Drives the code paths of
+streamlit_app.py headlessly: load_documents_from_file -> build_vector_store,
+then per turn query_vector_store -> build_context -> conversation history ->
+llm chat_response (or stream_chat with --stream) -> save_message, across N
+concurrent sessions. "web:" turns go through utils.web_search.
+
+The stand-ins are deterministic and local:
+- FakeChatModel replaces the OpenAI/Groq chat model.
+- HashEmbeddings replaces the embeddings.
+- The stub SerpAPI/CSE server from check_web_search answers web searches.
+
+Stage timings come from the app's own tracing spans. The report is JSON with:
+- throughput;
+- exact p50/p95/p99 per stage;
+- peak RSS.
+
+Pass --baseline to print p95 changes against an earlier report.
+
+    python -m benchmarks.bench_load --sessions 16 --turns 10 --json load.json
+    python -m benchmarks.bench_load --sessions 16 --turns 10 --baseline load.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.check_web_search import StubSearchServer
+from benchmarks.fakes import FakeChatModel, HashEmbeddings, synthetic_texts
+
+SYSTEM_PROMPT = "You are a helpful assistant. Use retrieved docs and web search when required."
+
+
+def _peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in KiB on Linux and bytes on macOS.
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(sorted_values, q: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, int(round(q * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def stage_stats(spans) -> dict:
+    by_stage = {}
+    for s in spans:
+        by_stage.setdefault(s["stage"], []).append(s["duration_s"] * 1000)
+    out = {}
+    for stage, values in sorted(by_stage.items()):
+        values.sort()
+        out[stage] = {
+            "count": len(values),
+            "p50_ms": round(_percentile(values, 0.50), 3),
+            "p95_ms": round(_percentile(values, 0.95), 3),
+            "p99_ms": round(_percentile(values, 0.99), 3),
+            "mean_ms": round(sum(values) / len(values), 3),
+            "max_ms": round(values[-1], 3),
+        }
+    return out
+
+
+def _configure_env(tmp: str, server: StubSearchServer, args):
+    # Configuration is read at import time, so everything points at the temp
+    # dir and the stub before the app modules are imported.
+    os.environ.update({
+        "VECTOR_STORE_DIR": os.path.join(tmp, "vector_store"),
+        "CHAT_MEMORY_DB": os.path.join(tmp, "chat_memory.sqlite"),
+        "CHAT_MEMORY_JSON_DIR": os.path.join(tmp, "chat_backups"),
+        "CHAT_MEMORY_WRITE_BEHIND": "1" if args.write_behind else "0",
+        "EMBEDDING_CACHE_ENABLED": "0",
+        "SERPAPI_KEY": "stub", "GOOGLE_CSE_KEY": "stub", "GOOGLE_CX": "stub",
+        "SERPAPI_URL": server.base_url + "/serpapi", "GOOGLE_CSE_URL": server.base_url + "/cse",
+        "TRACING_ENABLED": "1",
+        # Keep every span so percentiles are exact rather than bucket estimates.
+        "TRACING_RECENT_SPANS": str(10_000_000),
+    })
+
+
+def run(args) -> dict:
+    server = StubSearchServer(("127.0.0.1", 0), latency=args.web_latency).start()
+    tmp = tempfile.mkdtemp(prefix="bench_load_")
+    _configure_env(tmp, server, args)
+
+    from config.config import RAG_TOP_K
+    from models.llm import chat_response, stream_chat, to_langchain_messages
+    from utils import conversation, memory, rag_utils, tracing
+    from utils.context_builder import build_context, count_tokens
+    from utils.web_search import web_search
+
+    memory.init_memory()
+    chat_model = FakeChatModel(ttft=args.chat_ttft, tokens=args.reply_tokens, token_latency=args.token_latency)
+    summarizer = conversation.llm_summarizer(chat_model)
+    rag_utils.get_vector_store_handle(rag_utils.VECTOR_STORE_DIR, embedding_factory=lambda: HashEmbeddings(args.dim))
+
+    # Setup: documents on disk -> loaded -> indexed, as the upload flow does.
+    doc_dir = os.path.join(tmp, "docs")
+    os.makedirs(doc_dir)
+    paths = []
+    for i, text in enumerate(synthetic_texts(args.docs, words_per_text=args.doc_words)):
+        path = os.path.join(doc_dir, f"doc_{i}.txt")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(text)
+        paths.append(path)
+    setup_t0 = time.perf_counter()
+    docs = []
+    for path in paths:
+        with tracing.span("load_documents_from_file"):
+            docs.extend(rag_utils.load_documents_from_file(path))
+    with tracing.span("build_vector_store"):
+        rag_utils.build_vector_store(docs)
+    setup_s = time.perf_counter() - setup_t0
+
+    errors = []
+    errors_lock = threading.Lock()
+    # Time to first token is a recorded value rather than a span; kept here for the report.
+    ttfts = []
+
+    def turn(session_id: str, text: str, web: bool):
+        with tracing.span("chat.turn"):
+            user_id = memory.save_message(session_id, "user", f"web: {text}" if web else text)
+            if web:
+                res = web_search(text, num_results=3)
+                if res.get("error"):
+                    raise RuntimeError(f"web search: {res['error']}")
+                answer = "\n".join(r["snippet"] for r in res.get("results", []))
+                memory.save_message(session_id, "assistant", answer)
+                return
+            hits = rag_utils.query_vector_store(text, k=RAG_TOP_K)
+            with tracing.span("rag.build_context"):
+                context = build_context(hits)["context"] if hits else ""
+            composed = f"Context:\n{context}\n\nQuestion: {text}" if context else text
+            history = conversation.build_history(session_id, before_id=user_id, reserved_tokens=count_tokens(SYSTEM_PROMPT + composed))
+            messages = history["messages"] + [{"role": "user", "content": composed}]
+            if args.stream:
+                stats = {}
+                with tracing.span("llm.stream"):
+                    reply = "".join(stream_chat(chat_model, to_langchain_messages(messages, SYSTEM_PROMPT), stats))
+                if stats.get("ttft_s") is not None:
+                    tracing.record("llm.ttft", stats["ttft_s"])
+                    ttfts.append({"stage": "llm.ttft", "duration_s": stats["ttft_s"]})
+            else:
+                reply = chat_response(chat_model, messages, SYSTEM_PROMPT)
+            if reply.startswith("LLM error"):
+                raise RuntimeError(reply)
+            memory.save_message(session_id, "assistant", reply)
+            conversation.update_summary(session_id, summarizer)
+
+    def session(index: int) -> int:
+        rng = random.Random(args.seed + index)
+        session_id = memory.new_session_id()
+        questions = synthetic_texts(args.turns, words_per_text=8, seed=args.seed * 1000 + index)
+        done = 0
+        for q in questions:
+            web = rng.random() < args.web_fraction
+            try:
+                turn(session_id, q, web)
+                done += 1
+            except Exception as e:
+                with errors_lock:
+                    errors.append(f"{type(e).__name__}: {e}")
+        return done
+
+    rss_before_load = _peak_rss_mb()
+    load_t0 = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessions, thread_name_prefix="session") as pool:
+        completed = sum(pool.map(session, range(args.sessions)))
+    memory.flush()
+    load_s = time.perf_counter() - load_t0
+
+    server.shutdown()
+    return {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("json", "baseline")},
+        "setup": {"documents": len(paths), "seconds": round(setup_s, 3)},
+        "load": {
+            "turns": args.sessions * args.turns,
+            "completed": completed,
+            "errors": len(errors),
+            "error_samples": errors[:5],
+            "seconds": round(load_s, 3),
+            "turns_per_s": round(completed / load_s, 2) if load_s > 0 else None,
+        },
+        "stages": stage_stats(tracing.recent_spans() + ttfts),
+        "peak_rss_mb": round(_peak_rss_mb(), 1),
+        "peak_rss_setup_mb": round(rss_before_load, 1),
+    }
+
+
+def _print_report(report: dict, baseline: dict = None):
+    load = report["load"]
+    print(f"{load['completed']}/{load['turns']} turns in {load['seconds']:.2f}s -> {load['turns_per_s']} turns/s "
+          f"({report['config']['sessions']} sessions), {load['errors']} error(s); peak RSS {report['peak_rss_mb']} MB")
+    base = (baseline or {}).get("stages", {})
+    print(f"\n{'stage':<28}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" + ("   p95 vs baseline" if base else ""))
+    for stage, s in report["stages"].items():
+        line = f"{stage:<28}{s['count']:>7}{s['p50_ms']:>10.2f}{s['p95_ms']:>10.2f}{s['p99_ms']:>10.2f}"
+        if stage in base and base[stage]["p95_ms"]:
+            line += f"   {(s['p95_ms'] / base[stage]['p95_ms'] - 1) * 100:+.0f}%"
+        print(line)
+    if baseline:
+        old = baseline["load"].get("turns_per_s") or 0
+        if old:
+            print(f"\nthroughput vs baseline: {(load['turns_per_s'] / old - 1) * 100:+.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=10, help="turns per session")
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--doc-words", type=int, default=400)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--chat-ttft", type=float, default=0.05, help="fake chat model time to first token (s)")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="fake chat model seconds per token")
+    parser.add_argument("--reply-tokens", type=int, default=60)
+    parser.add_argument("--web-fraction", type=float, default=0.1, help="share of turns that are 'web:' searches")
+    parser.add_argument("--web-latency", type=float, default=0.05)
+    parser.add_argument("--stream", action="store_true", help="use stream_chat like the UI instead of chat_response")
+    parser.add_argument("--write-behind", action="store_true", help="CHAT_MEMORY_WRITE_BEHIND=1")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", default=None, help="write the report here (default: stdout)")
+    parser.add_argument("--baseline", default=None, help="earlier report to compare p95 and throughput against")
+    args = parser.parse_args()
+
+    report = run(args)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        _print_report(report, baseline)
+    else:
+        if baseline:
+            _print_report(report, baseline)
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
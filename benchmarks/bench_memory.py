@@ -0,0 +1,87 @@
+# benchmarks/bench_memory.py
+"""
+Chat memory store at scale: seeds N messages across many sessions, then
+times per-session loads, list_sessions and concurrent writers with
+per-message commits vs the write-behind group commit.
+
+    python -m benchmarks.bench_memory --messages 1000000 --sessions 20000 --writers 16
+"""
+import argparse
+import os
+import statistics
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+
+def _seed(memory, messages: int, sessions: int):
+    ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    base = datetime(2024, 1, 1)
+    conn = memory.get_conn()
+    batch = []
+    for i in range(messages):
+        ts = (base + timedelta(seconds=i)).isoformat()
+        batch.append((str(uuid.uuid4()), ids[i % sessions], "user" if i % 2 else "assistant", f"message {i} " * 8, ts))
+        if len(batch) == 50000:
+            memory._insert_messages(conn, batch)
+            conn.commit()
+            batch = []
+    if batch:
+        memory._insert_messages(conn, batch)
+        conn.commit()
+    return ids
+
+
+def _writers(memory, writers: int, per_writer: int) -> float:
+    def run(i):
+        sid = f"bench-writer-{i}"
+        for j in range(per_writer):
+            memory.save_message(sid, "user", f"hello {j}")
+
+    threads = [threading.Thread(target=run, args=(i,)) for i in range(writers)]
+    t0 = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    memory.flush()
+    return writers * per_writer / (time.perf_counter() - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=1_000_000)
+    parser.add_argument("--sessions", type=int, default=20_000)
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--per-writer", type=int, default=200)
+    args = parser.parse_args()
+
+    tmp = tempfile.mkdtemp()
+    os.environ["CHAT_MEMORY_DB"] = os.path.join(tmp, "bench.sqlite")
+    os.environ["CHAT_MEMORY_JSON_DIR"] = os.path.join(tmp, "json")
+    from utils import memory
+
+    t0 = time.perf_counter()
+    ids = _seed(memory, args.messages, args.sessions)
+    print(f"seeded {args.messages} messages / {args.sessions} sessions in {time.perf_counter() - t0:.1f}s")
+
+    samples = []
+    for sid in ids[:: max(1, len(ids) // 200)]:
+        t0 = time.perf_counter()
+        memory.load_session_messages(sid)
+        samples.append((time.perf_counter() - t0) * 1000)
+    print(f"load_session_messages: p50={statistics.median(samples):.2f} ms  max={max(samples):.2f} ms")
+
+    t0 = time.perf_counter()
+    memory.list_sessions(50)
+    print(f"list_sessions(50): {(time.perf_counter() - t0) * 1000:.2f} ms")
+
+    print(f"{args.writers} writers, commit per message: {_writers(memory, args.writers, args.per_writer):9.0f} msg/s")
+    memory.enable_write_behind()
+    print(f"{args.writers} writers, write-behind:       {_writers(memory, args.writers, args.per_writer):9.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
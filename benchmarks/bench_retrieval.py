@@ -0,0 +1,57 @@
+# benchmarks/bench_retrieval.py
+"""
+Retrieval latency and recall@k on a synthetic corpus where every document
+carries a unique product code: dense-only vs hybrid (BM25 + dense, RRF).
+
+    python -m benchmarks.bench_retrieval --docs 3000 --queries 200
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashEmbeddings, synthetic_texts
+from utils.rag_utils import build_vector_store, get_vector_store_handle, query_vector_store
+
+
+def _code(i: int) -> str:
+    return f"SKU-{(i * 7919) % 100000:05d}"
+
+
+def _run(persist_directory, queries, k, hybrid):
+    hits, samples = 0, []
+    for i, q in queries:
+        t0 = time.perf_counter()
+        results = query_vector_store(q, k=k, persist_directory=persist_directory, hybrid=hybrid)
+        samples.append((time.perf_counter() - t0) * 1000)
+        hits += any(_code(i) in doc.page_content for doc, _ in results)
+    samples.sort()
+    return hits / len(queries), statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=4)
+    args = parser.parse_args()
+
+    texts = synthetic_texts(args.docs, words_per_text=120)
+    docs = [Document(page_content=f"{t} product code {_code(i)}", metadata={"source": f"doc{i}.txt"}) for i, t in enumerate(texts)]
+    step = max(1, args.docs // args.queries)
+    queries = [(i, f"what is the current status of {_code(i)}") for i in range(0, args.docs, step)][: args.queries]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        get_vector_store_handle(tmp, embedding_factory=HashEmbeddings)
+        t0 = time.perf_counter()
+        build_vector_store(docs, persist_directory=tmp)
+        print(f"indexed {args.docs} docs in {time.perf_counter() - t0:.1f}s")
+        for name, hybrid in (("dense only", False), ("hybrid bm25+dense", True)):
+            recall, p50, p95 = _run(tmp, queries, args.k, hybrid)
+            print(f"{name:<18} recall@{args.k}={recall:6.1%}  p50={p50:7.2f} ms  p95={p95:7.2f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+# benchmarks/bench_startup.py
+"""
+Import time of streamlit_app.py's module-level imports, measured with
+`python -X importtime` in fresh interpreters. Features load their heavy
+dependencies on first use; this guards against one creeping back into the
+startup path. Exits 1 if the best run exceeds --max-ms or a deferred module
+(pandas, matplotlib, gtts, faiss, the LangChain FAISS wrapper, the text
+splitter, unstructured, httpx) is imported at startup.
+
+    python -m benchmarks.bench_startup --runs 5 --max-ms 1500 --json startup.json
+"""
+import argparse
+import ast
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+APP = os.path.join(ROOT, "streamlit_app.py")
+
+DEFERRED = (
+    "pandas", "matplotlib", "gtts", "faiss", "unstructured", "httpx",
+    "langchain_community.vectorstores.faiss", "langchain_text_splitters",
+)
+
+
+def app_imports(path: str = APP):
+    """Module-level import statements of `path`, as source lines."""
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    stmts = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            stmts.append(ast.unparse(node))
+    return stmts
+
+
+def _installed(stmt: str) -> bool:
+    node = ast.parse(stmt).body[0]
+    names = [a.name for a in node.names] if isinstance(node, ast.Import) else [node.module]
+    try:
+        return all(importlib.util.find_spec(n.split(".")[0]) is not None for n in names)
+    except (ImportError, ValueError):
+        return False
+
+
+def _parse_importtime(stderr: str):
+    """[(module, self_us, cumulative_us, depth)] from -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cum_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cum_us), depth))
+    return rows
+
+
+def _run(code: str):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(p for p in (ROOT, os.environ.get("PYTHONPATH")) if p))
+    t0 = time.perf_counter()
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    wall_s = time.perf_counter() - t0
+    if proc.returncode != 0:
+        tail = [l for l in proc.stderr.splitlines() if not l.startswith("import time:")][-5:]
+        raise RuntimeError("import failed:\n" + "\n".join(tail))
+    return _parse_importtime(proc.stderr), wall_s
+
+
+def measure(stmts, runs: int):
+    baseline = {name for name, _, _, depth in _run("pass")[0] if depth == 0}
+    best = None
+    for _ in range(runs):
+        rows, wall_s = _run("\n".join(stmts))
+        top = [(name, cum) for name, _, cum, depth in rows if depth == 0 and name not in baseline]
+        total_ms = sum(cum for _, cum in top) / 1000
+        if best is None or total_ms < best["import_ms"]:
+            best = {
+                "import_ms": total_ms,
+                "wall_ms": wall_s * 1000,
+                "top_level": sorted(((n, c / 1000) for n, c in top), key=lambda x: -x[1]),
+                "heaviest": sorted(((n, s / 1000) for n, s, _, _ in rows), key=lambda x: -x[1])[:15],
+                "modules": sorted(name for name, _, _, _ in rows),
+            }
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--max-ms", type=float, default=None, help="fail if the best run's import time exceeds this")
+    parser.add_argument("--json", default=None, help="write the report here")
+    args = parser.parse_args()
+
+    stmts = app_imports()
+    present = [s for s in stmts if _installed(s)]
+    skipped = [s for s in stmts if s not in present]
+    for s in skipped:
+        print(f"[bench_startup] not installed, skipped: {s}")
+
+    best = measure(present, args.runs)
+    deferred = sorted({d for d in DEFERRED for m in best["modules"] if m == d or m.startswith(d + ".")})
+
+    print(f"startup imports: {best['import_ms']:.0f} ms (best of {args.runs}), interpreter wall {best['wall_ms']:.0f} ms")
+    print("\nby app import (cumulative ms):")
+    for name, ms in best["top_level"][:15]:
+        print(f"  {ms:8.1f}  {name}")
+    print("\nheaviest modules (self ms):")
+    for name, ms in best["heaviest"][:10]:
+        print(f"  {ms:8.1f}  {name}")
+
+    failures = []
+    if deferred:
+        failures.append(f"deferred modules imported at startup: {', '.join(deferred)}")
+    if args.max_ms is not None and best["import_ms"] > args.max_ms:
+        failures.append(f"import time {best['import_ms']:.0f} ms exceeds --max-ms {args.max_ms:.0f}")
+
+    if args.json:
+        report = {k: v for k, v in best.items() if k != "modules"}
+        report.update({"runs": args.runs, "skipped": skipped, "deferred_loaded": deferred, "failures": failures})
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    for msg in failures:
+        print(f"\nFAIL  {msg}")
+    if failures:
+        raise SystemExit(1)
+    print("\nOK")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+# benchmarks/bench_storage.py
+"""
+Cold-load time and per-process memory of the two vector store formats:
+"pickle" (FAISS.save_local, everything deserialized into RAM) vs "sqlite"
+(memory-mapped index + SQLite docstore). Each load runs in a fresh process;
+RssAnon is private memory, RssFile is page cache that replicas share.
+
+    python -m benchmarks.bench_storage --chunks 200000 --dim 384 --index ivf_flat
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashEmbeddings, synthetic_texts
+from utils import faiss_index, vector_storage
+
+
+def _rss() -> dict:
+    out = {}
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(("VmRSS", "RssAnon", "RssFile")):
+                    key, value = line.split(":", 1)
+                    out[key] = int(value.split()[0]) / 1024
+    except OSError:
+        pass
+    return out
+
+
+def _child(fmt: str, directory: str, dim: int):
+    emb = HashEmbeddings(dim)
+    before = _rss()
+    t0 = time.perf_counter()
+    if fmt == "sqlite":
+        db, mmapped = vector_storage.load_store(directory, emb)
+    else:
+        db, mmapped = FAISS.load_local(directory, emb, allow_dangerous_deserialization=True), False
+    load_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    db.similarity_search_with_score("quarterly revenue forecast", k=4)
+    query_ms = (time.perf_counter() - t0) * 1000
+    after = _rss()
+    print(json.dumps({
+        "load_s": load_s,
+        "first_query_ms": query_ms,
+        "mmapped": mmapped,
+        "rss_mb": after.get("VmRSS", 0) - before.get("VmRSS", 0),
+        "anon_mb": after.get("RssAnon", 0) - before.get("RssAnon", 0),
+        "file_mb": after.get("RssFile", 0) - before.get("RssFile", 0),
+    }))
+
+
+def _build(chunks: int, dim: int, kind: str) -> FAISS:
+    texts = synthetic_texts(chunks, words_per_text=60)
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((chunks, dim)).astype("float32")
+    ids = [f"chunk-{i}" for i in range(chunks)]
+    docs = {cid: Document(page_content=t, metadata={"source": f"file-{i % 100}.txt", "start_index": i}) for i, (cid, t) in enumerate(zip(ids, texts))}
+    index = faiss_index.build_index(kind, vectors)
+    return FAISS(HashEmbeddings(dim), index, InMemoryDocstore(docs), dict(enumerate(ids)))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=50000)
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--index", default="flat", choices=faiss_index.KINDS)
+    parser.add_argument("--child", nargs=2, metavar=("FORMAT", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        _child(args.child[0], args.child[1], args.dim)
+        return
+
+    db = _build(args.chunks, args.dim, args.index)
+    with tempfile.TemporaryDirectory() as tmp:
+        dirs = {"pickle": os.path.join(tmp, "pickle"), "sqlite": os.path.join(tmp, "sqlite")}
+        db.save_local(dirs["pickle"])
+        vector_storage.save_store(db, dirs["sqlite"])
+        print(f"{args.chunks} chunks, dim {args.dim}, {args.index} index")
+        print(f"{'format':<8} {'load s':>8} {'query ms':>9} {'mmap':>5} {'RSS MB':>8} {'anon MB':>8} {'file MB':>8}")
+        for fmt, directory in dirs.items():
+            out = subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_storage", "--dim", str(args.dim), "--child", fmt, directory],
+                capture_output=True, text=True, check=True,
+            ).stdout.strip().splitlines()[-1]
+            r = json.loads(out)
+            print(f"{fmt:<8} {r['load_s']:8.3f} {r['first_query_ms']:9.2f} {str(r['mmapped']):>5} {r['rss_mb']:8.1f} {r['anon_mb']:8.1f} {r['file_mb']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
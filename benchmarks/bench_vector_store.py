@@ -0,0 +1,65 @@
+# benchmarks/bench_vector_store.py
+"""
+Per-query latency: FAISS.load_local on every query (old path) vs the
+process-resident VectorStoreHandle.
+
+    python -m benchmarks.bench_vector_store --chunks 3000 --queries 50
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+from benchmarks.fakes import HashEmbeddings, synthetic_texts
+from utils.rag_utils import VectorStoreHandle
+
+
+def _timed(fn, queries):
+    samples = []
+    for q in queries:
+        t0 = time.perf_counter()
+        fn(q)
+        samples.append((time.perf_counter() - t0) * 1000)
+    return samples
+
+
+def _report(name, samples):
+    samples = sorted(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<22} mean={statistics.mean(samples):8.2f} ms  p50={statistics.median(samples):8.2f} ms  p95={p95:8.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=3000)
+    parser.add_argument("--queries", type=int, default=50)
+    args = parser.parse_args()
+
+    emb = HashEmbeddings()
+    texts = synthetic_texts(args.chunks)
+    queries = synthetic_texts(args.queries, words_per_text=8, seed=99)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        FAISS.from_documents([Document(page_content=t) for t in texts], emb).save_local(tmp)
+
+        def load_per_query(q):
+            db = FAISS.load_local(tmp, HashEmbeddings(), allow_dangerous_deserialization=True)
+            return db.similarity_search_with_score(q, k=4)
+
+        handle = VectorStoreHandle(tmp, embedding_factory=HashEmbeddings)
+
+        def resident(q):
+            with handle.lock:
+                return handle.get().similarity_search_with_score(q, k=4)
+
+        print(f"{args.chunks} chunks, {args.queries} queries")
+        _report("load_local per query", _timed(load_per_query, queries))
+        _report("resident handle", _timed(resident, queries))
+        print(f"handle loads from disk: {handle.loads}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+# benchmarks/check_web_search.py
+"""
+Offline checks and timings for utils.web_search against a local stub that
+speaks just enough of the SerpAPI and Google CSE JSON APIs: result shape,
+provider fallback, race mode, the SQLite cache and connection reuse.
+
+    python -m benchmarks.check_web_search --latency 0.2
+"""
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubSearchServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, latency=0.05):
+        super().__init__(addr, _Handler)
+        # Per provider: seconds of latency and HTTP status to answer with.
+        self.latency = {"serpapi": latency, "cse": latency}
+        self.status = {"serpapi": 200, "cse": 200}
+        self.requests = {"serpapi": 0, "cse": 0}
+        self.connections = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubSearchServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        provider = url.path.strip("/")
+        q = parse_qs(url.query).get("q", [""])[0]
+        if provider not in self.server.requests:
+            self.send_error(404)
+            return
+        with self.server.lock:
+            self.server.requests[provider] += 1
+        time.sleep(self.server.latency[provider])
+        status = self.server.status[provider]
+        if status != 200:
+            payload = {"error": "stub failure"}
+        elif provider == "serpapi":
+            payload = {"organic_results": [{"title": f"serp {q} {i}", "snippet": "s", "link": f"https://s/{i}"} for i in range(5)]}
+        else:
+            payload = {"items": [{"title": f"cse {q} {i}", "snippet": "c", "link": f"https://c/{i}"} for i in range(5)]}
+        body = json.dumps(payload).encode("utf-8")
+        try:
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the losing side of a race is cancelled mid-request
+
+
+def _check(name, ok, detail=""):
+    print(f"{'PASS' if ok else 'FAIL'}  {name}{'  ' + detail if detail else ''}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.1)
+    args = parser.parse_args()
+
+    server = StubSearchServer(("127.0.0.1", 0), latency=args.latency).start()
+    tmp = tempfile.mkdtemp()
+    # Configuration is read at import time, so point it at the stub first.
+    os.environ.update({
+        "SERPAPI_KEY": "stub", "GOOGLE_CSE_KEY": "stub", "GOOGLE_CX": "stub",
+        "SERPAPI_URL": server.base_url + "/serpapi", "GOOGLE_CSE_URL": server.base_url + "/cse",
+        "CHAT_MEMORY_DB": os.path.join(tmp, "chat_memory.sqlite"), "WEB_SEARCH_TIMEOUT": "2",
+    })
+    from utils import web_search as ws
+
+    results = []
+    res = ws.web_search("Quarterly  Revenue", num_results=3, use_cache=False)
+    results.append(_check("sequential uses serpapi first", res.get("provider") == "serpapi" and len(res.get("results", [])) == 3, str(res.get("error", ""))))
+
+    server.status["serpapi"] = 500
+    res = ws.web_search("fallback", use_cache=False)
+    results.append(_check("falls back to google cse on error", res.get("provider") == "google_cse"))
+    server.status["serpapi"] = 200
+
+    server.latency["serpapi"] = args.latency * 5
+    t0 = time.perf_counter()
+    res = ws.web_search("race", race=True, use_cache=False)
+    race_s = time.perf_counter() - t0
+    results.append(_check("race returns the faster provider", res.get("provider") == "google_cse", f"{race_s * 1000:.0f} ms"))
+    server.latency["serpapi"] = args.latency
+
+    ws.clear_cache()
+    before = dict(server.requests)
+    t0 = time.perf_counter()
+    ws.web_search("cached query")
+    miss_s = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    res = ws.web_search("  CACHED   query ")
+    hit_s = time.perf_counter() - t0
+    sent = sum(server.requests.values()) - sum(before.values())
+    results.append(_check("normalized repeat served from cache", res.get("cached") is True and sent == 1, f"miss {miss_s * 1000:.1f} ms, hit {hit_s * 1000:.2f} ms"))
+
+    conns_before = server.connections
+    for i in range(10):
+        ws.web_search(f"pooled {i}", use_cache=False)
+    new_conns = server.connections - conns_before
+    results.append(_check("keep-alive connections reused", new_conns <= 1, f"{new_conns} new connection(s) for 10 searches"))
+
+    print(f"\n{sum(results)}/{len(results)} checks passed; cache {ws.cache_stats()}")
+    server.shutdown()
+    if not all(results):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+# benchmarks/fake_embedding_server.py
+"""
+Local stand-in for the OpenAI /v1/embeddings endpoint so embedding throughput
+can be benchmarked offline. Simulates per-request latency and answers 429
+when more than `max_inflight` requests are being served at once.
+
+    python -m benchmarks.fake_embedding_server --port 8765
+    EMBEDDING_API_BASE=http://127.0.0.1:8765/v1 OPENAI_API_KEY=fake ...
+"""
+import argparse
+import base64
+import hashlib
+import json
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def fake_vector(item, dim: int):
+    seed = hashlib.sha256(json.dumps(item).encode("utf-8")).digest()
+    out = []
+    while len(out) < dim:
+        seed = hashlib.sha256(seed).digest()
+        out.extend((b - 128) / 128.0 for b in seed)
+    return out[:dim]
+
+
+class FakeEmbeddingServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, addr, dim=256, latency=0.05, per_item_latency=0.0005, max_inflight=8):
+        super().__init__(addr, _Handler)
+        self.dim = dim
+        self.latency = latency
+        self.per_item_latency = per_item_latency
+        self.max_inflight = max_inflight
+        self.inflight = 0
+        self.requests = 0
+        self.rejected = 0
+        self.lock = threading.Lock()
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def start(self) -> "FakeEmbeddingServer":
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if not self.path.rstrip("/").endswith("/embeddings"):
+            return self._send(404, {"error": {"message": "not found"}})
+        with server.lock:
+            server.requests += 1
+            if server.inflight >= server.max_inflight:
+                server.rejected += 1
+                return self._send(429, {"error": {"message": "rate limited", "type": "rate_limit"}}, {"retry-after": "0.1"})
+            server.inflight += 1
+        try:
+            req = json.loads(body)
+            inputs = req["input"]
+            if isinstance(inputs, str) or (inputs and isinstance(inputs[0], int)):
+                inputs = [inputs]
+            time.sleep(server.latency + server.per_item_latency * len(inputs))
+            data = []
+            for i, item in enumerate(inputs):
+                vec = fake_vector(item, server.dim)
+                if req.get("encoding_format") == "base64":
+                    vec = base64.b64encode(struct.pack(f"<{len(vec)}f", *vec)).decode("ascii")
+                data.append({"object": "embedding", "index": i, "embedding": vec})
+            tokens = sum(len(x) if isinstance(x, list) else len(x.split()) for x in inputs)
+            self._send(200, {
+                "object": "list",
+                "data": data,
+                "model": req.get("model", "fake"),
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+            })
+        finally:
+            with server.lock:
+                server.inflight -= 1
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--max-inflight", type=int, default=8)
+    args = parser.parse_args()
+    server = FakeEmbeddingServer(("127.0.0.1", args.port), latency=args.latency, max_inflight=args.max_inflight)
+    print(f"fake embeddings at {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
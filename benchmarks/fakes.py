@@ -0,0 +1,84 @@
+# benchmarks/fakes.py
+"""Deterministic, offline stand-ins used by the benchmark scripts."""
+import hashlib
+import math
+import time
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words hashing embedder: no network, stable across runs."""
+
+    def __init__(self, dim: int = 384):
+        self.dim = dim
+
+    def _embed(self, text: str) -> List[float]:
+        vec = [0.0] * self.dim
+        for token in text.lower().split():
+            h = int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+            vec[h % self.dim] += 1.0 if (h >> 63) else -1.0
+        norm = math.sqrt(sum(v * v for v in vec)) or 1.0
+        return [v / norm for v in vec]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(t) for t in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+WORDS = (
+    "revenue forecast quarterly margin customer churn pipeline invoice contract "
+    "policy compliance audit vendor shipment warehouse inventory analytics model "
+    "training dataset latency throughput budget hiring onboarding roadmap release"
+).split()
+
+
+class FakeChatModel:
+    """
+    Chat model stand-in with the invoke/stream surface the app uses. Replies
+    are derived from the last message, after `ttft` seconds and `token_latency`
+    seconds per word, so runs are repeatable.
+    """
+
+    model_name = "fake-chat"
+
+    def __init__(self, ttft: float = 0.05, tokens: int = 60, token_latency: float = 0.0):
+        self.ttft = ttft
+        self.tokens = tokens
+        self.token_latency = token_latency
+
+    def _words(self, messages) -> List[str]:
+        last = messages[-1].content if messages else ""
+        seed = hashlib.sha256(last.encode("utf-8")).digest()
+        return [WORDS[seed[i % len(seed)] % len(WORDS)] for i in range(self.tokens)]
+
+    def invoke(self, messages) -> AIMessage:
+        words = self._words(messages)
+        time.sleep(self.ttft + self.token_latency * len(words))
+        return AIMessage(content=" ".join(words))
+
+    def stream(self, messages):
+        words = self._words(messages)
+        time.sleep(self.ttft)
+        for i, word in enumerate(words):
+            if i and self.token_latency:
+                time.sleep(self.token_latency)
+            yield AIMessageChunk(content=word if i == 0 else " " + word)
+
+
+def synthetic_texts(n: int, words_per_text: int = 150, seed: int = 7) -> List[str]:
+    """Generate `n` pseudo-random paragraphs from a small vocabulary."""
+    texts = []
+    state = seed
+    for i in range(n):
+        out = []
+        for _ in range(words_per_text):
+            state = (state * 6364136223846793005 + 1442695040888963407) % (1 << 64)
+            out.append(WORDS[(state >> 33) % len(WORDS)])
+        out.append(f"doc-{i}")
+        texts.append(" ".join(out))
+    return texts
@@ -25,3 +25,87 @@ EMBEDDING_MODEL_NAME = get_env("EMBEDDING_MODEL_NAME", "text-embedding-3-small")
 CHAT_MEMORY_DB = get_env("CHAT_MEMORY_DB", "chat_memory.sqlite")
 CHAT_MEMORY_JSON_DIR = get_env("CHAT_MEMORY_JSON_DIR", "chat_backups")
 
+# Embedding cache
+EMBEDDING_CACHE_DB = get_env("EMBEDDING_CACHE_DB", "embedding_cache.sqlite")
+EMBEDDING_CACHE_MAX_ENTRIES = int(get_env("EMBEDDING_CACHE_MAX_ENTRIES", "200000"))
+EMBEDDING_CACHE_ENABLED = get_env("EMBEDDING_CACHE_ENABLED", "1") != "0"
+
+# Ingestion
+INGEST_WORKERS = int(get_env("INGEST_WORKERS", str(min(4, os.cpu_count() or 1))))
+EMBED_BATCH_SIZE = int(get_env("EMBED_BATCH_SIZE", "128"))
+
+# Batched embedding client
+EMBEDDING_API_BASE = get_env("EMBEDDING_API_BASE")  # e.g. a local fake server for benchmarks
+EMBED_MAX_BATCH_TOKENS = int(get_env("EMBED_MAX_BATCH_TOKENS", "100000"))
+EMBED_MAX_BATCH_ITEMS = int(get_env("EMBED_MAX_BATCH_ITEMS", "512"))
+EMBED_CONCURRENCY = int(get_env("EMBED_CONCURRENCY", "4"))
+EMBED_MAX_RETRIES = int(get_env("EMBED_MAX_RETRIES", "6"))
+
+# Answer cache
+RESPONSE_CACHE_TTL_SECONDS = int(get_env("RESPONSE_CACHE_TTL_SECONDS", str(24 * 3600)))
+RESPONSE_CACHE_MAX_ENTRIES = int(get_env("RESPONSE_CACHE_MAX_ENTRIES", "5000"))
+RESPONSE_CACHE_SIMILARITY = float(get_env("RESPONSE_CACHE_SIMILARITY", "0.95"))
+
+# Chat memory store
+CHAT_MEMORY_WRITE_BEHIND = get_env("CHAT_MEMORY_WRITE_BEHIND", "0") == "1"
+CHAT_MEMORY_BATCH_SIZE = int(get_env("CHAT_MEMORY_BATCH_SIZE", "256"))
+CHAT_MEMORY_FLUSH_INTERVAL = float(get_env("CHAT_MEMORY_FLUSH_INTERVAL", "0.05"))  # seconds
+CHAT_MEMORY_WRITE_RETRIES = int(get_env("CHAT_MEMORY_WRITE_RETRIES", "5"))  # attempts per write-behind batch, with backoff
+CHAT_MEMORY_EXIT_FLUSH_TIMEOUT = float(get_env("CHAT_MEMORY_EXIT_FLUSH_TIMEOUT", "10"))  # seconds to drain the queue at exit
+CHAT_HISTORY_PAGE_SIZE = int(get_env("CHAT_HISTORY_PAGE_SIZE", "20"))
+CHAT_HISTORY_WINDOW = int(get_env("CHAT_HISTORY_WINDOW", "60"))  # max messages kept in st.session_state
+
+# Conversation context sent to the LLM: rolling summary of older turns + recent turns
+CHAT_CONTEXT_TOKENS = int(get_env("CHAT_CONTEXT_TOKENS", "6000"))  # whole prompt: system + summary + recent turns + current input
+CHAT_CONTEXT_RECENT_MESSAGES = int(get_env("CHAT_CONTEXT_RECENT_MESSAGES", "12"))
+CHAT_SUMMARY_TOKENS = int(get_env("CHAT_SUMMARY_TOKENS", "400"))
+CHAT_SUMMARY_MAX_FOLD = int(get_env("CHAT_SUMMARY_MAX_FOLD", "20"))  # older messages folded into the summary per update
+
+# RAG context assembly
+RAG_TOP_K = int(get_env("RAG_TOP_K", "4"))
+RAG_MAX_DISTANCE = float(get_env("RAG_MAX_DISTANCE")) if get_env("RAG_MAX_DISTANCE") else None  # FAISS L2; lower is closer
+RAG_CONTEXT_TOKENS = int(get_env("RAG_CONTEXT_TOKENS", "3000"))
+RAG_CONTEXT_TOKENS_GROQ = int(get_env("RAG_CONTEXT_TOKENS_GROQ", "2000"))
+RAG_HYBRID = get_env("RAG_HYBRID", "1") != "0"  # BM25 + dense retrieval fused with RRF
+RAG_RRF_K = int(get_env("RAG_RRF_K", "60"))
+
+# FAISS index type: auto | flat | hnsw | ivf_flat | ivf_pq
+RAG_INDEX_TYPE = get_env("RAG_INDEX_TYPE", "auto")
+RAG_HNSW_MIN_VECTORS = int(get_env("RAG_HNSW_MIN_VECTORS", "50000"))
+RAG_IVF_MIN_VECTORS = int(get_env("RAG_IVF_MIN_VECTORS", "300000"))
+RAG_IVFPQ_MIN_VECTORS = int(get_env("RAG_IVFPQ_MIN_VECTORS", "1000000"))
+RAG_NPROBE = int(get_env("RAG_NPROBE", "16"))
+RAG_EF_SEARCH = int(get_env("RAG_EF_SEARCH", "64"))
+
+# Vector store on-disk format: sqlite (memory-mapped index + SQLite docstore) | pickle (FAISS.save_local)
+RAG_STORAGE_FORMAT = get_env("RAG_STORAGE_FORMAT", "sqlite")
+
+# Collections (one vector store per workspace / tenant)
+RAG_MAX_RESIDENT_COLLECTIONS = int(get_env("RAG_MAX_RESIDENT_COLLECTIONS", "8"))  # LRU of loaded indexes per process
+
+# Web search
+SERPAPI_URL = get_env("SERPAPI_URL", "https://serpapi.com/search")
+GOOGLE_CSE_URL = get_env("GOOGLE_CSE_URL", "https://www.googleapis.com/customsearch/v1")
+WEB_SEARCH_TIMEOUT = float(get_env("WEB_SEARCH_TIMEOUT", "10"))  # seconds per provider request
+WEB_SEARCH_RACE = get_env("WEB_SEARCH_RACE", "0") == "1"  # query all configured providers at once, first good answer wins
+WEB_SEARCH_CACHE_TTL_SECONDS = int(get_env("WEB_SEARCH_CACHE_TTL_SECONDS", str(6 * 3600)))
+WEB_SEARCH_CACHE_MAX_ENTRIES = int(get_env("WEB_SEARCH_CACHE_MAX_ENTRIES", "2000"))
+
+# Background jobs (indexing, transcription, TTS, conversation summaries)
+JOB_WORKERS = int(get_env("JOB_WORKERS", "4"))
+JOB_CONCURRENCY = get_env("JOB_CONCURRENCY", "index=1,transcribe=2,tts=2,summarize=1")  # per job type; unlisted types get 1
+JOB_MAX_ATTEMPTS = int(get_env("JOB_MAX_ATTEMPTS", "3"))
+JOB_STALE_SECONDS = float(get_env("JOB_STALE_SECONDS", "60"))  # running jobs without a heartbeat this long are requeued
+JOB_POLL_INTERVAL = float(get_env("JOB_POLL_INTERVAL", "0.5"))
+JOB_RETENTION_SECONDS = int(get_env("JOB_RETENTION_SECONDS", str(7 * 24 * 3600)))
+JOB_DATA_DIR = get_env("JOB_DATA_DIR", "job_data")
+
+# Text-to-speech
+TTS_CACHE_DB = get_env("TTS_CACHE_DB", "tts_cache.sqlite")
+TTS_CACHE_MAX_BYTES = int(get_env("TTS_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+TTS_SEGMENT_CHARS = int(get_env("TTS_SEGMENT_CHARS", "400"))  # replies are synthesized in sentence groups up to this size
+
+# Tracing
+TRACING_ENABLED = get_env("TRACING_ENABLED", "1") != "0"
+TRACING_FLUSH_INTERVAL = float(get_env("TRACING_FLUSH_INTERVAL", "5"))  # seconds between histogram writes to SQLite
+TRACING_RECENT_SPANS = int(get_env("TRACING_RECENT_SPANS", "500"))
@@ -0,0 +1,148 @@
+# models/batched_embeddings.py
+import asyncio
+import random
+from typing import List, Optional
+
+from langchain_core.embeddings import Embeddings
+from config.config import (
+    OPENAI_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_API_BASE,
+    EMBED_MAX_BATCH_TOKENS, EMBED_MAX_BATCH_ITEMS, EMBED_CONCURRENCY, EMBED_MAX_RETRIES,
+)
+
+# Per-input limit of the OpenAI embedding models.
+MAX_INPUT_TOKENS = 8191
+
+
+def _get_encoding(model: str):
+    import tiktoken
+    try:
+        return tiktoken.encoding_for_model(model)
+    except KeyError:
+        return tiktoken.get_encoding("cl100k_base")
+
+
+def pack_batches(token_lists: List[List[int]], max_tokens: int, max_items: int) -> List[List[int]]:
+    """Greedily group input indices so each batch stays within the token and item budgets."""
+    batches, current, used = [], [], 0
+    for i, toks in enumerate(token_lists):
+        n = len(toks)
+        if current and (used + n > max_tokens or len(current) >= max_items):
+            batches.append(current)
+            current, used = [], 0
+        current.append(i)
+        used += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _backoff_delay(attempt: int, retry_after: Optional[float] = None, base: float = 0.5, cap: float = 30.0) -> float:
+    """Full-jitter exponential backoff; a server-supplied Retry-After wins if larger."""
+    delay = random.uniform(0, min(cap, base * (2 ** attempt)))
+    if retry_after:
+        delay = max(delay, retry_after)
+    return delay
+
+
+def _retry_after(exc) -> Optional[float]:
+    response = getattr(exc, "response", None)
+    if response is None:
+        return None
+    try:
+        return float(response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class BatchedOpenAIEmbeddings(Embeddings):
+    """
+    OpenAI embeddings client that packs inputs into token-budgeted batches
+    (tiktoken), sends up to `concurrency` batches at once with asyncio and
+    retries 429/5xx/connection errors with jittered backoff.
+    """
+
+    def __init__(
+        self,
+        api_key: str = OPENAI_API_KEY,
+        model: str = EMBEDDING_MODEL_NAME,
+        base_url: Optional[str] = EMBEDDING_API_BASE,
+        max_batch_tokens: int = EMBED_MAX_BATCH_TOKENS,
+        max_batch_items: int = EMBED_MAX_BATCH_ITEMS,
+        concurrency: int = EMBED_CONCURRENCY,
+        max_retries: int = EMBED_MAX_RETRIES,
+    ):
+        self.api_key = api_key
+        self.model = model
+        self.base_url = base_url
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_items = max_batch_items
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self._encoding = _get_encoding(model)
+        self._async_client = None
+        self.requests = 0
+        self.retries = 0
+
+    def _client(self):
+        if self._async_client is None:
+            from openai import AsyncOpenAI
+            from models.http_pool import get_async_http_client
+            # Retries are handled here so backoff is shared across concurrent batches.
+            self._async_client = AsyncOpenAI(
+                api_key=self.api_key, base_url=self.base_url, max_retries=0, http_client=get_async_http_client()
+            )
+        return self._async_client
+
+    async def _embed_batch(self, client, sem: asyncio.Semaphore, tokens: List[List[int]]) -> List[List[float]]:
+        from openai import APIConnectionError, APIStatusError, RateLimitError
+        attempt = 0
+        while True:
+            async with sem:
+                try:
+                    self.requests += 1
+                    resp = await client.embeddings.create(model=self.model, input=tokens)
+                    return [d.embedding for d in sorted(resp.data, key=lambda d: d.index)]
+                except (RateLimitError, APIConnectionError, APIStatusError) as e:
+                    status = getattr(e, "status_code", None)
+                    retryable = isinstance(e, (RateLimitError, APIConnectionError)) or (status is not None and status >= 500)
+                    if not retryable or attempt >= self.max_retries:
+                        raise
+                    delay = _backoff_delay(attempt, _retry_after(e))
+            # Sleep outside the semaphore so other batches can use the slot.
+            attempt += 1
+            self.retries += 1
+            await asyncio.sleep(delay)
+
+    async def _aembed(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        # Send token ids rather than text; the API accepts both and this is what we budgeted.
+        token_lists = [self._encoding.encode(t or " ")[:MAX_INPUT_TOKENS] for t in texts]
+        batches = pack_batches(token_lists, self.max_batch_tokens, self.max_batch_items)
+        sem = asyncio.Semaphore(self.concurrency)
+        client = self._client()
+        results = await asyncio.gather(
+            *(self._embed_batch(client, sem, [token_lists[i] for i in batch]) for batch in batches)
+        )
+        out: List[List[float]] = [None] * len(texts)
+        for batch, vectors in zip(batches, results):
+            for i, vec in zip(batch, vectors):
+                out[i] = vec
+        return out
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        # The pooled async client belongs to the shared background loop, so
+        # work is always scheduled there, whichever loop the caller runs on.
+        from models.http_pool import get_event_loop
+        return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self._aembed(texts), get_event_loop()))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self.aembed_documents([text]))[0]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        from models.http_pool import run_async
+        return run_async(self._aembed(texts))
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
@@ -0,0 +1,172 @@
+# models/embedding_cache.py
+import sqlite3
+import hashlib
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional
+
+from langchain_core.embeddings import Embeddings
+from config.config import EMBEDDING_CACHE_DB, EMBEDDING_CACHE_MAX_ENTRIES
+
+
+def _text_key(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pack(vec: List[float]) -> bytes:
+    return array("f", vec).tobytes()
+
+
+def _unpack(blob: bytes) -> List[float]:
+    arr = array("f")
+    arr.frombytes(blob)
+    return arr.tolist()
+
+
+class EmbeddingCache:
+    """
+    SQLite-backed store of float32 vectors keyed by (model, sha256(text)).
+    Several models share the table; least recently used rows of any model are
+    evicted once `max_entries` is exceeded.
+    """
+
+    def __init__(self, db_path: str = EMBEDDING_CACHE_DB, max_entries: int = EMBEDDING_CACHE_MAX_ENTRIES):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash TEXT NOT NULL,
+                vector BLOB NOT NULL,
+                last_used REAL NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+        self._count = self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, model: str, texts: List[str]) -> List[Optional[List[float]]]:
+        keys = [_text_key(t) for t in texts]
+        found: Dict[str, bytes] = {}
+        with self._lock:
+            # Stay well under SQLite's bound-parameter limit.
+            unique = list(dict.fromkeys(keys))
+            for i in range(0, len(unique), 500):
+                part = unique[i:i + 500]
+                marks = ",".join("?" * len(part))
+                rows = self._conn.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({marks})",
+                    [model, *part],
+                ).fetchall()
+                found.update(rows)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE model = ? AND text_hash = ?",
+                    [(now, model, k) for k in found],
+                )
+                self._conn.commit()
+            out = [(_unpack(found[k]) if k in found else None) for k in keys]
+            hit = sum(1 for v in out if v is not None)
+            self.hits += hit
+            self.misses += len(out) - hit
+        return out
+
+    def put_many(self, model: str, texts: List[str], vectors: List[List[float]]):
+        if not texts:
+            return
+        now = time.time()
+        rows = [(model, _text_key(t), _pack(v), now) for t, v in zip(texts, vectors)]
+        with self._lock:
+            before = self._conn.total_changes
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO embeddings (model, text_hash, vector, last_used) VALUES (?, ?, ?, ?)",
+                rows,
+            )
+            self._count += self._conn.total_changes - before
+            excess = self._count - self.max_entries
+            if excess > 0:
+                self._conn.execute(
+                    "DELETE FROM embeddings WHERE rowid IN (SELECT rowid FROM embeddings ORDER BY last_used ASC LIMIT ?)",
+                    (excess,),
+                )
+                self._count -= excess
+                self.evictions += excess
+            self._conn.commit()
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+            self._count = 0
+
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": self._count,
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": (self.hits / lookups) if lookups else 0.0,
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """Wraps any LangChain embedder so that already-seen texts skip the backend."""
+
+    def __init__(self, backend: Embeddings, model: str, cache: EmbeddingCache):
+        self.backend = backend
+        self.model = model
+        self.cache = cache
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        cached = self.cache.get_many(self.model, texts)
+        missing = [i for i, v in enumerate(cached) if v is None]
+        if missing:
+            # Embed each distinct missing text once.
+            todo = list(dict.fromkeys(texts[i] for i in missing))
+            vectors = self.backend.embed_documents(todo)
+            self.cache.put_many(self.model, todo, vectors)
+            by_text = dict(zip(todo, vectors))
+            for i in missing:
+                cached[i] = by_text[texts[i]]
+        return cached
+
+    def embed_query(self, text: str) -> List[float]:
+        # Queries share the cache with documents; backends here embed both the same way.
+        cached = self.cache.get_many(self.model, [text])[0]
+        if cached is not None:
+            return cached
+        vec = self.backend.embed_query(text)
+        self.cache.put_many(self.model, [text], [vec])
+        return vec
+
+
+_cache: Optional[EmbeddingCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Process-wide cache instance, shared by every embedding model."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = EmbeddingCache()
+        return _cache
+
+
+def embedding_cache_stats() -> Optional[Dict]:
+    """Counters of the process-wide cache, or None if nothing has used it yet."""
+    return _cache.stats() if _cache is not None else None
@@ -1,21 +1,44 @@
 # models/embeddings.py
-from config.config import OPENAI_API_KEY, EMBEDDING_MODEL_NAME
+from config.config import OPENAI_API_KEY, EMBEDDING_MODEL_NAME, EMBEDDING_CACHE_ENABLED
+from utils.tracing import traced
 
+HF_EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+
+def _with_cache(emb, model_name: str):
+    if not EMBEDDING_CACHE_ENABLED:
+        return emb
+    try:
+        from models.embedding_cache import CachedEmbeddings, get_embedding_cache
+        return CachedEmbeddings(emb, model_name, get_embedding_cache())
+    except Exception as e:
+        print(f"[embeddings] embedding cache unavailable: {e}")
+        return emb
+
+@traced("embeddings.init")
 def get_embedding_fn():
+    try:
+        if OPENAI_API_KEY:
+            from models.batched_embeddings import BatchedOpenAIEmbeddings
+            emb = BatchedOpenAIEmbeddings(api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL_NAME)
+            return _with_cache(emb, EMBEDDING_MODEL_NAME)
+    except Exception as e:
+        print(f"[embeddings] BatchedOpenAIEmbeddings init failed: {e}")
+
     try:
         if OPENAI_API_KEY:
             # FIX: Updated import to use langchain_openai
             from langchain_openai import OpenAIEmbeddings
-            emb = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL_NAME)
-            return emb
+            from models.http_pool import get_http_client
+            emb = OpenAIEmbeddings(openai_api_key=OPENAI_API_KEY, model=EMBEDDING_MODEL_NAME, http_client=get_http_client())
+            return _with_cache(emb, EMBEDDING_MODEL_NAME)
     except Exception as e:
         print(f"[embeddings] OpenAIEmbeddings init failed: {e}")
 
     try:
         # FIX: Updated import to use langchain_community
         from langchain_community.embeddings import HuggingFaceEmbeddings
-        emb = HuggingFaceEmbeddings(model_name="all-MiniLM-L6-v2")
-        return emb
+        emb = HuggingFaceEmbeddings(model_name=HF_EMBEDDING_MODEL_NAME)
+        return _with_cache(emb, HF_EMBEDDING_MODEL_NAME)
     except Exception as e:
         print(f"[embeddings] HuggingFaceEmbeddings init failed: {e}")
 
@@ -0,0 +1,83 @@
+# models/http_pool.py
+import asyncio
+import threading
+from collections import Counter
+from typing import Dict
+
+import httpx
+
+# One keep-alive pool shared by chat, embeddings and Whisper clients, so TLS
+# sessions survive across Streamlit reruns instead of being rebuilt per call.
+_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60.0)
+_TIMEOUT = httpx.Timeout(60.0, connect=10.0)
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+_loop = None
+_request_counts = Counter()
+
+
+def _count_request(request):
+    _request_counts[request.url.host] += 1
+
+
+async def _acount_request(request):
+    _count_request(request)
+
+
+def get_http_client() -> httpx.Client:
+    global _client
+    with _lock:
+        if _client is None:
+            _client = httpx.Client(limits=_LIMITS, timeout=_TIMEOUT, event_hooks={"request": [_count_request]})
+        return _client
+
+
+def get_event_loop() -> asyncio.AbstractEventLoop:
+    """Long-lived background loop; async clients are bound to it so their pool persists."""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="http-pool-loop", daemon=True).start()
+        return _loop
+
+
+def get_async_http_client() -> httpx.AsyncClient:
+    """Shared async client. Only use it from coroutines run with `run_async`."""
+    global _async_client
+    get_event_loop()
+    with _lock:
+        if _async_client is None:
+            _async_client = httpx.AsyncClient(limits=_LIMITS, timeout=_TIMEOUT, event_hooks={"request": [_acount_request]})
+        return _async_client
+
+
+def run_async(coro):
+    """Run `coro` on the shared background loop and block until it finishes."""
+    return asyncio.run_coroutine_threadsafe(coro, get_event_loop()).result()
+
+
+def _pool_info(client) -> Dict:
+    # httpx keeps its httpcore pool private; report what we can without failing.
+    try:
+        conns = list(client._transport._pool.connections)
+    except Exception:
+        return {"connections": None, "idle": None}
+    idle = 0
+    for c in conns:
+        try:
+            idle += bool(c.is_idle())
+        except Exception:
+            pass
+    return {"connections": len(conns), "idle": idle}
+
+
+def pool_stats() -> Dict:
+    stats = {"requests_by_host": dict(_request_counts), "requests": sum(_request_counts.values())}
+    if _client is not None:
+        stats["sync"] = _pool_info(_client)
+    if _async_client is not None:
+        stats["async"] = _pool_info(_async_client)
+    return stats
@@ -1,27 +1,133 @@
 # models/llm.py
-from typing import Optional
+import time
+import threading
+from typing import Callable, Dict, Iterator, List, Optional
 from config.config import OPENAI_API_KEY, GROQ_API_KEY
+from utils.tracing import traced
+
+OPENAI_CHAT_MODEL = "gpt-4o-mini"
+GROQ_CHAT_MODEL = "mixtral-8x7b-32768"
+
+# Provider registry: clients cached per (provider, model, params) and sharing
+# the pooled HTTP transport from models.http_pool.
+_registry: Dict[tuple, object] = {}
+_registry_lock = threading.Lock()
+
+
+def _cached(key: tuple, factory: Callable):
+    with _registry_lock:
+        client = _registry.get(key)
+    if client is not None:
+        return client
+    # Build outside the lock; failures are not cached so a later call can retry.
+    client = factory()
+    with _registry_lock:
+        return _registry.setdefault(key, client)
+
+
+def _build_openai_chat(model: str, temperature: float):
+    # FIX: Updated import to use langchain_openai
+    from langchain_openai import ChatOpenAI
+    from models.http_pool import get_http_client
+    return ChatOpenAI(openai_api_key=OPENAI_API_KEY, model=model, temperature=temperature, http_client=get_http_client())
+
+
+def _build_groq_chat(model: str):
+    from langchain_groq import ChatGroq
+    from models.http_pool import get_http_client
+    return ChatGroq(api_key=GROQ_API_KEY, model=model, http_client=get_http_client())
+
 
 def get_chat_model(provider_preference: str = "auto"):
     provider_preference = provider_preference.lower()
     # Try OpenAI
     if provider_preference in ("openai", "auto") and OPENAI_API_KEY:
         try:
-            # FIX: Updated import to use langchain_openai
-            from langchain_openai import ChatOpenAI
             # default to a reliable model; change if needed
-            chat = ChatOpenAI(openai_api_key=OPENAI_API_KEY, model="gpt-4o-mini", temperature=0.1)
-            return chat
+            return _cached(("openai", OPENAI_CHAT_MODEL, 0.1), lambda: _build_openai_chat(OPENAI_CHAT_MODEL, 0.1))
         except Exception as e:
             print(f"[llm] OpenAI init failed: {e}")
 
     # Try Groq
     if GROQ_API_KEY:
         try:
-            from langchain_groq import ChatGroq
-            groq = ChatGroq(api_key=GROQ_API_KEY, model="mixtral-8x7b-32768")
-            return groq
+            return _cached(("groq", GROQ_CHAT_MODEL), lambda: _build_groq_chat(GROQ_CHAT_MODEL))
         except Exception as e:
             print(f"[llm] Groq init failed: {e}")
 
     return None
+
+
+def get_openai_client():
+    """Shared OpenAI SDK client (Whisper etc.) on the pooled transport."""
+    def _build():
+        from openai import OpenAI
+        from models.http_pool import get_http_client
+        return OpenAI(api_key=OPENAI_API_KEY, http_client=get_http_client())
+    return _cached(("openai-sdk",), _build)
+
+
+def registry_stats() -> Dict:
+    from models.http_pool import pool_stats
+    with _registry_lock:
+        clients = ["/".join(str(p) for p in key) for key in _registry]
+    return {"clients": clients, "pool": pool_stats()}
+
+
+def to_langchain_messages(messages: List[Dict], system_prompt: Optional[str] = None) -> List:
+    """[{"role", "content"}] dicts as LangChain messages, led by `system_prompt`."""
+    from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+    lmsgs = []
+    if system_prompt:
+        lmsgs.append(SystemMessage(content=system_prompt))
+    for m in messages:
+        if m["role"] == "user":
+            lmsgs.append(HumanMessage(content=m["content"]))
+        elif m["role"] == "system":
+            lmsgs.append(SystemMessage(content=m["content"]))
+        else:
+            lmsgs.append(AIMessage(content=m["content"]))
+    return lmsgs
+
+
+@traced("llm.chat")
+def chat_response(chat_model, messages: List[Dict], system_prompt: Optional[str] = None) -> str:
+    """Whole reply text for `messages`; errors are returned as text."""
+    try:
+        resp = chat_model.invoke(to_langchain_messages(messages, system_prompt))
+        return getattr(resp, "content", str(resp))
+    except Exception as e:
+        return f"LLM error: {e}"
+
+
+def stream_chat(chat_model, messages, stats: Optional[Dict] = None) -> Iterator[str]:
+    """
+    Yield the reply text of `chat_model` piece by piece as it is generated.
+    If `stats` is given it is filled with time-to-first-token, chunk count
+    (roughly one token per chunk for OpenAI/Groq) and tokens/sec. A failure,
+    possibly after some text was yielded, is re-raised and recorded in
+    stats["error"], so callers can tell a partial reply from a complete one.
+    """
+    if stats is None:
+        stats = {}
+    start = time.perf_counter()
+    first = None
+    chunks = 0
+    try:
+        for chunk in chat_model.stream(messages):
+            text = getattr(chunk, "content", chunk)
+            if not text:
+                continue
+            if first is None:
+                first = time.perf_counter()
+                stats["ttft_s"] = first - start
+            chunks += 1
+            yield text
+    except Exception as e:
+        stats["error"] = str(e) or type(e).__name__
+        raise
+    end = time.perf_counter()
+    stats["total_s"] = end - start
+    stats["tokens"] = chunks
+    gen_time = end - first if first is not None else 0.0
+    stats["tokens_per_s"] = chunks / gen_time if gen_time > 0 else 0.0
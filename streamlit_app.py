@@ -1,18 +1,23 @@
 # app.py
 import streamlit as st
-from config.config import VECTOR_STORE_DIR
-from models.llm import get_chat_model
-from utils.rag_utils import load_documents_from_file, build_vector_store, query_vector_store
-from utils.web_search import web_search
-from utils.memory import new_session_id, save_message, load_session_messages, dump_session_json, list_sessions, _conn
-from utils.voice import transcribe_with_openai
-from utils.voice_tts import synthesize_text_to_mp3
-
-from langchain_core.messages import HumanMessage, SystemMessage, AIMessage
+from config.config import RESPONSE_CACHE_SIMILARITY, CHAT_HISTORY_PAGE_SIZE, CHAT_HISTORY_WINDOW, RAG_TOP_K
+from models.llm import get_chat_model, stream_chat, chat_response, to_langchain_messages, registry_stats
+from utils.rag_utils import (
+    query_vector_store, list_indexed_sources, purge_sources,
+    DEFAULT_COLLECTION, collection_dir, get_collection, create_collection, list_collections, clear_collection,
+)
+from utils import response_cache
+from utils import analytics
+from utils import jobs
+from utils import tracing
+from utils import conversation
+from utils.voice_tts import cached_reply, cached_segments
+from utils.context_builder import build_context, token_budget_for, count_tokens
+from utils.memory import init_memory, new_session_id, save_message, load_session_messages, load_messages_page, count_session_messages, dump_session_json, list_sessions, get_conn
+
 import os
+import json
 import datetime
-import pandas as pd
-import matplotlib.pyplot as plt
 
 st.set_page_config(page_title="NeoStats Chatbot Blueprint", page_icon="🤖", layout="wide")
 st.title("NeoStats — Chatbot Blueprint (RAG + Web Search + Memory + Voice)")
@@ -28,14 +33,49 @@ with st.sidebar:
     mode = st.radio("Response mode", ["Concise", "Detailed"], index=0)
     provider = st.selectbox("LLM Provider", ["auto", "openai", "groq"])
     st.divider()
-    if st.button("Clear vector store"):
+    use_answer_cache = st.checkbox("Cache answers to repeated questions", value=False)
+    cache_threshold = st.slider(
+        "Answer cache similarity threshold", 0.80, 1.0, RESPONSE_CACHE_SIMILARITY, 0.01,
+        help="1.0 disables similarity matching (exact repeats only).", disabled=not use_answer_cache,
+    )
+    st.divider()
+    # Each collection is its own index; uploads go to the active one and
+    # queries only search the selected ones.
+    def _create_collection():
+        name = st.session_state.new_collection_name.strip()
         try:
-            import shutil
-            shutil.rmtree(VECTOR_STORE_DIR)
-            os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
-            st.success("Vector store cleared.")
+            create_collection(name)
+        except ValueError as e:
+            st.session_state.collection_error = str(e)
+            return
+        st.session_state.collection = name
+        st.session_state.new_collection_name = ""
+
+    collections = list_collections()
+    if st.session_state.get("collection") not in collections:
+        st.session_state.collection = DEFAULT_COLLECTION
+    collection = st.selectbox("Collection", collections, key="collection")
+    st.text_input("New collection", key="new_collection_name", placeholder="workspace name")
+    st.button("Create collection", on_click=_create_collection)
+    if st.session_state.get("collection_error"):
+        st.error(st.session_state.pop("collection_error"))
+    search_collections = st.multiselect("Search collections", collections, default=[collection])
+    if st.button(f"Clear collection '{collection}'"):
+        try:
+            clear_collection(collection)
+            st.success(f"Collection '{collection}' cleared.")
         except Exception as e:
-            st.error(f"Failed to clear vector store: {e}")
+            st.error(f"Failed to clear collection: {e}")
+    indexed = list_indexed_sources(collection_dir(collection))
+    if indexed:
+        to_purge = st.multiselect("Indexed files", indexed, format_func=os.path.basename)
+        if to_purge and st.button("Remove selected files from index"):
+            removed = purge_sources(to_purge, collection_dir(collection))
+            st.success(f"Removed {removed} chunk(s) from the vector store.")
+
+# Heavy features (RAG parsing/FAISS, web search, TTS, analytics charts) import
+# their dependencies on first use; startup only opens the chat database.
+init_memory()
 
 # Session state init
 if "messages" not in st.session_state:
@@ -46,38 +86,105 @@ if "last_rag_index_time" not in st.session_state:
     st.session_state.last_rag_index_time = None
 if "session_id" not in st.session_state:
     st.session_state.session_id = new_session_id()
+
+# History is kept as a bounded window of the most recent messages; older pages
+# are fetched from SQLite on demand (keyset pagination on message id).
+def load_history(session_id):
+    page = load_messages_page(session_id, limit=CHAT_HISTORY_PAGE_SIZE)
+    st.session_state.messages = [{"id": m["id"], "role": m["role"], "content": m["content"]} for m in page]
+    st.session_state.history_window = CHAT_HISTORY_WINDOW
+    st.session_state.has_older_history = count_session_messages(session_id) > len(page)
+
+def load_older_history():
+    msgs = st.session_state.messages
+    before_id = msgs[0]["id"] if msgs else None
+    if before_id is None:
+        st.session_state.has_older_history = False
+        return
+    page = load_messages_page(st.session_state.session_id, limit=CHAT_HISTORY_PAGE_SIZE, before_id=before_id)
+    st.session_state.messages = [{"id": m["id"], "role": m["role"], "content": m["content"]} for m in page] + msgs
+    # Explicitly requested pages widen the window instead of being trimmed right away.
+    st.session_state.history_window = max(st.session_state.history_window, len(st.session_state.messages))
+    # The shown messages are the newest ones without gaps, so the session counter says whether any precede them.
+    st.session_state.has_older_history = count_session_messages(st.session_state.session_id) > len(st.session_state.messages)
+
+def append_message(role, content):
+    mid = save_message(st.session_state.session_id, role, content)
+    st.session_state.messages.append({"id": mid, "role": role, "content": content})
+    overflow = len(st.session_state.messages) - st.session_state.history_window
+    if overflow > 0:
+        del st.session_state.messages[:overflow]
+        st.session_state.has_older_history = True
+    return mid
+
 if "persisted_messages_loaded" not in st.session_state:
-    old = load_session_messages(st.session_state.session_id)
-    if old:
-        st.session_state.messages = [{"role": m["role"], "content": m["content"]} for m in old]
+    load_history(st.session_state.session_id)
     st.session_state.persisted_messages_loaded = True
 
+# Indexing, transcription and TTS run on the background job runner; the page
+# only polls job status, so chat stays responsive and reruns don't cancel work.
+jobs.get_runner()
+
+def show_job(job_id, render):
+    """Call render(job) now and, while the job is unfinished, again every second."""
+    job = jobs.get_job(job_id)
+    active = job is not None and job["status"] not in jobs.FINISHED
+
+    @st.fragment(run_every=1.0 if active else None)
+    def _poll():
+        current = jobs.get_job(job_id)
+        render(current)
+        if active and current is not None and current["status"] in jobs.FINISHED:
+            st.rerun()
+
+    _poll()
+
+def render_job_progress(job, label):
+    st.progress(job["progress"] or 0.0, text=job["message"] or f"{label} ({job['status']})...")
+    if st.button("Cancel", key=f"cancel_{job['id']}"):
+        jobs.cancel(job["id"])
+
 # Document upload & indexing
 st.subheader("1) Upload & Index Documents for RAG")
 uploaded_files = st.file_uploader("Upload files (PDF, DOCX, TXT)", accept_multiple_files=True)
 if uploaded_files:
     st.write(f"{len(uploaded_files)} file(s) uploaded.")
     if st.button("Index uploaded files for RAG"):
-        with st.spinner("Indexing documents... Please wait."):
-            docs = []
-            tmp_dir = "uploaded_docs"
-            os.makedirs(tmp_dir, exist_ok=True)
-            for f in uploaded_files:
-                path = os.path.join(tmp_dir, f.name)
-                with open(path, "wb") as out:
-                    out.write(f.read())
-                loaded = load_documents_from_file(path)
-                docs.extend(loaded)
-            if not docs:
-                st.error("No documents loaded or failed to parse files.")
-            else:
-                try:
-                    build_vector_store(docs)
-                    st.session_state.db_available = True
-                    st.session_state.last_rag_index_time = datetime.datetime.now().isoformat()
-                    st.success("Indexed documents into vector store.")
-                except Exception as e:
-                    st.error(f"Indexing failed: {e}")
+        paths = []
+        tmp_dir = "uploaded_docs"
+        os.makedirs(tmp_dir, exist_ok=True)
+        for f in uploaded_files:
+            path = os.path.join(tmp_dir, f.name)
+            with open(path, "wb") as out:
+                out.write(f.read())
+            paths.append(path)
+        st.session_state.index_job = jobs.submit_index(paths, collection_dir(collection))
+        st.session_state.index_job_collection = collection
+
+def render_index_job(job):
+    if job is None:
+        return
+    if job["status"] not in jobs.FINISHED:
+        render_job_progress(job, "Indexing")
+    elif job["status"] == jobs.DONE:
+        stats = job["result"]
+        if stats["files_failed"] == len(job["payload"]["paths"]):
+            st.error("No documents loaded or failed to parse files.")
+        else:
+            st.session_state.db_available = True
+            st.session_state.last_rag_index_time = datetime.datetime.fromtimestamp(job["finished_at"]).isoformat()
+            st.success(
+                f"Indexed documents into collection '{st.session_state.index_job_collection}': {stats.get('files_indexed', 0)} file(s) indexed, "
+                f"{stats.get('files_skipped', 0)} unchanged, {stats.get('chunks_added', 0)} chunk(s) added, "
+                f"{stats.get('chunks_removed', 0)} removed."
+            )
+    elif job["status"] == jobs.CANCELLED:
+        st.warning("Indexing cancelled; files indexed before cancelling were kept.")
+    else:
+        st.error(f"Indexing failed: {job['error']}")
+
+if st.session_state.get("index_job"):
+    show_job(st.session_state.index_job, render_index_job)
 
 st.markdown("---")
 
@@ -104,25 +211,24 @@ system_prompt_input = st.text_area("System prompt", value=final_system_prompt, h
 use_rag = st.checkbox("Enable RAG retrieval", value=True)
 use_web_search = st.checkbox("Allow web search (use 'web:' prefix)", value=False)
 
+def _to_langchain_messages(messages):
+    return to_langchain_messages(messages, system_prompt_input)
+
 def llm_chat_response(messages):
-    try:
-        lmsgs = []
-        if system_prompt_input:
-            lmsgs.append(SystemMessage(content=system_prompt_input))
-        for m in messages:
-            if m["role"] == "user":
-                lmsgs.append(HumanMessage(content=m["content"]))
-            else:
-                lmsgs.append(AIMessage(content=m["content"]))
-        
-        resp = chat_model.invoke(lmsgs)
-        return getattr(resp, "content", str(resp))
+    return chat_response(chat_model, messages, system_prompt_input)
 
+def llm_chat_stream(messages, stats):
+    """Streaming counterpart of llm_chat_response; errors are yielded as text and set stats["error"]."""
+    try:
+        yield from stream_chat(chat_model, _to_langchain_messages(messages), stats)
     except Exception as e:
-        return f"LLM error: {e}"
+        stats.setdefault("error", str(e) or type(e).__name__)
+        yield f"LLM error: {e}"
 
 with chat_col:
     # Render existing messages
+    if st.session_state.get("has_older_history") and st.button("Load older messages"):
+        load_older_history()
     for msg in st.session_state.messages:
         st.chat_message(msg["role"]).markdown(msg["content"])
 
@@ -130,30 +236,42 @@ with chat_col:
     st.markdown("**Voice input (file)**")
     audio_file = st.file_uploader("Upload audio for transcription (wav/mp3/m4a/ogg)", type=["wav","mp3","m4a","ogg"])
     if audio_file:
-        bytes_data = audio_file.read()
-        st.info("Transcribing...")
-        res = transcribe_with_openai(bytes_data, filename=audio_file.name)
-        if res.get("error"):
-            st.error("Transcription error: " + res["error"])
-        else:
-            transcript = res.get("text", "")
-            st.success("Transcription complete:")
-            st.write(transcript)
-            if st.button("Send transcription as message"):
-                st.session_state.messages.append({"role":"user","content":transcript})
-                save_message(st.session_state.session_id, "user", transcript)
-                st.rerun() # FIX: Replaced deprecated experimental_rerun
+        # One job per uploaded file, so reruns poll it instead of resubmitting.
+        transcribe_jobs = st.session_state.setdefault("transcribe_jobs", {})
+        file_key = f"{audio_file.name}:{audio_file.size}"
+        if file_key not in transcribe_jobs:
+            transcribe_jobs[file_key] = jobs.submit_transcription(audio_file.getvalue(), audio_file.name)
+
+        def render_transcription(job):
+            if job is None:
+                return
+            if job["status"] not in jobs.FINISHED:
+                render_job_progress(job, "Transcribing")
+            elif job["status"] == jobs.DONE:
+                transcript = job["result"].get("text", "")
+                st.success("Transcription complete:")
+                st.write(transcript)
+                if st.button("Send transcription as message"):
+                    append_message("user", transcript)
+                    st.rerun() # FIX: Replaced deprecated experimental_rerun
+            elif job["status"] == jobs.CANCELLED:
+                st.warning("Transcription cancelled.")
+            else:
+                st.error("Transcription error: " + (job["error"] or "unknown error"))
+
+        show_job(transcribe_jobs[file_key], render_transcription)
 
     user_input = st.chat_input("Type a message or use voice upload above")
     if user_input:
-        st.session_state.messages.append({"role":"user","content":user_input})
-        save_message(st.session_state.session_id, "user", user_input)
-        st.chat_message("user").markdown(user_input)
+        # One trace per turn; stages below (retrieval, LLM, writes) are spans in it.
+        with tracing.span("chat.turn"):
+            user_message_id = append_message("user", user_input)
+            st.chat_message("user").markdown(user_input)
 
-        with st.spinner("Assistant is thinking..."):
             # Web search trigger
             if use_web_search and user_input.strip().lower().startswith(("web:", "search:", "google:")):
                 q = user_input.split(":",1)[1].strip() if ":" in user_input else user_input
+                from utils.web_search import web_search
                 st.info("Running web search...")
                 res = web_search(q, num_results=3)
                 if res.get("error"):
@@ -161,54 +279,156 @@ with chat_col:
                 else:
                     snippets = "\n\n".join([f"- {r['title']}\n{r['snippet']}\n({r['link']})" for r in res.get("results", [])])
                     answer = f"Web search results:\n\n{snippets}"
+                    if res.get("cached"):
+                        st.caption("Served from web search cache")
                 st.chat_message("assistant").markdown(answer)
-                st.session_state.messages.append({"role":"assistant","content":answer})
-                save_message(st.session_state.session_id, "assistant", answer)
+                append_message("assistant", answer)
             else:
                 # RAG retrieval
                 context = ""
+                context_ids = []
+                context_stats = None
                 if use_rag:
-                    try:
-                        docs_and_scores = query_vector_store(user_input, k=4)
-                        if docs_and_scores:
-                            pieces = [doc.page_content for doc, score in docs_and_scores]
-                            context = "\n\n---\n\n".join(pieces)
-                    except Exception as e:
-                        st.warning(f"RAG lookup failed: {e}")
+                    with st.spinner("Searching documents..."):
+                        try:
+                            docs_and_scores = query_vector_store(user_input, k=RAG_TOP_K, collections=search_collections or [collection])
+                            if docs_and_scores:
+                                # Dedupe/merge overlapping chunks and pack to the provider's token budget.
+                                budget, tokenizer_model = token_budget_for(chat_model)
+                                with tracing.span("rag.build_context"):
+                                    context_stats = build_context(docs_and_scores, budget_tokens=budget, model=tokenizer_model)
+                                context = context_stats["context"]
+                                context_ids = response_cache.context_ids_for(context_stats["docs"])
+                        except Exception as e:
+                            st.warning(f"RAG lookup failed: {e}")
 
                 if context:
                     composed_input = f"Context:\n{context}\n\nQuestion: {user_input}"
-                    assistant_reply = llm_chat_response([{"role":"user","content":composed_input}])
                 else:
-                    assistant_reply = llm_chat_response([{"role":"user","content":user_input}])
+                    composed_input = user_input
+
+                # Earlier turns: a rolling summary plus the most recent messages,
+                # kept under CHAT_CONTEXT_TOKENS together with the prompt and input.
+                tokenizer_model = token_budget_for(chat_model)[1]
+                history = {"messages": [], "tokens": 0, "dropped": 0, "summary": ""}
+                try:
+                    history = conversation.build_history(
+                        st.session_state.session_id,
+                        before_id=user_message_id,
+                        reserved_tokens=count_tokens(system_prompt_input + composed_input, tokenizer_model),
+                        model=tokenizer_model,
+                    )
+                except Exception as e:
+                    st.warning(f"Conversation history unavailable: {e}")
 
                 # DELETED: Old, inefficient concise mode logic is no longer needed.
 
-                st.chat_message("assistant").markdown(assistant_reply)
-                st.session_state.messages.append({"role":"assistant","content":assistant_reply})
-                save_message(st.session_state.session_id, "assistant", assistant_reply)
+                cache_scope, cached, question_embedding = None, None, None
+                if use_answer_cache and chat_model is not None:
+                    try:
+                        model_id = f"{type(chat_model).__name__}:{getattr(chat_model, 'model_name', '')}"
+                        cache_scope = response_cache.make_scope(system_prompt_input, model_id, context_ids, history["messages"])
+                        if cache_threshold < 1.0:
+                            question_embedding = get_collection(collection).embeddings.embed_query(response_cache.normalize_question(user_input))
+                        with tracing.span("response_cache.lookup"):
+                            cached = response_cache.lookup(user_input, cache_scope, question_embedding, threshold=cache_threshold)
+                    except Exception as e:
+                        st.warning(f"Answer cache unavailable: {e}")
+
+                # Tokens are rendered as they arrive; the full text is persisted once below.
+                stream_stats = {}
+                with st.chat_message("assistant"):
+                    if cached:
+                        assistant_reply = cached["answer"]
+                        st.markdown(assistant_reply)
+                        st.caption(f"Served from answer cache ({cached['match']} match, similarity {cached['similarity']:.2f})")
+                    elif chat_model is None:
+                        assistant_reply = "LLM error: no chat model configured."
+                        st.markdown(assistant_reply)
+                    else:
+                        with tracing.span("llm.stream"):
+                            assistant_reply = st.write_stream(llm_chat_stream(history["messages"] + [{"role":"user","content":composed_input}], stream_stats))
+                        if stream_stats.get("ttft_s") is not None:
+                            tracing.record("llm.ttft", stream_stats["ttft_s"])
+                        if not isinstance(assistant_reply, str):
+                            assistant_reply = "".join(str(p) for p in assistant_reply)
+                    if context_stats:
+                        st.caption(
+                            f"Context {context_stats['tokens']} tokens "
+                            f"({context_stats['saved_tokens']} saved vs. {context_stats['naive_tokens']} unpacked)"
+                        )
+                    if history["messages"] and not cached:
+                        st.caption(
+                            f"History {history['tokens']} tokens"
+                            + (" incl. summary of earlier turns" if history["summary"] else "")
+                        )
+                    if stream_stats.get("tokens"):
+                        st.caption(
+                            f"First token {stream_stats['ttft_s']:.2f}s · {stream_stats['tokens']} tokens · "
+                            f"{stream_stats['tokens_per_s']:.1f} tok/s"
+                        )
+                st.session_state.last_stream_stats = stream_stats
+                # A stream that failed part-way leaves partial text plus the error; never cache it.
+                if cache_scope and not cached and not stream_stats.get("error"):
+                    try:
+                        response_cache.store(user_input, cache_scope, assistant_reply, question_embedding)
+                    except Exception as e:
+                        print(f"[app] answer cache store failed: {e}")
+                append_message("assistant", assistant_reply)
+                # Turns that left the recent window are folded into the session
+                # summary by a background job, so this run doesn't wait on the LLM.
+                # Most turns have nothing to fold; those don't queue a job.
+                try:
+                    if conversation.summary_due(st.session_state.session_id):
+                        jobs.submit_summary(st.session_state.session_id, provider, tokenizer_model)
+                except Exception as e:
+                    print(f"[app] conversation summary job failed to queue: {e}")
 
                 # TTS moved outside the main logic flow to avoid re-triggering chat
                 st.session_state.last_reply = assistant_reply
 
+            st.session_state.last_trace_id = tracing.current_trace_id()
+
 
     # TTS button for the last reply
     if "last_reply" in st.session_state and st.session_state.last_reply:
         if st.button("Speak last reply (TTS)"):
-            try:
-                mp3_path = synthesize_text_to_mp3(st.session_state.last_reply)
-                with open(mp3_path, "rb") as f:
-                    st.audio(f.read(), format="audio/mp3")
-                os.remove(mp3_path) # Clean up temp file
-            except Exception as e:
-                st.error(f"TTS failed: {e}")
+            # Replies spoken before are played straight from the TTS cache.
+            audio = cached_reply(st.session_state.last_reply)
+            if audio:
+                st.session_state.tts_job = None
+                st.audio(audio, format="audio/mp3")
+            else:
+                st.session_state.tts_job = jobs.submit_tts(st.session_state.last_reply)
+
+    def render_tts(job):
+        if job is None:
+            return
+        text, lang = job["payload"]["text"], job["payload"].get("lang", "en")
+        if job["status"] not in jobs.FINISHED:
+            render_job_progress(job, "Synthesizing speech")
+            # Sentences already synthesized can be played while the rest are generated.
+            for part in cached_segments(text, lang):
+                st.audio(part, format="audio/mp3")
+        elif job["status"] == jobs.DONE:
+            audio = cached_reply(text, lang)
+            if audio:
+                st.audio(audio, format="audio/mp3")
+            else:
+                st.warning("Synthesized audio is no longer cached; press the button again.")
+        elif job["status"] == jobs.FAILED:
+            st.error(f"TTS failed: {job['error']}")
+
+    if st.session_state.get("tts_job"):
+        show_job(st.session_state.tts_job, render_tts)
 
 
 with tools_col:
     st.markdown("### Tools & Session")
     if st.button("Export chat (.txt)"):
         out = ""
-        for m in st.session_state.messages:
+        # Export the whole session, not just the in-memory window.
+        for m in load_session_messages(st.session_state.session_id):
             out += f"{m['role'].upper()}: {m['content']}\n\n"
         st.download_button("Download chat history", data=out, file_name="chat_history.txt")
 
@@ -217,62 +437,123 @@ with tools_col:
         with open(path, "rb") as f:
             st.download_button("Download JSON", f, file_name=os.path.basename(path))
 
+    with st.expander("Connection pool"):
+        st.json(registry_stats())
+
+    with st.expander("Background jobs"):
+        for job in jobs.list_jobs(limit=10):
+            st.write(f"**{job['type']}** · {job['status']}" + (f" · {job['progress']:.0%}" if job["status"] == jobs.RUNNING else ""))
+            if job["status"] not in jobs.FINISHED and st.button("Cancel", key=f"cancel_list_{job['id']}"):
+                jobs.cancel(job["id"])
+
     if st.button("Clear chat (current session)"):
         from utils.memory import delete_session
         delete_session(st.session_state.session_id)
-        st.session_state.messages = []
         st.session_state.session_id = new_session_id()
+        load_history(st.session_state.session_id)
         st.rerun() # FIX: Replaced deprecated experimental_rerun
 
     prev = list_sessions(50)
     chosen = st.selectbox("Load previous session", ["-- current --"] + prev)
-    if chosen and chosen != "-- current --":
+    if chosen and chosen != "-- current --" and chosen != st.session_state.session_id:
         st.session_state.session_id = chosen
-        st.session_state.messages = [{"role": m["role"], "content": m["content"]} for m in load_session_messages(chosen)]
+        load_history(chosen)
         st.rerun() # FIX: Replaced deprecated experimental_rerun
 
 st.markdown("---")
 st.subheader("Analytics")
-try:
-    cur = _conn.cursor()
-    cur.execute("SELECT session_id, role, content, created_at FROM messages ORDER BY created_at ASC")
-    rows = cur.fetchall()
-    if not rows:
-        st.info("No message data collected yet.")
-    else:
-        df = pd.DataFrame(rows, columns=["session_id","role","content","created_at"])
-        df["created_at"] = pd.to_datetime(df["created_at"])
-        df["date"] = df["created_at"].dt.date
-        df["length_words"] = df["content"].apply(lambda x: len(x.split()) if isinstance(x, str) else 0)
-
-        st.write("Messages sample:")
-        st.dataframe(df.tail(50))
-
-        # Analytics plots
-        st.write("### Charts")
-        c1, c2, c3 = st.columns(3)
-        with c1:
-            msgs_per_day = df.groupby("date").size()
-            fig1, ax1 = plt.subplots()
-            ax1.plot(msgs_per_day.index, msgs_per_day.values)
-            ax1.set_title("Messages per day")
-            ax1.tick_params(axis='x', rotation=45)
-            st.pyplot(fig1)
-        with c2:
-            fig2, ax2 = plt.subplots()
-            ax2.hist(df["length_words"][df["length_words"] > 0].values, bins=30)
-            ax2.set_title("Message length distribution")
-            st.pyplot(fig2)
-        with c3:
-            top_sessions = df.groupby("session_id").size().nlargest(10)
-            fig3, ax3 = plt.subplots()
-            ax3.bar(range(len(top_sessions)), top_sessions.values)
-            ax3.set_xticks(range(len(top_sessions)))
-            ax3.set_xticklabels([s[:8] for s in top_sessions.index], rotation=45, ha="right")
-            ax3.set_title("Top 10 sessions by messages")
-            st.pyplot(fig3)
-except Exception as e:
-    st.error(f"Analytics failed: {e}")
+show_analytics = st.checkbox("Show analytics", value=False)
+if show_analytics:
+    # pandas and matplotlib are only needed here.
+    import pandas as pd
+    import matplotlib.pyplot as plt
+    try:
+        from models.embedding_cache import embedding_cache_stats
+        cache_stats = embedding_cache_stats()
+        if cache_stats:
+            e1, e2, e3, e4 = st.columns(4)
+            e1.metric("Embedding cache hit rate", f"{cache_stats['hit_rate']:.0%}")
+            e2.metric("Cache hits", cache_stats["hits"])
+            e3.metric("Cache misses", cache_stats["misses"])
+            e4.metric("Cached vectors", f"{cache_stats['entries']} / {cache_stats['max_entries']}")
+    except Exception as e:
+        st.warning(f"Embedding cache stats unavailable: {e}")
+    try:
+        answer_stats = response_cache.stats()
+        if answer_stats["hits_exact"] + answer_stats["hits_semantic"] + answer_stats["misses"]:
+            a1, a2, a3, a4 = st.columns(4)
+            a1.metric("Answer cache hit rate", f"{answer_stats['hit_rate']:.0%}")
+            a2.metric("Exact / similar hits", f"{answer_stats['hits_exact']} / {answer_stats['hits_semantic']}")
+            a3.metric("Answer cache misses", answer_stats["misses"])
+            a4.metric("Cached answers", answer_stats["entries"])
+    except Exception as e:
+        st.warning(f"Answer cache stats unavailable: {e}")
+    try:
+        stage_hists = tracing.histograms()
+        if stage_hists:
+            st.write("### Latency by stage")
+            ms = lambda v: round(v * 1000, 1) if v is not None else None
+            st.dataframe(pd.DataFrame(
+                [
+                    {"stage": stage, "count": h["count"], "p50 ms": ms(h["p50"]), "p95 ms": ms(h["p95"]), "mean ms": ms(h["sum"] / h["count"]) if h["count"] else None}
+                    for stage, h in stage_hists.items()
+                ]
+            ), hide_index=True)
+            last_turn = tracing.recent_spans(st.session_state.get("last_trace_id")) if st.session_state.get("last_trace_id") else []
+            if last_turn:
+                with st.expander("Last turn breakdown"):
+                    st.dataframe(pd.DataFrame(
+                        [{"stage": s["stage"], "ms": ms(s["duration_s"]), "error": s["error"]} for s in sorted(last_turn, key=lambda s: s["start"])]
+                    ), hide_index=True)
+            t1, t2 = st.columns(2)
+            t1.download_button("Export latency (JSON)", data=json.dumps(tracing.export_json(), indent=2), file_name="latency.json")
+            t2.download_button("Export latency (Prometheus)", data=tracing.export_prometheus(), file_name="latency.prom")
+    except Exception as e:
+        st.warning(f"Latency stats unavailable: {e}")
+    try:
+        # Charts are served from rollup tables, so this doesn't grow with history size.
+        conn = get_conn()
+        if analytics.backfill_pending(conn):
+            # Older history is counted a bounded chunk per rerun.
+            analytics.backfill(conn, max_batches=4)
+            if analytics.backfill_pending(conn):
+                st.info("Backfilling analytics for older messages; charts are partial for now.")
+        if not analytics.total_messages(conn):
+            st.info("No message data collected yet.")
+        else:
+            df = pd.DataFrame(analytics.recent_messages(conn, 50), columns=["session_id","role","content","created_at"])
+
+            st.write("Messages sample:")
+            st.dataframe(df)
+
+            # Analytics plots
+            st.write("### Charts")
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                msgs_per_day = analytics.messages_per_day(conn)
+                fig1, ax1 = plt.subplots()
+                ax1.plot(pd.to_datetime([d for d, _ in msgs_per_day]), [n for _, n in msgs_per_day])
+                ax1.set_title("Messages per day")
+                ax1.tick_params(axis='x', rotation=45)
+                st.pyplot(fig1)
+            with c2:
+                fig2, ax2 = plt.subplots()
+                hist = analytics.length_histogram(conn)
+                ax2.bar(range(len(hist)), [n for _, n in hist])
+                ax2.set_xticks(range(len(hist)))
+                ax2.set_xticklabels([label for label, _ in hist], rotation=90, fontsize=7)
+                ax2.set_title("Message length distribution (words)")
+                st.pyplot(fig2)
+            with c3:
+                top_sessions = analytics.top_sessions(conn, 10)
+                fig3, ax3 = plt.subplots()
+                ax3.bar(range(len(top_sessions)), [n for _, n in top_sessions])
+                ax3.set_xticks(range(len(top_sessions)))
+                ax3.set_xticklabels([s[:8] for s, _ in top_sessions], rotation=45, ha="right")
+                ax3.set_title("Top 10 sessions by messages")
+                st.pyplot(fig3)
+    except Exception as e:
+        st.error(f"Analytics failed: {e}")
 
 st.markdown("---")
 st.caption("Extend with streamlit-webrtc for in-browser recording or replace FAISS with Chroma if FAISS install fails.")
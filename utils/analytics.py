@@ -0,0 +1,129 @@
+# utils/analytics.py
+import sqlite3
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+# Rollups behind the Analytics section. New messages are counted in the same
+# transaction that saves them (utils.memory._insert_messages); history that
+# predates the rollup tables is backfilled in batches from a rowid watermark.
+
+# Word-length histogram buckets are BUCKET_WIDTH words wide; the last one is open-ended.
+BUCKET_WIDTH = 10
+MAX_BUCKET = 50
+
+
+def length_bucket(content: str) -> int:
+    words = len(content.split()) if isinstance(content, str) else 0
+    if words == 0:
+        return -1
+    return min(words // BUCKET_WIDTH, MAX_BUCKET)
+
+
+def _aggregate(rows: Iterable[Tuple[str, str]]) -> Tuple[Counter, Counter]:
+    """rows of (created_at, content) -> (per-day counts, per-bucket counts)."""
+    days, buckets = Counter(), Counter()
+    for created_at, content in rows:
+        days[(created_at or "")[:10]] += 1
+        b = length_bucket(content)
+        if b >= 0:
+            buckets[b] += 1
+    return days, buckets
+
+
+def _apply(conn: sqlite3.Connection, days: Counter, buckets: Counter, sign: int = 1):
+    conn.executemany(
+        "INSERT INTO rollup_daily (day, count) VALUES (?, ?) ON CONFLICT(day) DO UPDATE SET count = count + excluded.count",
+        [(d, sign * n) for d, n in days.items()],
+    )
+    conn.executemany(
+        "INSERT INTO rollup_length (bucket, count) VALUES (?, ?) ON CONFLICT(bucket) DO UPDATE SET count = count + excluded.count",
+        [(b, sign * n) for b, n in buckets.items()],
+    )
+
+
+def record_messages(conn: sqlite3.Connection, rows: List[tuple]):
+    """Count freshly inserted (id, session_id, role, content, created_at) rows; caller commits."""
+    days, buckets = _aggregate((r[4], r[3]) for r in rows)
+    _apply(conn, days, buckets)
+
+
+def _state(conn: sqlite3.Connection) -> Dict[str, str]:
+    return dict(conn.execute("SELECT key, value FROM analytics_state").fetchall())
+
+
+def forget_session(conn: sqlite3.Connection, session_id: str):
+    """Subtract a session's already-counted messages before it is deleted; caller commits."""
+    state = _state(conn)
+    watermark = int(state.get("watermark", 0))
+    started_at = state.get("live_since", "")
+    rows = conn.execute(
+        "SELECT created_at, content FROM messages WHERE session_id = ? AND (created_at >= ? OR rowid <= ?)",
+        (session_id, started_at, watermark),
+    ).fetchall()
+    days, buckets = _aggregate(rows)
+    _apply(conn, days, buckets, sign=-1)
+
+
+def backfill(conn: sqlite3.Connection, batch_size: int = 50000, max_batches: int = None) -> int:
+    """
+    Count pre-existing history (rows older than the rollup tables) from the
+    watermark onwards. Returns rows processed; 0 once fully caught up.
+    """
+    state = _state(conn)
+    watermark = int(state.get("watermark", 0))
+    upto = int(state.get("backfill_upto", 0))
+    started_at = state.get("live_since", "")
+    processed, batches = 0, 0
+    while watermark < upto and (max_batches is None or batches < max_batches):
+        rows = conn.execute(
+            "SELECT rowid, created_at, content FROM messages WHERE rowid > ? AND rowid <= ? ORDER BY rowid LIMIT ?",
+            (watermark, upto, batch_size),
+        ).fetchall()
+        if not rows:
+            watermark = upto
+        else:
+            # Rows created after the switch-over were already counted live.
+            days, buckets = _aggregate((r[1], r[2]) for r in rows if (r[1] or "") < started_at)
+            _apply(conn, days, buckets)
+            watermark = rows[-1][0]
+            processed += len(rows)
+        conn.execute("UPDATE analytics_state SET value = ? WHERE key = 'watermark'", (str(watermark),))
+        conn.commit()
+        batches += 1
+    return processed
+
+
+def backfill_pending(conn: sqlite3.Connection) -> bool:
+    state = _state(conn)
+    return int(state.get("watermark", 0)) < int(state.get("backfill_upto", 0))
+
+
+def messages_per_day(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+    return conn.execute("SELECT day, count FROM rollup_daily WHERE count > 0 ORDER BY day").fetchall()
+
+
+def length_histogram(conn: sqlite3.Connection) -> List[Tuple[str, int]]:
+    rows = conn.execute("SELECT bucket, count FROM rollup_length WHERE count > 0 ORDER BY bucket").fetchall()
+    labels = []
+    for b, n in rows:
+        lo = b * BUCKET_WIDTH
+        labels.append((f"{lo}+" if b == MAX_BUCKET else f"{lo}-{lo + BUCKET_WIDTH - 1}", n))
+    return labels
+
+
+def top_sessions(conn: sqlite3.Connection, limit: int = 10) -> List[Tuple[str, int]]:
+    return conn.execute(
+        "SELECT session_id, message_count FROM sessions ORDER BY message_count DESC LIMIT ?", (limit,)
+    ).fetchall()
+
+
+def recent_messages(conn: sqlite3.Connection, limit: int = 50) -> List[Tuple]:
+    rows = conn.execute(
+        "SELECT session_id, role, content, created_at FROM messages ORDER BY created_at DESC LIMIT ?", (limit,)
+    ).fetchall()
+    return list(reversed(rows))
+
+
+def total_messages(conn: sqlite3.Connection) -> int:
+    row = conn.execute("SELECT SUM(message_count) FROM sessions").fetchone()
+    return row[0] or 0
@@ -0,0 +1,160 @@
+# utils/context_builder.py
+import re
+from typing import Dict, List, Optional, Tuple
+from langchain_core.documents import Document
+from config.config import RAG_MAX_DISTANCE, RAG_CONTEXT_TOKENS, RAG_CONTEXT_TOKENS_GROQ
+
+SEPARATOR = "\n\n---\n\n"
+# Longest suffix/prefix overlap searched when chunks carry no start_index.
+MAX_TEXT_OVERLAP = 400
+MIN_TEXT_OVERLAP = 20
+
+_encodings = {}
+
+
+def _encoding(model: Optional[str]):
+    import tiktoken
+    key = model or ""
+    if key not in _encodings:
+        try:
+            _encodings[key] = tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            _encodings[key] = tiktoken.get_encoding("cl100k_base")
+    return _encodings[key]
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    return len(_encoding(model).encode(text)) if text else 0
+
+
+def truncate_tokens(text: str, max_tokens: int, model: Optional[str] = None, keep_end: bool = False) -> str:
+    """Cut `text` to at most `max_tokens` tokens, keeping its start (or its end)."""
+    enc = _encoding(model)
+    tokens = enc.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+    return enc.decode(tokens[-max_tokens:] if keep_end else tokens[:max_tokens])
+
+
+def token_budget_for(chat_model) -> Tuple[int, Optional[str]]:
+    """(context token budget, tokenizer model name) for the given chat model."""
+    name = type(chat_model).__name__ if chat_model is not None else ""
+    model = getattr(chat_model, "model_name", None)
+    if name == "ChatGroq":
+        # Groq models use their own tokenizers; cl100k is a close enough estimate.
+        return RAG_CONTEXT_TOKENS_GROQ, None
+    return RAG_CONTEXT_TOKENS, model
+
+
+def _norm(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+
+def _text_overlap(a: str, b: str) -> int:
+    """Length of the longest suffix of `a` that is a prefix of `b`."""
+    for k in range(min(len(a), len(b), MAX_TEXT_OVERLAP), MIN_TEXT_OVERLAP - 1, -1):
+        if a.endswith(b[:k]):
+            return k
+    return 0
+
+
+class _Piece:
+    def __init__(self, doc: Document, rank: int):
+        self.text = doc.page_content
+        self.start = doc.metadata.get("start_index")
+        self.rank = rank
+        self.docs = [doc]
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+    def try_merge(self, other: "_Piece") -> bool:
+        """Absorb `other` if it overlaps or directly follows this piece."""
+        if self.start is not None and other.start is not None:
+            if other.start > self.end:
+                return False
+            if other.end > self.end:
+                self.text += other.text[self.end - other.start:]
+        else:
+            if other.text in self.text:
+                pass
+            else:
+                k = _text_overlap(self.text, other.text)
+                if not k:
+                    return False
+                self.text += other.text[k:]
+        self.rank = min(self.rank, other.rank)
+        self.docs.extend(other.docs)
+        return True
+
+
+def build_context(docs_and_scores: List[Tuple[Document, float]], budget_tokens: int = RAG_CONTEXT_TOKENS, model: Optional[str] = None, max_distance: Optional[float] = RAG_MAX_DISTANCE) -> Dict:
+    """
+    Assemble RAG context from (doc, L2 distance) hits, given best first: drop
+    hits beyond `max_distance` (hits without a distance, e.g. keyword-only
+    matches from hybrid retrieval, are kept), merge overlapping/adjacent chunks of the same source,
+    drop near-duplicates, then pack best-first into `budget_tokens`.
+    Returns {"context", "docs", "tokens", "naive_tokens", "saved_tokens"}.
+    """
+    enc = _encoding(model)
+    naive_tokens = len(enc.encode(SEPARATOR.join(d.page_content for d, _ in docs_and_scores))) if docs_and_scores else 0
+
+    hits = [d for d, s in docs_and_scores if max_distance is None or s is None or s <= max_distance]
+    # Group by source (and page) and merge neighbours in document order.
+    groups: Dict[tuple, List[_Piece]] = {}
+    for rank, d in enumerate(hits):
+        groups.setdefault((d.metadata.get("source"), d.metadata.get("page")), []).append(_Piece(d, rank))
+    pieces: List[_Piece] = []
+    for group in groups.values():
+        has_offsets = all(p.start is not None for p in group)
+        group.sort(key=(lambda p: p.start) if has_offsets else (lambda p: p.rank))
+        merged: List[_Piece] = []
+        for p in group:
+            if not has_offsets:
+                p.start = None
+            if merged and merged[-1].try_merge(p):
+                continue
+            if not has_offsets and any(m.try_merge(p) for m in merged):
+                continue
+            merged.append(p)
+        pieces.extend(merged)
+
+    # Near-duplicates across sources (same normalized text, or contained in a better piece).
+    pieces.sort(key=lambda p: p.rank)
+    kept: List[_Piece] = []
+    for p in pieces:
+        norm = _norm(p.text)
+        if any(norm in _norm(k.text) for k in kept):
+            continue
+        kept.append(p)
+
+    parts, used_docs, used = [], [], 0
+    sep_tokens = len(enc.encode(SEPARATOR))
+    for p in kept:
+        cost = len(enc.encode(p.text)) + (sep_tokens if parts else 0)
+        room = budget_tokens - used
+        if cost <= room:
+            parts.append(p.text)
+        elif room - sep_tokens >= 50:
+            # Truncate the last piece at a token boundary rather than dropping it.
+            parts.append(enc.decode(enc.encode(p.text)[: room - (sep_tokens if parts else 0)]))
+            cost = room
+        else:
+            break
+        used += cost
+        used_docs.extend(p.docs)
+        if used >= budget_tokens:
+            break
+
+    context = SEPARATOR.join(parts)
+    tokens = len(enc.encode(context)) if context else 0
+    return {
+        "context": context,
+        "docs": used_docs,
+        "tokens": tokens,
+        "naive_tokens": naive_tokens,
+        "saved_tokens": max(0, naive_tokens - tokens),
+    }
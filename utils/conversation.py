@@ -0,0 +1,123 @@
+# utils/conversation.py
+import re
+from typing import Callable, Dict, List, Optional
+from config.config import CHAT_CONTEXT_TOKENS, CHAT_CONTEXT_RECENT_MESSAGES, CHAT_SUMMARY_TOKENS, CHAT_SUMMARY_MAX_FOLD
+from utils import memory, tracing
+from utils.context_builder import count_tokens, truncate_tokens
+
+# Multi-turn context for the LLM: the last CHAT_CONTEXT_RECENT_MESSAGES
+# messages verbatim plus a rolling summary of everything older, kept on the
+# session row in chat memory. After each turn the messages that slid out of
+# the recent window are folded into the summary (at most CHAT_SUMMARY_MAX_FOLD
+# per update), so a turn reads and writes a bounded amount of history and its
+# prompt stays under CHAT_CONTEXT_TOKENS however long the session runs.
+
+SUMMARY_HEADER = "Summary of the earlier conversation:\n"
+# Rough per-message cost of the chat format (role markers, separators).
+MESSAGE_OVERHEAD_TOKENS = 4
+# Each message is clipped to this many tokens when sent to the summarizer.
+FOLD_MESSAGE_TOKENS = 300
+
+SUMMARY_PROMPT = (
+    "You maintain a running summary of a conversation between a user and an assistant. "
+    "Merge the new messages into the current summary. Keep facts, names, numbers, decisions, "
+    "user preferences and open questions the assistant may need later; drop greetings and filler. "
+    "Reply with the updated summary only, in at most {words} words."
+)
+
+Summarizer = Callable[[str, List[Dict]], str]
+
+
+def _clip(text: str, max_chars: int) -> str:
+    text = re.sub(r"\s+", " ", text).strip()
+    return text if len(text) <= max_chars else text[: max_chars - 3] + "..."
+
+
+def extractive_summarizer(summary: str, messages: List[Dict]) -> str:
+    """Fallback without an LLM: the previous summary plus one clipped line per message."""
+    lines = [f"{m['role']}: {_clip(m['content'], 200)}" for m in messages]
+    return "\n".join(([summary] if summary else []) + lines)
+
+
+def llm_summarizer(chat_model, model: Optional[str] = None) -> Summarizer:
+    """Summarizer that asks `chat_model` to merge new messages into the summary."""
+    from langchain_core.messages import HumanMessage, SystemMessage
+
+    def summarize(summary: str, messages: List[Dict]) -> str:
+        transcript = "\n".join(f"{m['role']}: {truncate_tokens(m['content'], FOLD_MESSAGE_TOKENS, model)}" for m in messages)
+        resp = chat_model.invoke([
+            SystemMessage(content=SUMMARY_PROMPT.format(words=int(CHAT_SUMMARY_TOKENS * 0.75))),
+            HumanMessage(content=f"Current summary:\n{summary or '(none)'}\n\nNew messages:\n{transcript}"),
+        ])
+        return getattr(resp, "content", str(resp))
+
+    return summarize
+
+
+@tracing.traced("chat.history")
+def build_history(session_id: str, before_id: Optional[str] = None, reserved_tokens: int = 0, budget_tokens: int = CHAT_CONTEXT_TOKENS, model: Optional[str] = None) -> Dict:
+    """
+    Prior turns to send ahead of the current message `before_id` (excluded).
+    `reserved_tokens` (system prompt + current input) count against
+    `budget_tokens`; the summary takes up to CHAT_SUMMARY_TOKENS of the rest
+    and recent messages fill what remains, newest first.
+    Returns {"messages": [{"role", "content"}], "summary", "tokens", "dropped"}.
+    """
+    summary, upto = memory.get_session_summary(session_id)
+    recent = memory.load_messages_between(session_id, after_id=upto, before_id=before_id, limit=CHAT_CONTEXT_RECENT_MESSAGES)
+    room = max(0, budget_tokens - reserved_tokens)
+
+    used = 0
+    summary_text = ""
+    if summary:
+        header_cost = count_tokens(SUMMARY_HEADER, model) + MESSAGE_OVERHEAD_TOKENS
+        summary_room = min(CHAT_SUMMARY_TOKENS, room - header_cost)
+        if summary_room > 0:
+            summary_text = truncate_tokens(summary, summary_room, model, keep_end=True)
+            used = header_cost + count_tokens(summary_text, model)
+
+    kept = []
+    for m in reversed(recent):
+        cost = count_tokens(m["content"], model) + MESSAGE_OVERHEAD_TOKENS
+        if used + cost > room:
+            break
+        kept.append(m)
+        used += cost
+    kept.reverse()
+
+    messages = [{"role": "system", "content": SUMMARY_HEADER + summary_text}] if summary_text else []
+    messages.extend({"role": m["role"], "content": m["content"]} for m in kept)
+    return {"messages": messages, "summary": summary_text, "tokens": used, "dropped": len(recent) - len(kept)}
+
+
+@tracing.traced("chat.summarize")
+def update_summary(session_id: str, summarize: Optional[Summarizer] = None, model: Optional[str] = None) -> int:
+    """
+    Fold the messages that slid out of the recent window into the session's
+    rolling summary. Falls back to `extractive_summarizer` if `summarize` is
+    None or fails. Returns the number of messages folded.
+    """
+    summary, upto = memory.get_session_summary(session_id)
+    window = memory.load_messages_between(session_id, after_id=upto, limit=CHAT_CONTEXT_RECENT_MESSAGES)
+    if len(window) < CHAT_CONTEXT_RECENT_MESSAGES:
+        return 0
+    pending = memory.load_messages_between(session_id, after_id=upto, before_id=window[0]["id"], limit=CHAT_SUMMARY_MAX_FOLD, latest=False)
+    if not pending:
+        return 0
+    new_summary = None
+    if summarize is not None:
+        try:
+            new_summary = summarize(summary, pending)
+        except Exception as e:
+            print(f"[conversation] summarizer failed, using extractive fallback: {e}")
+    if not new_summary:
+        new_summary = extractive_summarizer(summary, pending)
+    new_summary = truncate_tokens(new_summary.strip(), CHAT_SUMMARY_TOKENS, model, keep_end=True)
+    memory.save_session_summary(session_id, new_summary, pending[-1]["id"], folded=len(pending))
+    return len(pending)
+
+
+def summary_due(session_id: str) -> bool:
+    """Whether messages have slid past the recent window, i.e. `update_summary` would fold any."""
+    unsummarized = memory.count_session_messages(session_id) - memory.count_summarized_messages(session_id)
+    return unsummarized > CHAT_CONTEXT_RECENT_MESSAGES
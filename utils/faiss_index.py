@@ -0,0 +1,179 @@
+# utils/faiss_index.py
+import math
+from typing import Iterable, List, Optional
+
+import faiss
+import numpy as np
+from config.config import (
+    RAG_INDEX_TYPE, RAG_HNSW_MIN_VECTORS, RAG_IVF_MIN_VECTORS, RAG_IVFPQ_MIN_VECTORS,
+    RAG_NPROBE, RAG_EF_SEARCH,
+)
+
+# Index kinds from cheapest to most scalable. All use L2 distance, like the
+# IndexFlatL2 LangChain creates by default, so scores stay comparable.
+KINDS = ("flat", "hnsw", "ivf_flat", "ivf_pq")
+HNSW_M = 32
+
+
+def select_kind(n_vectors: int, configured: str = RAG_INDEX_TYPE) -> str:
+    if configured != "auto":
+        return configured
+    if n_vectors >= RAG_IVFPQ_MIN_VECTORS:
+        return "ivf_pq"
+    if n_vectors >= RAG_IVF_MIN_VECTORS:
+        return "ivf_flat"
+    if n_vectors >= RAG_HNSW_MIN_VECTORS:
+        return "hnsw"
+    return "flat"
+
+
+def effective_kind(kind: str, n_vectors: int) -> str:
+    """The kind `build_index` actually builds for `n_vectors`: IVF kinds need enough points to train."""
+    if kind == "ivf_pq" and n_vectors < 256 * 39:
+        kind = "ivf_flat"
+    if kind == "ivf_flat" and n_vectors < 1000:
+        kind = "flat"
+    return "flat" if n_vectors == 0 else kind
+
+
+def kind_of(index) -> str:
+    index = faiss.downcast_index(index)
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def should_rebuild(index, configured: str = RAG_INDEX_TYPE) -> Optional[str]:
+    """Kind to rebuild into, or None. Downgrades only once well below the threshold."""
+    current = kind_of(index)
+    # Compare against what a rebuild would produce, or a configured IVF kind on
+    # a corpus too small to train would be "rebuilt" into the same kind forever.
+    desired = effective_kind(select_kind(index.ntotal, configured), index.ntotal)
+    if desired == current:
+        return None
+    if configured == "auto" and KINDS.index(desired) < KINDS.index(current):
+        floor = {"hnsw": RAG_HNSW_MIN_VECTORS, "ivf_flat": RAG_IVF_MIN_VECTORS, "ivf_pq": RAG_IVFPQ_MIN_VECTORS}[current]
+        if index.ntotal > floor // 2:
+            return None
+    return desired
+
+
+def _nlist(n: int) -> int:
+    # ~4*sqrt(n) lists, with enough training points per list (faiss wants >= 39).
+    return max(1, min(int(4 * math.sqrt(n)), n // 39 or 1, 65536))
+
+
+def _pq_m(dim: int) -> int:
+    for m in (64, 48, 32, 24, 16, 8, 4):
+        if dim % m == 0 and m <= dim // 4:
+            return m
+    return 1
+
+
+def apply_search_params(index, nprobe: int = RAG_NPROBE, ef_search: int = RAG_EF_SEARCH):
+    """Set the nprobe/efSearch knobs on whatever kind of index this is."""
+    kind = kind_of(index)
+    if kind in ("ivf_flat", "ivf_pq"):
+        faiss.extract_index_ivf(index).nprobe = nprobe
+    elif kind == "hnsw":
+        faiss.downcast_index(index).hnsw.efSearch = ef_search
+    return index
+
+
+def build_index(kind: str, vectors: np.ndarray):
+    """New `kind` index trained on and filled with `vectors` (float32, n x d), in order."""
+    n, dim = vectors.shape
+    # Too few points to train the quantizers: fall back to a simpler kind.
+    kind = effective_kind(kind, n)
+    if kind == "flat":
+        index = faiss.IndexFlatL2(dim)
+    elif kind == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, HNSW_M)
+    elif kind in ("ivf_flat", "ivf_pq"):
+        quantizer = faiss.IndexFlatL2(dim)
+        nlist = _nlist(n)
+        if kind == "ivf_flat":
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist)
+        else:
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, _pq_m(dim), 8)
+        index.train(vectors)
+        # Keeps vectors reconstructable by position for later rebuilds.
+        index.make_direct_map()
+    else:
+        raise ValueError(f"Unknown index type: {kind}")
+    if n:
+        index.add(vectors)
+    return apply_search_params(index)
+
+
+def all_vectors(index) -> np.ndarray:
+    """Every stored vector by position (lossy for PQ indexes)."""
+    if index.ntotal == 0:
+        return np.zeros((0, index.d), dtype="float32")
+    if kind_of(index) in ("ivf_flat", "ivf_pq"):
+        ivf = faiss.extract_index_ivf(index)
+        if ivf.direct_map.type == faiss.DirectMap.NoMap:
+            ivf.make_direct_map()
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def snapshot(db, drop_ids: Iterable[str] = ()):
+    """(vectors, index_to_docstore_id) of a LangChain FAISS store, compacted, without `drop_ids`."""
+    drop = set(drop_ids)
+    keep: List[int] = [pos for pos in sorted(db.index_to_docstore_id) if db.index_to_docstore_id[pos] not in drop]
+    vectors = all_vectors(db.index)[keep] if keep else np.zeros((0, db.index.d), dtype="float32")
+    mapping = {new: db.index_to_docstore_id[old] for new, old in enumerate(keep)}
+    return np.ascontiguousarray(vectors, dtype="float32"), mapping
+
+
+def rebuild_store(db, kind: Optional[str] = None, drop_ids: Iterable[str] = ()):
+    """Rebuilt (index, index_to_docstore_id) for `db` as `kind`, optionally without `drop_ids`."""
+    vectors, mapping = snapshot(db, drop_ids)
+    return build_index(kind or kind_of(db.index), vectors), mapping
+
+
+def plan_delete(db, ids: List[str]) -> Optional[tuple]:
+    """
+    Replacement (index, index_to_docstore_id) for `db` without `ids`, built
+    from a read-only snapshot so it can run outside the handle lock while
+    queries continue. None for flat indexes, which delete in place cheaply.
+    Only valid until `db` next changes; writers hold the write lock across
+    planning and applying.
+    """
+    if not ids:
+        return None
+    kind = kind_of(db.index)
+    if kind == "flat":
+        return None
+    vectors, mapping = snapshot(db, ids)
+    if kind in ("ivf_flat", "ivf_pq"):
+        # Reuse the trained quantizers instead of retraining.
+        index = faiss.clone_index(db.index)
+        index.reset()
+        if len(vectors):
+            index.add(vectors)
+        apply_search_params(index)
+    else:
+        index = build_index(kind, vectors)
+    return index, mapping
+
+
+def delete_from_store(db, ids: List[str], replacement: Optional[tuple] = None):
+    """
+    Delete chunk ids from a LangChain FAISS store. Flat indexes use
+    FAISS.delete; other kinds don't renumber on remove_ids the way LangChain
+    expects, so they are swapped for `replacement` from plan_delete (built
+    here if not given).
+    """
+    if not ids:
+        return
+    if kind_of(db.index) == "flat":
+        db.delete(ids)
+        return
+    index, mapping = replacement or plan_delete(db, ids)
+    db.index, db.index_to_docstore_id = index, mapping
+    db.docstore.delete(ids)
@@ -0,0 +1,349 @@
+# utils/jobs.py
+import os
+import json
+import time
+import uuid
+import socket
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from utils.memory import get_conn
+from config.config import (
+    JOB_WORKERS, JOB_CONCURRENCY, JOB_MAX_ATTEMPTS, JOB_STALE_SECONDS,
+    JOB_POLL_INTERVAL, JOB_RETENTION_SECONDS, JOB_DATA_DIR,
+)
+
+# Local job runner for work that shouldn't run in the Streamlit script thread
+# (indexing, transcription, TTS). Jobs are rows in the chat memory SQLite file
+# (table created by memory.MIGRATIONS), so any rerun or process can poll or
+# cancel them. Running jobs heartbeat; a
+# job whose worker died (no heartbeat for JOB_STALE_SECONDS) is requeued, up
+# to JOB_MAX_ATTEMPTS, by whichever runner notices first. Handlers must
+# therefore be safe to re-run.
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _execute(sql: str, params=()) -> int:
+    conn = get_conn()
+    cur = conn.execute(sql, params)
+    conn.commit()
+    return cur.rowcount
+
+
+_COLUMNS = ("id", "type", "status", "payload", "result", "error", "progress", "message", "attempts", "cancel_requested", "created_at", "started_at", "finished_at")
+
+
+def _row_to_job(row) -> Dict:
+    job = dict(zip(_COLUMNS, row))
+    job["payload"] = json.loads(job["payload"])
+    job["result"] = json.loads(job["result"]) if job["result"] else None
+    job["cancel_requested"] = bool(job["cancel_requested"])
+    return job
+
+
+def submit(job_type: str, payload: Dict) -> str:
+    if job_type not in _handlers:
+        raise ValueError(f"Unknown job type: {job_type}")
+    job_id = str(uuid.uuid4())
+    _execute(
+        "INSERT INTO jobs (id, type, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+        (job_id, job_type, QUEUED, json.dumps(payload), time.time()),
+    )
+    if _runner is not None:
+        _runner.wake()
+    return job_id
+
+
+def get_job(job_id: str) -> Optional[Dict]:
+    row = get_conn().execute(f"SELECT {', '.join(_COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+    return _row_to_job(row) if row else None
+
+
+def list_jobs(limit: int = 20, job_type: Optional[str] = None) -> List[Dict]:
+    sql = f"SELECT {', '.join(_COLUMNS)} FROM jobs"
+    params = []
+    if job_type:
+        sql += " WHERE type = ?"
+        params.append(job_type)
+    sql += " ORDER BY created_at DESC LIMIT ?"
+    params.append(limit)
+    rows = get_conn().execute(sql, params).fetchall()
+    return [_row_to_job(r) for r in rows]
+
+
+def cancel(job_id: str) -> bool:
+    """Cancel a queued job now, or ask a running one to stop at its next checkpoint."""
+    now = time.time()
+    if _execute("UPDATE jobs SET status = ?, finished_at = ? WHERE id = ? AND status = ?", (CANCELLED, now, job_id, QUEUED)):
+        return True
+    return bool(_execute("UPDATE jobs SET cancel_requested = 1 WHERE id = ? AND status = ?", (job_id, RUNNING)))
+
+
+def wait(job_id: str, timeout: Optional[float] = None, interval: float = 0.1) -> Optional[Dict]:
+    deadline = None if timeout is None else time.monotonic() + timeout
+    while True:
+        job = get_job(job_id)
+        if job is None or job["status"] in FINISHED:
+            return job
+        if deadline is not None and time.monotonic() >= deadline:
+            return job
+        time.sleep(interval)
+
+
+class JobContext:
+    """Handed to handlers for progress reporting and cooperative cancellation."""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+
+    @property
+    def cancelled(self) -> bool:
+        row = get_conn().execute("SELECT cancel_requested FROM jobs WHERE id = ?", (self.job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def check(self):
+        if self.cancelled:
+            raise JobCancelled()
+
+    def progress(self, fraction: float, message: str = ""):
+        _execute(
+            "UPDATE jobs SET progress = ?, message = ?, heartbeat = ? WHERE id = ?",
+            (max(0.0, min(1.0, fraction)), message, time.time(), self.job_id),
+        )
+        self.check()
+
+
+def _parse_limits(spec: str) -> Dict[str, int]:
+    limits = {}
+    for part in spec.split(","):
+        if "=" in part:
+            name, value = part.split("=", 1)
+            limits[name.strip()] = max(1, int(value))
+    return limits
+
+
+def requeue_stale(now: Optional[float] = None) -> int:
+    """Requeue (or fail, after JOB_MAX_ATTEMPTS) running jobs whose worker stopped heartbeating."""
+    now = now or time.time()
+    cutoff = now - JOB_STALE_SECONDS
+    conn = get_conn()
+    n = conn.execute(
+        "UPDATE jobs SET status = ?, finished_at = ? WHERE status = ? AND heartbeat < ? AND cancel_requested = 1",
+        (CANCELLED, now, RUNNING, cutoff),
+    ).rowcount
+    n += conn.execute(
+        "UPDATE jobs SET status = ?, error = 'worker lost', finished_at = ? WHERE status = ? AND heartbeat < ? AND attempts >= ?",
+        (FAILED, now, RUNNING, cutoff, JOB_MAX_ATTEMPTS),
+    ).rowcount
+    n += conn.execute(
+        "UPDATE jobs SET status = ?, owner = NULL, message = 'resuming after worker loss' WHERE status = ? AND heartbeat < ?",
+        (QUEUED, RUNNING, cutoff),
+    ).rowcount
+    conn.commit()
+    if n:
+        print(f"[jobs] recovered {n} stale job(s)")
+    return n
+
+
+class JobRunner:
+    """
+    Thread pool that claims queued jobs from SQLite, at most `limits[type]`
+    at a time per job type and `workers` overall.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS, limits: Optional[Dict[str, int]] = None):
+        self.workers = workers
+        self.limits = limits if limits is not None else _parse_limits(JOB_CONCURRENCY)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self.running: Dict[str, str] = {}  # job id -> type
+        self._running_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._wake = threading.Event()
+        self._last_maintenance = 0.0
+        self._thread = threading.Thread(target=self._loop, name="job-dispatcher", daemon=True)
+
+    def start(self) -> "JobRunner":
+        self._thread.start()
+        return self
+
+    def wake(self):
+        self._wake.set()
+
+    def _loop(self):
+        while True:
+            try:
+                now = time.time()
+                if now - self._last_maintenance >= JOB_STALE_SECONDS / 4:
+                    self._maintenance(now)
+                    self._last_maintenance = now
+                self._dispatch()
+            except Exception as e:
+                print(f"[jobs] dispatcher error: {e}")
+            self._wake.wait(JOB_POLL_INTERVAL)
+            self._wake.clear()
+
+    def _maintenance(self, now: float):
+        with self._running_lock:
+            ids = list(self.running)
+        if ids:
+            _execute(f"UPDATE jobs SET heartbeat = ? WHERE id IN ({','.join('?' * len(ids))})", [now] + ids)
+        requeue_stale(now)
+        _execute(
+            f"DELETE FROM jobs WHERE status IN ({','.join('?' * len(FINISHED))}) AND finished_at < ?",
+            list(FINISHED) + [now - JOB_RETENTION_SECONDS],
+        )
+
+    def _dispatch(self):
+        for job_type in _handlers:
+            with self._running_lock:
+                free = min(
+                    self.limits.get(job_type, 1) - sum(1 for t in self.running.values() if t == job_type),
+                    self.workers - len(self.running),
+                )
+            if free <= 0:
+                continue
+            candidates = get_conn().execute(
+                "SELECT id FROM jobs WHERE status = ? AND type = ? ORDER BY created_at LIMIT ?", (QUEUED, job_type, free)
+            ).fetchall()
+            for (job_id,) in candidates:
+                now = time.time()
+                claimed = _execute(
+                    "UPDATE jobs SET status = ?, owner = ?, started_at = ?, heartbeat = ?, attempts = attempts + 1 WHERE id = ? AND status = ?",
+                    (RUNNING, self.owner, now, now, job_id, QUEUED),
+                )
+                if claimed:
+                    with self._running_lock:
+                        self.running[job_id] = job_type
+                    self._pool.submit(self._run, job_id)
+
+    def _run(self, job_id: str):
+        job = get_job(job_id)
+        status, result, error = FAILED, None, None
+        try:
+            result = _handlers[job["type"]](job["payload"], JobContext(job_id))
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            print(f"[jobs] {job['type']} job {job_id} failed: {error}")
+        finally:
+            _execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, progress = CASE WHEN ? THEN 1 ELSE progress END, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, status == DONE, time.time(), job_id),
+            )
+            with self._running_lock:
+                self.running.pop(job_id, None)
+            self.wake()
+
+
+# Built-in handlers. Imports are deferred so the runner doesn't pull in the
+# indexing or audio stacks until a job of that type actually runs.
+
+def _index_job(payload: Dict, ctx: JobContext) -> Dict:
+    from utils.rag_utils import ingest_files
+
+    def _on_progress(done, total, path, stats):
+        ctx.progress(done / total, f"Indexed {done}/{total}: {os.path.basename(path)} ({stats['chunks_added']} chunk(s) added)")
+
+    ctx.progress(0.0, "Parsing files...")
+    # Unchanged files are skipped via the manifest, so a resumed job only redoes what's left.
+    return ingest_files(payload["paths"], persist_directory=payload["persist_directory"], progress=_on_progress)
+
+
+def _transcribe_job(payload: Dict, ctx: JobContext) -> Dict:
+    from utils.voice import transcribe_with_openai
+    with open(payload["path"], "rb") as f:
+        data = f.read()
+    ctx.progress(0.1, "Transcribing...")
+    try:
+        res = transcribe_with_openai(data, filename=payload["filename"])
+    finally:
+        # Kept only while the job may still be resumed after a crash.
+        _remove_quietly(payload["path"])
+    if res.get("error"):
+        raise RuntimeError(res["error"])
+    return res
+
+
+def _tts_job(payload: Dict, ctx: JobContext) -> Dict:
+    from utils.voice_tts import split_sentences, synthesize_segment
+    lang = payload.get("lang", "en")
+    segments = split_sentences(payload["text"])
+    if not segments:
+        raise RuntimeError("no text to speak")
+    # Segments land in the TTS cache one by one, so the app can start playing
+    # the first while the rest are synthesized (utils.voice_tts.cached_segments).
+    for i, segment in enumerate(segments):
+        ctx.progress(i / len(segments), f"Synthesizing speech ({i}/{len(segments)} segments)")
+        synthesize_segment(segment, lang)
+    return {"segments": len(segments), "lang": lang}
+
+
+def _summarize_job(payload: Dict, ctx: JobContext) -> Dict:
+    from models.llm import get_chat_model
+    from utils import conversation
+    chat_model = get_chat_model(provider_preference=payload.get("provider", "auto"))
+    summarizer = conversation.llm_summarizer(chat_model, payload.get("model")) if chat_model is not None else None
+    return {"folded": conversation.update_summary(payload["session_id"], summarizer, model=payload.get("model"))}
+
+
+_handlers: Dict[str, Callable] = {
+    "index": _index_job,
+    "transcribe": _transcribe_job,
+    "tts": _tts_job,
+    "summarize": _summarize_job,
+}
+
+
+def register_handler(job_type: str, fn: Callable):
+    """fn(payload, ctx) -> JSON-serializable result; raise to fail the job."""
+    _handlers[job_type] = fn
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def submit_index(paths: List[str], persist_directory: str) -> str:
+    return submit("index", {"paths": list(paths), "persist_directory": persist_directory})
+
+
+def submit_transcription(file_bytes: bytes, filename: str) -> str:
+    # The upload is spooled to disk so the job survives reruns and restarts.
+    os.makedirs(JOB_DATA_DIR, exist_ok=True)
+    path = os.path.join(JOB_DATA_DIR, f"{uuid.uuid4()}{os.path.splitext(filename)[1] or '.wav'}")
+    with open(path, "wb") as f:
+        f.write(file_bytes)
+    return submit("transcribe", {"path": path, "filename": filename})
+
+
+def submit_tts(text: str, lang: str = "en") -> str:
+    return submit("tts", {"text": text, "lang": lang})
+
+
+def submit_summary(session_id: str, provider: str = "auto", model: Optional[str] = None) -> str:
+    return submit("summarize", {"session_id": session_id, "provider": provider, "model": model})
+
+
+_runner = None
+_runner_lock = threading.Lock()
+
+
+def get_runner() -> JobRunner:
+    """Start (once per process) and return the job runner."""
+    global _runner
+    with _runner_lock:
+        if _runner is None:
+            requeue_stale()
+            _runner = JobRunner().start()
+        return _runner
@@ -0,0 +1,145 @@
+# utils/keyword_index.py
+import os
+import re
+import math
+import sqlite3
+import threading
+from collections import Counter
+from typing import Dict, Iterable, List, Tuple
+
+KEYWORD_INDEX_FILE = "keyword.sqlite"
+
+# Identifiers such as "AB-1234", "v2.3.1" or "order_id" are kept whole and
+# also split into their parts, so both exact codes and pieces of them match.
+_TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./][a-z0-9]+)*")
+_PART_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for tok in _TOKEN_RE.findall(text.lower()):
+        tokens.append(tok)
+        parts = _PART_RE.findall(tok)
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+class BM25Index:
+    """
+    On-disk inverted index with BM25 scoring, stored in SQLite next to the
+    FAISS files. Postings are keyed by chunk id (the same ids FAISS uses), so
+    chunks can be replaced or removed incrementally.
+    """
+
+    def __init__(self, persist_directory: str, k1: float = 1.5, b: float = 0.75):
+        self.path = os.path.join(persist_directory, KEYWORD_INDEX_FILE)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, length INTEGER NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                chunk_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                PRIMARY KEY (term, chunk_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_postings_chunk ON postings(chunk_id);
+            """
+        )
+        self._conn.commit()
+        self._stats = None
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _corpus_stats(self) -> Tuple[int, float]:
+        if self._stats is None:
+            n, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks").fetchone()
+            self._stats = (n, (total / n) if n else 0.0)
+        return self._stats
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._corpus_stats()[0]
+
+    def add(self, items: Iterable[Tuple[str, str]]):
+        """Index (chunk_id, text) pairs; existing ids are replaced."""
+        self.replace((), items)
+
+    def replace(self, delete_ids: Iterable[str], items: Iterable[Tuple[str, str]]):
+        """Remove `delete_ids` and index (chunk_id, text) `items` in one transaction."""
+        delete_ids = list(delete_ids)
+        chunk_rows, posting_rows, ids = [], [], []
+        for cid, text in items:
+            counts = Counter(tokenize(text))
+            ids.append(cid)
+            chunk_rows.append((cid, sum(counts.values())))
+            posting_rows.extend((term, cid, tf) for term, tf in counts.items())
+        if not ids and not delete_ids:
+            return
+        with self._lock:
+            try:
+                self._delete_locked(delete_ids + ids)
+                self._conn.executemany("INSERT INTO chunks (chunk_id, length) VALUES (?, ?)", chunk_rows)
+                self._conn.executemany("INSERT INTO postings (term, chunk_id, tf) VALUES (?, ?, ?)", posting_rows)
+                self._conn.commit()
+            except Exception:
+                self._conn.rollback()
+                raise
+            finally:
+                self._stats = None
+
+    def _delete_locked(self, ids: List[str]):
+        for i in range(0, len(ids), 500):
+            part = ids[i:i + 500]
+            marks = ",".join("?" * len(part))
+            self._conn.execute(f"DELETE FROM postings WHERE chunk_id IN ({marks})", part)
+            self._conn.execute(f"DELETE FROM chunks WHERE chunk_id IN ({marks})", part)
+
+    def delete(self, ids: Iterable[str]):
+        ids = list(ids)
+        if not ids:
+            return
+        with self._lock:
+            self._delete_locked(ids)
+            self._conn.commit()
+            self._stats = None
+
+    def search(self, query: str, k: int = 4) -> List[Tuple[str, float]]:
+        """Top-k (chunk_id, BM25 score), best first."""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        scores: Dict[str, float] = {}
+        with self._lock:
+            n, avgdl = self._corpus_stats()
+            if not n:
+                return []
+            for term in terms:
+                rows = self._conn.execute(
+                    "SELECT p.chunk_id, p.tf, c.length FROM postings p JOIN chunks c ON c.chunk_id = p.chunk_id WHERE p.term = ?",
+                    (term,),
+                ).fetchall()
+                if not rows:
+                    continue
+                df = len(rows)
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                for cid, tf, length in rows:
+                    denom = tf + self.k1 * (1 - self.b + self.b * length / avgdl)
+                    scores[cid] = scores.get(cid, 0.0) + idf * tf * (self.k1 + 1) / denom
+        return sorted(scores.items(), key=lambda x: x[1], reverse=True)[:k]
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse several best-first id lists: score(id) = sum 1 / (k + rank)."""
+    fused: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, cid in enumerate(ranking, start=1):
+            fused[cid] = fused.get(cid, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda x: x[1], reverse=True)
@@ -1,72 +1,462 @@
 # utils/memory.py
 import sqlite3
+import atexit
 import json
 import os
+import queue
+import threading
+import time
 import uuid
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
 from datetime import datetime
-from config.config import CHAT_MEMORY_DB, CHAT_MEMORY_JSON_DIR
+from utils import analytics
+from utils.tracing import traced
+from config.config import (
+    CHAT_MEMORY_DB, CHAT_MEMORY_JSON_DIR,
+    CHAT_MEMORY_WRITE_BEHIND, CHAT_MEMORY_BATCH_SIZE, CHAT_MEMORY_FLUSH_INTERVAL,
+    CHAT_MEMORY_WRITE_RETRIES, CHAT_MEMORY_EXIT_FLUSH_TIMEOUT,
+)
 
 DB_PATH = CHAT_MEMORY_DB
 JSON_BACKUP_DIR = CHAT_MEMORY_JSON_DIR
-os.makedirs(JSON_BACKUP_DIR, exist_ok=True)
+
+# Ordered schema migrations; PRAGMA user_version records how many have run.
+MIGRATIONS = [
+    # 1: original messages table
+    """
+    CREATE TABLE IF NOT EXISTS messages (
+        id TEXT PRIMARY KEY,
+        session_id TEXT,
+        role TEXT,
+        content TEXT,
+        created_at TEXT
+    )
+    """,
+    # 2: indexes for per-session loads and time-ordered scans
+    """
+    CREATE INDEX IF NOT EXISTS idx_messages_session_created ON messages(session_id, created_at);
+    CREATE INDEX IF NOT EXISTS idx_messages_created ON messages(created_at);
+    """,
+    # 3: one row per session so list_sessions doesn't scan messages
+    """
+    CREATE TABLE IF NOT EXISTS sessions (
+        session_id TEXT PRIMARY KEY,
+        created_at TEXT,
+        last_active TEXT,
+        message_count INTEGER NOT NULL DEFAULT 0
+    );
+    CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions(last_active);
+    INSERT OR IGNORE INTO sessions (session_id, created_at, last_active, message_count)
+        SELECT session_id, MIN(created_at), MAX(created_at), COUNT(*) FROM messages GROUP BY session_id;
+    """,
+    # 4: analytics rollups (see utils/analytics.py); existing rows are backfilled up to backfill_upto
+    """
+    CREATE TABLE IF NOT EXISTS rollup_daily (day TEXT PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0);
+    CREATE TABLE IF NOT EXISTS rollup_length (bucket INTEGER PRIMARY KEY, count INTEGER NOT NULL DEFAULT 0);
+    CREATE INDEX IF NOT EXISTS idx_sessions_message_count ON sessions(message_count);
+    CREATE TABLE IF NOT EXISTS analytics_state (key TEXT PRIMARY KEY, value TEXT);
+    INSERT OR IGNORE INTO analytics_state (key, value) VALUES ('watermark', '0');
+    INSERT OR IGNORE INTO analytics_state (key, value) SELECT 'backfill_upto', COALESCE(MAX(rowid), 0) FROM messages;
+    INSERT OR IGNORE INTO analytics_state (key, value) VALUES ('live_since', strftime('%Y-%m-%dT%H:%M:%S', 'now'));
+    """,
+    # 5: rolling conversation summary (see utils/conversation.py); summary_upto is the id of the last message folded in
+    """
+    ALTER TABLE sessions ADD COLUMN summary TEXT NOT NULL DEFAULT '';
+    ALTER TABLE sessions ADD COLUMN summary_upto TEXT;
+    """,
+    # 6: background job queue (see utils/jobs.py)
+    """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        type TEXT NOT NULL,
+        status TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        result TEXT,
+        error TEXT,
+        progress REAL NOT NULL DEFAULT 0,
+        message TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        cancel_requested INTEGER NOT NULL DEFAULT 0,
+        owner TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        heartbeat REAL
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_status_type ON jobs(status, type, created_at);
+    CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs(created_at);
+    """,
+    # 7: web search result cache (see utils/web_search.py)
+    """
+    CREATE TABLE IF NOT EXISTS web_search_cache (
+        key TEXT PRIMARY KEY,
+        query TEXT NOT NULL,
+        provider TEXT NOT NULL,
+        results TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_web_search_cache_created_at ON web_search_cache(created_at);
+    """,
+    # 8: per-stage latency histograms (see utils/tracing.py)
+    """
+    CREATE TABLE IF NOT EXISTS trace_histograms (
+        stage TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (stage, bucket)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS trace_stage_totals (stage TEXT PRIMARY KEY, count INTEGER NOT NULL, total REAL NOT NULL);
+    """,
+    # 9: answer cache (see utils/response_cache.py)
+    """
+    CREATE TABLE IF NOT EXISTS response_cache (
+        key TEXT PRIMARY KEY,
+        scope TEXT NOT NULL,
+        question TEXT NOT NULL,
+        embedding BLOB,
+        answer TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_response_cache_scope ON response_cache(scope);
+    CREATE INDEX IF NOT EXISTS idx_response_cache_last_used ON response_cache(last_used);
+    CREATE INDEX IF NOT EXISTS idx_response_cache_created_at ON response_cache(created_at);
+    CREATE TABLE IF NOT EXISTS response_cache_stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+    """,
+    # 10: number of messages folded into the summary, so callers can tell when folding is due without a scan
+    """
+    ALTER TABLE sessions ADD COLUMN summary_count INTEGER NOT NULL DEFAULT 0;
+    UPDATE sessions SET summary_count = (
+        SELECT COUNT(*) FROM messages m, messages a
+        WHERE a.id = sessions.summary_upto AND m.session_id = sessions.session_id
+          AND (m.created_at, m.rowid) <= (a.created_at, a.rowid)
+    ) WHERE summary_upto IS NOT NULL;
+    """,
+]
+
+_local = threading.local()
+_init_lock = threading.Lock()
+_initialized = False
+
+
+def _connect() -> sqlite3.Connection:
+    conn = sqlite3.connect(DB_PATH, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    return conn
+
+
+def _statements(script: str) -> List[str]:
+    stmts, buf = [], ""
+    for line in script.splitlines(keepends=True):
+        buf += line
+        if sqlite3.complete_statement(buf):
+            stmts.append(buf.strip())
+            buf = ""
+    if buf.strip():
+        stmts.append(buf.strip())
+    return stmts
+
+
+def migrate(conn: sqlite3.Connection) -> int:
+    """
+    Apply pending migrations; returns the resulting schema version. Each step
+    reads user_version after taking the write lock, so processes starting
+    together run every migration exactly once.
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(MIGRATIONS):
+                conn.commit()
+                return version
+            for stmt in _statements(MIGRATIONS[version]):
+                conn.execute(stmt)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
 
 def init_db():
-    conn = sqlite3.connect(DB_PATH, check_same_thread=False)
-    cur = conn.cursor()
-    cur.execute(
-        """
-        CREATE TABLE IF NOT EXISTS messages (
-            id TEXT PRIMARY KEY,
-            session_id TEXT,
-            role TEXT,
-            content TEXT,
-            created_at TEXT
-        )
+    """Create/upgrade the schema once per process."""
+    global _initialized
+    with _init_lock:
+        if not _initialized:
+            conn = _connect()
+            try:
+                migrate(conn)
+            finally:
+                conn.close()
+            _initialized = True
+
+
+def get_conn() -> sqlite3.Connection:
+    """Connection owned by the calling thread; SQLite connections are not shared across threads."""
+    conn = getattr(_local, "conn", None)
+    if conn is None:
+        init_db()
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def _insert_messages(conn: sqlite3.Connection, rows: List[tuple]):
+    """Insert (id, session_id, role, content, created_at) rows and update the sessions table; caller commits."""
+    conn.executemany(
+        "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
+        rows,
+    )
+    conn.executemany(
         """
+        INSERT INTO sessions (session_id, created_at, last_active, message_count) VALUES (?, ?, ?, 1)
+        ON CONFLICT(session_id) DO UPDATE SET last_active = excluded.last_active, message_count = message_count + 1
+        """,
+        [(r[1], r[4], r[4]) for r in rows],
     )
-    conn.commit()
-    return conn
+    analytics.record_messages(conn, rows)
+
+
+class _WriteBehind:
+    """
+    Background writer that group-commits queued messages in a single
+    transaction. A failed commit (e.g. the database is locked) is retried with
+    backoff; a batch that keeps failing is written row by row so only rows
+    that can never be stored are dropped.
+    """
+
+    def __init__(self, batch_size: int = CHAT_MEMORY_BATCH_SIZE, interval: float = CHAT_MEMORY_FLUSH_INTERVAL, retries: int = CHAT_MEMORY_WRITE_RETRIES):
+        self.batch_size = batch_size
+        self.interval = interval
+        self.retries = max(1, retries)
+        self.queue = queue.Queue()
+        self.batches = 0
+        self._thread = threading.Thread(target=self._run, name="memory-write-behind", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        conn = get_conn()
+        while True:
+            rows = [self.queue.get()]
+            try:
+                while len(rows) < self.batch_size:
+                    rows.append(self.queue.get(timeout=self.interval))
+            except queue.Empty:
+                pass
+            try:
+                self._write(conn, rows)
+            finally:
+                for _ in rows:
+                    self.queue.task_done()
+
+    def _commit(self, conn: sqlite3.Connection, rows: List[tuple]) -> Optional[Exception]:
+        delay = 0.1
+        for attempt in range(self.retries):
+            try:
+                _insert_messages(conn, rows)
+                conn.commit()
+                return None
+            except Exception as e:
+                conn.rollback()
+                if attempt == self.retries - 1:
+                    return e
+                time.sleep(delay)
+                delay = min(delay * 2, 5.0)
+
+    def _write(self, conn: sqlite3.Connection, rows: List[tuple]):
+        error = self._commit(conn, rows)
+        if error is None:
+            self.batches += 1
+            return
+        print(f"[memory] write-behind batch of {len(rows)} failed after {self.retries} attempt(s), writing rows singly: {error}")
+        for row in rows:
+            error = self._commit(conn, [row])
+            if error is not None:
+                print(f"[memory] dropped message {row[0]} of session {row[1]}: {error}")
+
+    def put(self, row: tuple):
+        self.queue.put(row)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued rows are written; False if `timeout` passed first."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self.queue.all_tasks_done:
+            while self.queue.unfinished_tasks:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.queue.all_tasks_done.wait(remaining)
+        return True
+
+
+_writer: Optional[_WriteBehind] = None
+_writer_lock = threading.Lock()
+
+
+def enable_write_behind(batch_size: int = CHAT_MEMORY_BATCH_SIZE, interval: float = CHAT_MEMORY_FLUSH_INTERVAL):
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = _WriteBehind(batch_size, interval)
+            atexit.register(_flush_at_exit)
+    return _writer
+
+
+def _flush_at_exit():
+    # The writer thread is a daemon; drain it before the interpreter stops it.
+    if _writer is not None and not _writer.flush(CHAT_MEMORY_EXIT_FLUSH_TIMEOUT):
+        print(f"[memory] {_writer.queue.unfinished_tasks} queued message(s) not written at exit")
+
+
+def flush():
+    """Block until queued writes are committed (no-op without write-behind)."""
+    if _writer is not None:
+        _writer.flush()
+
+
+def init_memory():
+    """
+    Startup hook for the app: create/upgrade the schema and, with
+    CHAT_MEMORY_WRITE_BEHIND, start the write-behind writer. Importing this
+    module does neither, so tools that only read history stay cheap.
+    """
+    init_db()
+    if CHAT_MEMORY_WRITE_BEHIND:
+        enable_write_behind()
 
-_conn = init_db()
 
 def new_session_id() -> str:
     return str(uuid.uuid4())
 
-def save_message(session_id: str, role: str, content: str):
+@traced("memory.save_message")
+def save_message(session_id: str, role: str, content: str) -> str:
     mid = str(uuid.uuid4())
     now = datetime.utcnow().isoformat()
-    cur = _conn.cursor()
-    cur.execute(
-        "INSERT INTO messages (id, session_id, role, content, created_at) VALUES (?, ?, ?, ?, ?)",
-        (mid, session_id, role, content, now),
-    )
-    _conn.commit()
+    row = (mid, session_id, role, content, now)
+    if _writer is not None:
+        _writer.put(row)
+        return mid
+    conn = get_conn()
+    _insert_messages(conn, [row])
+    conn.commit()
+    return mid
 
 def load_session_messages(session_id: str) -> List[Dict]:
-    cur = _conn.cursor()
+    flush()
+    cur = get_conn().cursor()
     cur.execute("SELECT id, role, content, created_at FROM messages WHERE session_id = ? ORDER BY created_at ASC", (session_id,))
     rows = cur.fetchall()
     msgs = [{"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]} for r in rows]
     return msgs
 
+def load_messages_page(session_id: str, limit: int = 20, before_id: Optional[str] = None) -> List[Dict]:
+    """
+    Keyset-paginated history: the `limit` most recent messages of the session
+    that are older than message `before_id` (or the latest ones if None),
+    returned oldest first. Cost depends on `limit`, not on session length.
+    """
+    flush()
+    conn = get_conn()
+    if before_id is None:
+        rows = conn.execute(
+            "SELECT id, role, content, created_at FROM messages WHERE session_id = ? "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (session_id, limit),
+        ).fetchall()
+    else:
+        anchor = conn.execute("SELECT created_at, rowid FROM messages WHERE id = ?", (before_id,)).fetchone()
+        if anchor is None:
+            return []
+        rows = conn.execute(
+            "SELECT id, role, content, created_at FROM messages WHERE session_id = ? AND (created_at, rowid) < (?, ?) "
+            "ORDER BY created_at DESC, rowid DESC LIMIT ?",
+            (session_id, anchor[0], anchor[1], limit),
+        ).fetchall()
+    return [{"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]} for r in reversed(rows)]
+
+def count_session_messages(session_id: str) -> int:
+    """Messages stored for the session, from the sessions row (no scan)."""
+    flush()
+    row = get_conn().execute("SELECT message_count FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    return row[0] if row else 0
+
+def load_messages_between(session_id: str, after_id: Optional[str] = None, before_id: Optional[str] = None, limit: int = 20, latest: bool = True) -> List[Dict]:
+    """
+    Up to `limit` messages of the session strictly after message `after_id`
+    and before message `before_id` (either may be None), oldest first. With
+    `latest` the newest such messages are returned, otherwise the oldest.
+    Same keyset as load_messages_page, so cost depends on `limit` only.
+    """
+    flush()
+    conn = get_conn()
+    where, params = ["session_id = ?"], [session_id]
+    for op, mid in ((">", after_id), ("<", before_id)):
+        if mid is None:
+            continue
+        anchor = conn.execute("SELECT created_at, rowid FROM messages WHERE id = ?", (mid,)).fetchone()
+        if anchor is None:
+            if op == "<":
+                return []
+            continue
+        where.append(f"(created_at, rowid) {op} (?, ?)")
+        params.extend(anchor)
+    order = "DESC" if latest else "ASC"
+    rows = conn.execute(
+        f"SELECT id, role, content, created_at FROM messages WHERE {' AND '.join(where)} "
+        f"ORDER BY created_at {order}, rowid {order} LIMIT ?",
+        (*params, limit),
+    ).fetchall()
+    if latest:
+        rows.reverse()
+    return [{"id": r[0], "role": r[1], "content": r[2], "created_at": r[3]} for r in rows]
+
+def get_session_summary(session_id: str) -> Tuple[str, Optional[str]]:
+    """(rolling summary, id of the last message folded into it) for the session."""
+    flush()
+    row = get_conn().execute("SELECT summary, summary_upto FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    return (row[0], row[1]) if row else ("", None)
+
+def save_session_summary(session_id: str, summary: str, upto_id: str, folded: int = 0):
+    """Store the new summary; `folded` is how many messages were added to it."""
+    flush()
+    conn = get_conn()
+    conn.execute(
+        "UPDATE sessions SET summary = ?, summary_upto = ?, summary_count = summary_count + ? WHERE session_id = ?",
+        (summary, upto_id, folded, session_id),
+    )
+    conn.commit()
+
+def count_summarized_messages(session_id: str) -> int:
+    """Messages folded into the session's rolling summary so far."""
+    flush()
+    row = get_conn().execute("SELECT summary_count FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+    return row[0] if row else 0
+
 def dump_session_json(session_id: str) -> str:
     msgs = load_session_messages(session_id)
+    os.makedirs(JSON_BACKUP_DIR, exist_ok=True)
     path = os.path.join(JSON_BACKUP_DIR, f"session_{session_id}.json")
     with open(path, "w", encoding="utf-8") as f:
         json.dump({"session_id": session_id, "messages": msgs}, f, ensure_ascii=False, indent=2)
     return path
 
 def list_sessions(limit: int = 100) -> List[str]:
-    cur = _conn.cursor()
-    cur.execute("SELECT DISTINCT session_id FROM messages ORDER BY rowid DESC LIMIT ?", (limit,))
+    flush()
+    cur = get_conn().cursor()
+    cur.execute("SELECT session_id FROM sessions ORDER BY last_active DESC LIMIT ?", (limit,))
     rows = cur.fetchall()
     return [r[0] for r in rows]
 
 def delete_session(session_id: str):
-    cur = _conn.cursor()
-    cur.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
-    _conn.commit()
+    flush()
+    conn = get_conn()
+    analytics.forget_session(conn, session_id)
+    conn.execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+    conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+    conn.commit()
     json_path = os.path.join(JSON_BACKUP_DIR, f"session_{session_id}.json")
     if os.path.exists(json_path):
         os.remove(json_path)
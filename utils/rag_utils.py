@@ -1,18 +1,258 @@
 # utils/rag_utils.py
 import os
-from typing import List, Optional
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-# Note: The loader below requires the 'unstructured' package, not PyPDF2.
-# The fix has been applied in requirements.txt.
-from langchain_community.document_loaders import UnstructuredFileLoader, TextLoader
-from langchain_community.vectorstores import FAISS
+import re
+import json
+import shutil
+import hashlib
+import threading
+import contextvars
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 from langchain_core.documents import Document
 from models.embeddings import get_embedding_fn
-from config.config import VECTOR_STORE_DIR
+from utils.keyword_index import BM25Index, reciprocal_rank_fusion
+from utils import tracing
+from config.config import VECTOR_STORE_DIR, INGEST_WORKERS, EMBED_BATCH_SIZE, RAG_HYBRID, RAG_RRF_K, RAG_STORAGE_FORMAT, RAG_MAX_RESIDENT_COLLECTIONS
 
-os.makedirs(VECTOR_STORE_DIR, exist_ok=True)
+# faiss, the LangChain FAISS wrapper, the text splitter and the document
+# loaders are imported where they are first needed: together they are most of
+# the app's import time, and the sidebar only needs the collection helpers.
+
+class VectorStoreHandle:
+    """
+    Process-resident handle on a persisted FAISS index.
+    Keeps the embedder and the index in memory and only reloads from disk
+    when the persisted files change (mtime/size stamp). Stores in the sqlite
+    format are opened memory-mapped and read-only for queries, so replicas on
+    one host share the page cache; writers ask for a private writable copy.
+    """
+
+    def __init__(self, persist_directory: str, embedding_factory: Callable = get_embedding_fn, write_lock: Optional[threading.Lock] = None):
+        self.persist_directory = persist_directory
+        self._embedding_factory = embedding_factory
+        self._emb = None
+        self._db = None
+        self._keywords = None
+        self._stamp = None
+        self._mmapped = False
+        # Guards loading and in-place mutation; FAISS indexes are not safe to
+        # search while documents are being added.
+        self.lock = threading.RLock()
+        # Serializes writers (indexing, purging) so manifest updates don't interleave.
+        self.write_lock = write_lock or threading.Lock()
+        self.loads = 0
+        self.last_stats = {}
+        self.rebuilding = False
+        # Queries in flight; counted under _handles_lock so eviction sees them.
+        self.readers = 0
+
+    @property
+    def embeddings(self):
+        with self.lock:
+            if self._emb is None:
+                self._emb = self._embedding_factory()
+            return self._emb
+
+    @property
+    def keywords(self) -> BM25Index:
+        """BM25 index kept next to the FAISS files; reopened if the directory was cleared."""
+        with self.lock:
+            if self._keywords is None or not os.path.exists(self._keywords.path):
+                if self._keywords is not None:
+                    self._keywords.close()
+                os.makedirs(self.persist_directory, exist_ok=True)
+                self._keywords = BM25Index(self.persist_directory)
+            return self._keywords
+
+    @property
+    def mmapped(self) -> bool:
+        return self._mmapped
+
+    def get(self, writable: bool = False):
+        """
+        Return the resident FAISS store, reloading it if the files on disk
+        changed. Pass writable=True before mutating it in place.
+        """
+        from utils import faiss_index, vector_storage
+        stamp = vector_storage.stamp(self.persist_directory)
+        with self.lock:
+            if stamp is None:
+                self._db, self._stamp, self._mmapped = None, None, False
+                return None
+            if self._db is None or stamp != self._stamp or (writable and self._mmapped):
+                if stamp[0] == "sqlite":
+                    self._db, self._mmapped = vector_storage.load_store(self.persist_directory, self.embeddings, mmap=not writable)
+                else:
+                    from langchain_community.vectorstores import FAISS
+                    self._db = FAISS.load_local(self.persist_directory, self.embeddings, allow_dangerous_deserialization=True)
+                    self._mmapped = False
+                faiss_index.apply_search_params(self._db.index)
+                self._stamp = stamp
+                self.loads += 1
+            return self._db
+
+    def save(self, db):
+        """Persist `db` and keep it as the resident copy without re-reading it."""
+        from utils import vector_storage
+        with self.lock:
+            if RAG_STORAGE_FORMAT == "pickle" and not isinstance(db.docstore, vector_storage.SQLiteDocstore):
+                db.save_local(self.persist_directory)
+            else:
+                vector_storage.save_store(db, self.persist_directory)
+            self._db, self._mmapped = db, False
+            self._stamp = vector_storage.stamp(self.persist_directory)
+
+    def invalidate(self):
+        with self.lock:
+            self._db, self._stamp, self._mmapped = None, None, False
+
+    def release(self):
+        """Drop the resident index and close the keyword index (on LRU eviction or clearing)."""
+        with self.lock:
+            self.invalidate()
+            if self._keywords is not None:
+                self._keywords.close()
+                self._keywords = None
+
+    @property
+    def busy(self) -> bool:
+        return self.write_lock.locked() or self.rebuilding or self.readers > 0
+
+
+# Resident handles, least recently used first. Write locks outlive eviction so
+# a writer holding an evicted handle still excludes one on a fresh handle.
+_handles: "OrderedDict[str, VectorStoreHandle]" = OrderedDict()
+_write_locks: Dict[str, threading.Lock] = {}
+_handles_lock = threading.Lock()
+_shared_emb = None
+_shared_emb_lock = threading.Lock()
+
+
+def _shared_embedding_fn():
+    """One embedder (and its HTTP pool / cache) for every collection."""
+    global _shared_emb
+    with _shared_emb_lock:
+        if _shared_emb is None:
+            _shared_emb = get_embedding_fn()
+        return _shared_emb
+
+
+def _evict_locked(keep: Optional[str] = None):
+    for key in list(_handles):
+        if len(_handles) <= RAG_MAX_RESIDENT_COLLECTIONS:
+            return
+        handle = _handles[key]
+        if handle.busy or key == keep:
+            continue
+        del _handles[key]
+        handle.release()
+
+
+def _handle_locked(persist_directory: str, embedding_factory: Callable) -> VectorStoreHandle:
+    key = os.path.abspath(persist_directory)
+    handle = _handles.get(key)
+    if handle is None:
+        write_lock = _write_locks.setdefault(key, threading.Lock())
+        handle = VectorStoreHandle(persist_directory, embedding_factory, write_lock)
+        _handles[key] = handle
+        # Never the handle being returned, even if everything older is busy.
+        _evict_locked(keep=key)
+    else:
+        _handles.move_to_end(key)
+    return handle
+
+
+def get_vector_store_handle(persist_directory: str = VECTOR_STORE_DIR, embedding_factory: Callable = _shared_embedding_fn) -> VectorStoreHandle:
+    """
+    Shared handle per directory; module state survives Streamlit reruns and
+    sessions. At most RAG_MAX_RESIDENT_COLLECTIONS idle handles stay loaded.
+    """
+    with _handles_lock:
+        return _handle_locked(persist_directory, embedding_factory)
+
+
+def _acquire_reader(persist_directory: str) -> VectorStoreHandle:
+    """Handle pinned against eviction until `_release_reader`; taken atomically with the lookup."""
+    with _handles_lock:
+        handle = _handle_locked(persist_directory, _shared_embedding_fn)
+        handle.readers += 1
+        return handle
+
+
+def _release_reader(handle: VectorStoreHandle):
+    with _handles_lock:
+        handle.readers -= 1
+        if not handle.busy:
+            _evict_locked()
+
+
+# Named collections. "default" is the top-level VECTOR_STORE_DIR, so stores
+# created before collections existed keep working; the others live under
+# VECTOR_STORE_DIR/collections/<name>.
+DEFAULT_COLLECTION = "default"
+COLLECTIONS_SUBDIR = "collections"
+_COLLECTION_NAME_RE = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def collection_dir(name: str = DEFAULT_COLLECTION) -> str:
+    if name == DEFAULT_COLLECTION:
+        return VECTOR_STORE_DIR
+    if not _COLLECTION_NAME_RE.match(name or "") or ".." in name:
+        raise ValueError(f"Invalid collection name: {name!r}")
+    return os.path.join(VECTOR_STORE_DIR, COLLECTIONS_SUBDIR, name)
+
+
+def get_collection(name: str = DEFAULT_COLLECTION) -> VectorStoreHandle:
+    return get_vector_store_handle(collection_dir(name))
+
+
+def create_collection(name: str) -> str:
+    path = collection_dir(name)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def list_collections() -> List[str]:
+    root = os.path.join(VECTOR_STORE_DIR, COLLECTIONS_SUBDIR)
+    names = []
+    if os.path.isdir(root):
+        names = sorted(n for n in os.listdir(root) if os.path.isdir(os.path.join(root, n)) and n != DEFAULT_COLLECTION and _COLLECTION_NAME_RE.match(n))
+    return [DEFAULT_COLLECTION] + names
+
+
+def clear_collection(name: str = DEFAULT_COLLECTION, remove: bool = False):
+    """
+    Delete a collection's index, keyword index and manifest. Other
+    collections are untouched; with `remove` the (non-default) collection
+    itself goes away too.
+    """
+    path = collection_dir(name)
+    handle = get_vector_store_handle(path)
+    with handle.write_lock:
+        with handle.lock:
+            handle.release()
+            if os.path.isdir(path):
+                for entry in os.listdir(path):
+                    if name == DEFAULT_COLLECTION and entry == COLLECTIONS_SUBDIR:
+                        continue
+                    full = os.path.join(path, entry)
+                    if os.path.isdir(full):
+                        shutil.rmtree(full)
+                    else:
+                        os.remove(full)
+                if remove and name != DEFAULT_COLLECTION:
+                    os.rmdir(path)
+    if remove and name != DEFAULT_COLLECTION:
+        with _handles_lock:
+            _handles.pop(os.path.abspath(path), None)
 
 def load_documents_from_file(path: str) -> List[Document]:
+    # Note: The loader below requires the 'unstructured' package, not PyPDF2.
+    # The fix has been applied in requirements.txt.
+    from langchain_community.document_loaders import UnstructuredFileLoader, TextLoader
     try:
         loader = UnstructuredFileLoader(path)
         docs = loader.load()
@@ -26,37 +266,444 @@ def load_documents_from_file(path: str) -> List[Document]:
             return []
 
 def chunk_documents(docs: List[Document], chunk_size=1000, chunk_overlap=200) -> List[Document]:
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+    # start_index lets the context builder merge overlapping neighbours exactly.
+    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap, add_start_index=True)
     return splitter.split_documents(docs)
 
+# Manifest of per-file and per-chunk content hashes kept next to the index:
+# {"files": {source: {"hash": <file hash>, "chunk_ids": [<chunk hash>, ...]}}}
+MANIFEST_FILE = "manifest.json"
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest(persist_directory: str = VECTOR_STORE_DIR) -> Dict:
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {"files": {}}
+    manifest.setdefault("files", {})
+    return manifest
+
+
+def _save_manifest(manifest: Dict, persist_directory: str):
+    path = os.path.join(persist_directory, MANIFEST_FILE)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def _group_by_source(docs: List[Document]) -> Dict[str, List[Document]]:
+    groups = {}
+    for d in docs:
+        groups.setdefault(str(d.metadata.get("source", "")), []).append(d)
+    return groups
+
+
+def _chunk_ids(source: str, chunks: List[Document]) -> Tuple[List[str], List[Document]]:
+    """Content-hash ids for `chunks`; identical chunks within a file collapse to one."""
+    ids, unique = [], []
+    seen = set()
+    for c in chunks:
+        cid = _sha256(source + "\x00" + c.page_content)
+        if cid in seen:
+            continue
+        seen.add(cid)
+        ids.append(cid)
+        unique.append(c)
+    return ids, unique
+
+
+def _new_stats() -> Dict:
+    return {"files_skipped": 0, "files_indexed": 0, "chunks_added": 0, "chunks_removed": 0}
+
+
+def _embed_chunks(handle: "VectorStoreHandle", pending: List[Tuple[str, Document]], batch_size: int) -> List[Tuple[str, str, List[float], Dict]]:
+    """
+    Embed `pending` (id, chunk) pairs in batches of `batch_size` into
+    (id, text, vector, metadata) rows. Touches no index, so a failed batch
+    leaves nothing half-applied; runs outside the handle lock.
+    """
+    rows = []
+    for i in range(0, len(pending), batch_size):
+        batch = pending[i:i + batch_size]
+        vectors = handle.embeddings.embed_documents([c.page_content for _, c in batch])
+        rows.extend((cid, c.page_content, vec, c.metadata) for (cid, c), vec in zip(batch, vectors))
+    return rows
+
+
+def _apply_changes(handle: "VectorStoreHandle", db, stale: List[str], rows: List[Tuple[str, str, List[float], Dict]]):
+    """
+    Delete `stale` ids from and add embedded `rows` to `db` and the keyword
+    index. If any step fails the resident copy is dropped, so the next writer
+    reloads the last saved store instead of a half-updated one. Callers hold
+    handle.write_lock, so `db` can't change between planning and applying.
+    """
+    from utils import faiss_index
+    try:
+        # Rebuilding a non-flat index without the stale vectors is slow; do
+        # it before taking the handle lock so queries keep running meanwhile.
+        replacement = faiss_index.plan_delete(db, stale) if stale else None
+        with handle.lock:
+            if stale:
+                faiss_index.delete_from_store(db, stale, replacement)
+            if rows:
+                text_embeddings = [(text, vec) for _, text, vec, _ in rows]
+                metadatas = [meta for _, _, _, meta in rows]
+                ids = [cid for cid, _, _, _ in rows]
+                if db is None:
+                    from langchain_community.vectorstores import FAISS
+                    db = FAISS.from_embeddings(text_embeddings, handle.embeddings, metadatas=metadatas, ids=ids)
+                else:
+                    db.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+        handle.keywords.replace(stale, [(cid, text) for cid, text, _, _ in rows])
+    except Exception:
+        handle.invalidate()
+        raise
+    return db
+
+
+def _index_source(handle: "VectorStoreHandle", db, manifest: Dict, source: str, file_docs: List[Document], stats: Dict, batch_size: int = EMBED_BATCH_SIZE):
+    """
+    Bring one source file in `db`/`manifest` up to date. Returns (db, changed).
+    Unchanged files are skipped before chunking; changed files only delete
+    their stale chunk ids and embed the chunks that are new.
+    """
+    file_hash = _sha256("\x00".join(d.page_content for d in file_docs))
+    entry = manifest["files"].get(source)
+    if entry and entry.get("hash") == file_hash:
+        stats["files_skipped"] += 1
+        return db, False
+    ids, chunks = _chunk_ids(source, chunk_documents(file_docs))
+    old_ids = set(entry.get("chunk_ids", [])) if entry else set()
+    new_ids = set(ids)
+    stale = [cid for cid in old_ids if cid not in new_ids]
+    if db is None:
+        stale = []
+    elif stale:
+        with handle.lock:
+            # Ignore ids the manifest knows about but the index does not.
+            present = set(db.index_to_docstore_id.values())
+        stale = [cid for cid in stale if cid in present]
+    pending = [(cid, c) for cid, c in zip(ids, chunks) if cid not in old_ids]
+    # Embed everything first, then change the store and keyword index together.
+    rows = _embed_chunks(handle, pending, batch_size)
+    db = _apply_changes(handle, db, stale, rows)
+    manifest["files"][source] = {"hash": file_hash, "chunk_ids": ids}
+    stats["files_indexed"] += 1
+    stats["chunks_added"] += len(pending)
+    stats["chunks_removed"] += len(stale)
+    return db, True
+
+
+def _persist(handle: "VectorStoreHandle", db, manifest: Dict, persist_directory: str):
+    with handle.lock:
+        if db is not None:
+            handle.save(db)
+        _save_manifest(manifest, persist_directory)
+
+
 def build_vector_store(docs: List[Document], persist_directory: Optional[str] = VECTOR_STORE_DIR):
-    emb = get_embedding_fn()
+    """
+    Incrementally index `docs`, grouped by their `source` metadata. Files whose
+    content hash is unchanged are skipped. Stats of the last run are kept on
+    the handle as `last_stats`.
+    """
+    handle = get_vector_store_handle(persist_directory)
     if not docs:
         raise ValueError("No documents to index.")
-    chunks = chunk_documents(docs)
-    if not chunks:
-        raise ValueError("No chunks produced.")
-    try:
-        # Allow FAISS to load from a local directory using the correct class method
-        if os.path.exists(persist_directory) and os.listdir(persist_directory):
-            db = FAISS.load_local(persist_directory, emb, allow_dangerous_deserialization=True)
-            db.add_documents(chunks)
-            db.save_local(persist_directory)
-            return db
-        else:
-            db = FAISS.from_documents(chunks, emb)
-            db.save_local(persist_directory)
-            return db
+    try:
+        os.makedirs(persist_directory, exist_ok=True)
+        with handle.write_lock:
+            db = handle.get(writable=True)
+            manifest = load_manifest(persist_directory) if db is not None else {"files": {}}
+            stats = _new_stats()
+            changed = False
+            groups = _group_by_source(docs)
+            for source, file_docs in groups.items():
+                db, did_change = _index_source(handle, db, manifest, source, file_docs, stats)
+                changed = changed or did_change
+            if not any(manifest["files"].get(src, {}).get("chunk_ids") for src in groups):
+                raise ValueError("No chunks produced.")
+            if changed:
+                _persist(handle, db, manifest, persist_directory)
+            handle.last_stats = stats
+        print(f"[rag_utils] indexed: {stats}")
+        schedule_index_rebuild(handle)
+        return db
+    except ValueError:
+        raise
     except Exception as e:
         raise RuntimeError(f"Failed building vector store: {e}")
 
-def query_vector_store(query: str, k=4, persist_directory: Optional[str] = VECTOR_STORE_DIR):
-    emb = get_embedding_fn()
+
+def _parse_files(paths: List[str], max_workers: int):
+    """
+    Yield (path, docs) as files finish parsing in a process pool. At most
+    `max_workers` files are in flight so memory stays bounded. Falls back to
+    parsing inline the files not yet yielded if the pool cannot be started
+    or breaks.
+    """
+    if max_workers <= 1 or len(paths) <= 1:
+        for path in paths:
+            yield path, load_documents_from_file(path)
+        return
+    remaining = list(paths)
+    in_flight = {}
+    try:
+        # Spawned, not forked: this runs in the app or job-runner process,
+        # whose other threads (HTTP loop, tracing, SQLite) a fork would copy mid-state.
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+            while remaining or in_flight:
+                while remaining and len(in_flight) < max_workers:
+                    path = remaining.pop(0)
+                    in_flight[pool.submit(load_documents_from_file, path)] = path
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    # Only drop the path once its result is in hand, so a
+                    # broken pool leaves it in in_flight for the fallback.
+                    docs = fut.result()
+                    yield in_flight.pop(fut), docs
+    except (BrokenProcessPool, OSError) as e:
+        # OSError: workers could not be started (e.g. no /dev/shm for the pool's semaphores).
+        print(f"[rag_utils] process pool failed, parsing inline: {e}")
+        for path in list(in_flight.values()) + remaining:
+            yield path, load_documents_from_file(path)
+
+
+def ingest_files(paths: List[str], persist_directory: Optional[str] = VECTOR_STORE_DIR, batch_size: int = EMBED_BATCH_SIZE, max_workers: int = INGEST_WORKERS, progress: Optional[Callable] = None) -> Dict:
+    """
+    Streaming ingestion: files are parsed in parallel, each parsed file is
+    chunked and embedded in batches of `batch_size`, and the index plus
+    manifest are saved after every file. `progress(done, total, path, stats)`
+    is called after each file. Returns the run stats.
+    """
+    handle = get_vector_store_handle(persist_directory)
+    os.makedirs(persist_directory, exist_ok=True)
+    stats = _new_stats()
+    stats["files_failed"] = 0
+    with handle.write_lock:
+        db = handle.get(writable=True)
+        manifest = load_manifest(persist_directory) if db is not None else {"files": {}}
+        for done, (path, docs) in enumerate(_parse_files(list(paths), max_workers), start=1):
+            if not docs:
+                stats["files_failed"] += 1
+            else:
+                changed = False
+                for source, file_docs in _group_by_source(docs).items():
+                    db, did_change = _index_source(handle, db, manifest, source, file_docs, stats, batch_size)
+                    changed = changed or did_change
+                if changed:
+                    _persist(handle, db, manifest, persist_directory)
+            if progress is not None:
+                progress(done, len(paths), path, stats)
+        handle.last_stats = stats
+    print(f"[rag_utils] ingested: {stats}")
+    schedule_index_rebuild(handle)
+    return stats
+
+
+def _rebuild_index(handle: VectorStoreHandle, kind: str):
+    from utils import faiss_index
     try:
-        # Allow FAISS to load from a local directory using the correct class method
-        db = FAISS.load_local(persist_directory, emb, allow_dangerous_deserialization=True)
+        # Holding the write lock keeps indexers out while the new index is
+        # trained; queries keep using the current index until the swap.
+        with handle.write_lock:
+            with handle.lock:
+                db = handle.get(writable=True)
+                if db is None:
+                    return
+                vectors, mapping = faiss_index.snapshot(db)
+            new_index = faiss_index.build_index(kind, vectors)
+            with handle.lock:
+                db.index, db.index_to_docstore_id = new_index, mapping
+                handle.save(db)
+        print(f"[rag_utils] rebuilt index as {faiss_index.kind_of(new_index)} ({new_index.ntotal} vectors)")
     except Exception as e:
-        print(f"[rag_utils] Failed to load vectorstore: {e}")
-        return []
-    docs_and_scores = db.similarity_search_with_score(query, k=k)
-    return docs_and_scores
+        print(f"[rag_utils] index rebuild failed: {e}")
+    finally:
+        handle.rebuilding = False
+
+
+def schedule_index_rebuild(handle: VectorStoreHandle, kind: Optional[str] = None, background: bool = True) -> Optional[str]:
+    """
+    Rebuild the index as `kind`, or as the kind RAG_INDEX_TYPE selects for
+    its current size. Returns the target kind, or None if nothing to do.
+    """
+    from utils import faiss_index
+    with handle.lock:
+        db = handle.get()
+        if db is None:
+            return None
+        target = kind or faiss_index.should_rebuild(db.index)
+        if not target or handle.rebuilding:
+            return None
+        handle.rebuilding = True
+    if background:
+        threading.Thread(target=_rebuild_index, args=(handle, target), name="faiss-rebuild", daemon=True).start()
+    else:
+        _rebuild_index(handle, target)
+    return target
+
+
+def purge_sources(sources: Iterable[str], persist_directory: Optional[str] = VECTOR_STORE_DIR) -> int:
+    """Remove all chunks of the given source files from the index. Returns chunks removed."""
+    handle = get_vector_store_handle(persist_directory)
+    with handle.write_lock:
+        db = handle.get(writable=True)
+        if db is None:
+            return 0
+        manifest = load_manifest(persist_directory)
+        ids = []
+        for source in sources:
+            entry = manifest["files"].pop(str(source), None)
+            if entry:
+                ids.extend(entry.get("chunk_ids", []))
+        with handle.lock:
+            present = set(db.index_to_docstore_id.values())
+        ids = [cid for cid in ids if cid in present]
+        if ids:
+            from utils import faiss_index
+            # Build the replacement index outside the handle lock; the write
+            # lock keeps other writers out until it is swapped in.
+            replacement = faiss_index.plan_delete(db, ids)
+            with handle.lock:
+                faiss_index.delete_from_store(db, ids, replacement)
+        handle.keywords.delete(ids)
+        _persist(handle, db if ids else None, manifest, persist_directory)
+    return len(ids)
+
+
+def list_indexed_sources(persist_directory: Optional[str] = VECTOR_STORE_DIR) -> List[str]:
+    return sorted(load_manifest(persist_directory)["files"].keys())
+
+def _chunk_id_of(doc: Document) -> str:
+    # Chunks indexed through the manifest use content-hash ids; older ones may carry doc.id.
+    return getattr(doc, "id", None) or _sha256(str(doc.metadata.get("source", "")) + "\x00" + doc.page_content)
+
+
+def _ensure_keyword_index(handle: VectorStoreHandle, db):
+    """Build the BM25 index from the docstore for stores created before it existed."""
+    if len(handle.keywords) or not db.index_to_docstore_id:
+        return
+    if not handle.write_lock.acquire(blocking=False):
+        return  # an indexer is running; it maintains the keyword index itself
+    try:
+        with handle.lock:
+            items = []
+            for cid in db.index_to_docstore_id.values():
+                doc = db.docstore.search(cid)
+                if isinstance(doc, Document):
+                    items.append((cid, doc.page_content))
+        handle.keywords.add(items)
+    finally:
+        handle.write_lock.release()
+
+
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="rag-search")
+
+
+def _submit(fn, *args):
+    # Run in the pool with the caller's context so spans join the caller's trace.
+    return _search_pool.submit(contextvars.copy_context().run, fn, *args)
+
+
+def _dense_search(handle: VectorStoreHandle, db, query: str, k: int):
+    # Embed outside the lock; only the FAISS lookup needs it.
+    with tracing.span("rag.embed_query"):
+        vector = handle.embeddings.embed_query(query)
+    with tracing.span("rag.faiss_search"), handle.lock:
+        return db.similarity_search_with_score_by_vector(vector, k=k)
+
+
+def _keyword_search(handle: VectorStoreHandle, query: str, k: int):
+    with tracing.span("rag.keyword_search"):
+        return handle.keywords.search(query, k)
+
+
+@tracing.traced("rag.query")
+def query_vector_store(query: str, k=4, persist_directory: Optional[str] = VECTOR_STORE_DIR, hybrid: bool = RAG_HYBRID, collections: Optional[Iterable[str]] = None):
+    """
+    Top-k (Document, L2 distance) hits, closest first. With `hybrid`, dense
+    and BM25 retrieval run in parallel and are fused with reciprocal rank
+    fusion; keyword-only hits carry a distance of None. `collections` scopes
+    the search to those named collections instead of `persist_directory`.
+    """
+    if collections is None:
+        return _query_store(query, k, persist_directory, hybrid)
+    names = list(dict.fromkeys(collections))
+    if len(names) == 1:
+        return _query_store(query, k, collection_dir(names[0]), hybrid)
+    per_collection = {name: _query_store(query, k, collection_dir(name), hybrid) for name in names}
+    if not hybrid:
+        hits = [hit for results in per_collection.values() for hit in results]
+        return sorted(hits, key=lambda h: h[1])[:k]
+    # BM25 scores aren't comparable across collections; fuse by rank instead.
+    by_key = {}
+    rankings = []
+    for name, results in per_collection.items():
+        ranking = []
+        for doc, score in results:
+            key = (name, _chunk_id_of(doc))
+            by_key[key] = (doc, score)
+            ranking.append(key)
+        rankings.append(ranking)
+    return [by_key[key] for key, _ in reciprocal_rank_fusion(rankings, k=RAG_RRF_K)[:k]]
+
+
+def _query_store(query: str, k: int, persist_directory: str, hybrid: bool):
+    handle = _acquire_reader(persist_directory)
+    try:
+        return _query_handle(handle, query, k, hybrid)
+    finally:
+        _release_reader(handle)
+
+
+def _query_handle(handle: VectorStoreHandle, query: str, k: int, hybrid: bool):
+    with handle.lock:
+        try:
+            with tracing.span("rag.load"):
+                db = handle.get()
+        except Exception as e:
+            print(f"[rag_utils] Failed to load vectorstore: {e}")
+            return []
+        if db is None:
+            return []
+    if not hybrid:
+        return _dense_search(handle, db, query, k)
+
+    try:
+        _ensure_keyword_index(handle, db)
+    except Exception as e:
+        print(f"[rag_utils] keyword index unavailable: {e}")
+        return _dense_search(handle, db, query, k)
+    fetch_k = max(2 * k, 10)
+    dense_future = _submit(_dense_search, handle, db, query, fetch_k)
+    keyword_future = _submit(_keyword_search, handle, query, fetch_k)
+    dense = dense_future.result()
+    try:
+        keyword = keyword_future.result()
+    except Exception as e:
+        print(f"[rag_utils] keyword search failed: {e}")
+        keyword = []
+
+    by_id = {_chunk_id_of(doc): (doc, score) for doc, score in dense}
+    fused = reciprocal_rank_fusion([list(by_id), [cid for cid, _ in keyword]], k=RAG_RRF_K)
+    results = []
+    with handle.lock:
+        for cid, _ in fused:
+            if cid in by_id:
+                results.append(by_id[cid])
+            else:
+                doc = db.docstore.search(cid)
+                if isinstance(doc, Document):
+                    results.append((doc, None))
+            if len(results) == k:
+                break
+    return results
@@ -0,0 +1,130 @@
+# utils/response_cache.py
+import re
+import math
+import json
+import hashlib
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence
+from utils.memory import get_conn
+from config.config import RESPONSE_CACHE_TTL_SECONDS, RESPONSE_CACHE_MAX_ENTRIES, RESPONSE_CACHE_SIMILARITY
+
+# Answer cache kept in the chat memory SQLite file. An entry is scoped by the
+# system prompt, the model, the retrieved context chunk ids and the prior
+# conversation turns sent with the question; within a scope
+# a question hits either exactly (normalized text) or by embedding similarity.
+
+def normalize_question(question: str) -> str:
+    q = re.sub(r"\s+", " ", question.strip().lower())
+    return q.rstrip(" ?!.")
+
+
+def _sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def context_ids_for(docs) -> List[str]:
+    """Stable ids of retrieved chunks: the docstore id if set, else a content hash."""
+    return [getattr(d, "id", None) or _sha256(d.page_content) for d in docs]
+
+
+def make_scope(system_prompt: str, model: str, context_ids: Sequence[str], history: Sequence[Dict] = ()) -> str:
+    """`history` is the list of prior messages sent ahead of the question; a follow-up only hits answers given after the same turns."""
+    turns = [[m["role"], m["content"]] for m in history]
+    return _sha256(json.dumps([system_prompt, model, sorted(context_ids), _sha256(json.dumps(turns))]))
+
+
+def _pack(vec: Optional[List[float]]) -> Optional[bytes]:
+    return array("f", vec).tobytes() if vec is not None else None
+
+
+def _unpack(blob: bytes) -> List[float]:
+    arr = array("f")
+    arr.frombytes(blob)
+    return arr.tolist()
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    na = math.sqrt(sum(x * x for x in a))
+    nb = math.sqrt(sum(y * y for y in b))
+    return dot / (na * nb) if na and nb else 0.0
+
+
+def _bump(conn, name: str):
+    conn.execute(
+        "INSERT INTO response_cache_stats (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+        (name,),
+    )
+
+
+def lookup(question: str, scope: str, embedding: Optional[List[float]] = None, threshold: float = RESPONSE_CACHE_SIMILARITY, ttl: int = RESPONSE_CACHE_TTL_SECONDS) -> Optional[Dict]:
+    """
+    Return {"answer", "match", "similarity"} for a cached answer, or None.
+    `embedding` enables similarity matching; without it only exact hits count.
+    """
+    norm = normalize_question(question)
+    key = _sha256(scope + "\x00" + norm)
+    now = time.time()
+    conn = get_conn()
+    conn.execute("DELETE FROM response_cache WHERE created_at < ?", (now - ttl,))
+    row = conn.execute("SELECT answer FROM response_cache WHERE key = ?", (key,)).fetchone()
+    hit = None
+    if row:
+        hit = {"answer": row[0], "match": "exact", "similarity": 1.0, "key": key}
+    elif embedding is not None:
+        best, best_key, best_answer = threshold, None, None
+        for k, blob, answer in conn.execute(
+            "SELECT key, embedding, answer FROM response_cache WHERE scope = ? AND embedding IS NOT NULL", (scope,)
+        ):
+            sim = _cosine(embedding, _unpack(blob))
+            if sim >= best:
+                best, best_key, best_answer = sim, k, answer
+        if best_key is not None:
+            hit = {"answer": best_answer, "match": "semantic", "similarity": best, "key": best_key}
+    if hit:
+        conn.execute("UPDATE response_cache SET last_used = ? WHERE key = ?", (now, hit["key"]))
+        _bump(conn, f"hit_{hit['match']}")
+    else:
+        _bump(conn, "miss")
+    conn.commit()
+    return hit
+
+
+def store(question: str, scope: str, answer: str, embedding: Optional[List[float]] = None, max_entries: int = RESPONSE_CACHE_MAX_ENTRIES):
+    norm = normalize_question(question)
+    key = _sha256(scope + "\x00" + norm)
+    now = time.time()
+    conn = get_conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO response_cache (key, scope, question, embedding, answer, created_at, last_used) VALUES (?, ?, ?, ?, ?, ?, ?)",
+        (key, scope, norm, _pack(embedding), answer, now, now),
+    )
+    count = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    if count > max_entries:
+        conn.execute(
+            "DELETE FROM response_cache WHERE key IN (SELECT key FROM response_cache ORDER BY last_used ASC LIMIT ?)",
+            (count - max_entries,),
+        )
+    conn.commit()
+
+
+def stats() -> Dict:
+    conn = get_conn()
+    counters = dict(conn.execute("SELECT name, value FROM response_cache_stats").fetchall())
+    entries = conn.execute("SELECT COUNT(*) FROM response_cache").fetchone()[0]
+    hits = counters.get("hit_exact", 0) + counters.get("hit_semantic", 0)
+    lookups = hits + counters.get("miss", 0)
+    return {
+        "entries": entries,
+        "hits_exact": counters.get("hit_exact", 0),
+        "hits_semantic": counters.get("hit_semantic", 0),
+        "misses": counters.get("miss", 0),
+        "hit_rate": hits / lookups if lookups else 0.0,
+    }
+
+
+def clear():
+    conn = get_conn()
+    conn.execute("DELETE FROM response_cache")
+    conn.commit()
@@ -0,0 +1,203 @@
+# utils/tracing.py
+import time
+import uuid
+import inspect
+import threading
+import functools
+import contextvars
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+from config.config import TRACING_ENABLED, TRACING_FLUSH_INTERVAL, TRACING_RECENT_SPANS
+
+# Lightweight request tracing. `span()` / `@traced` time a stage; nested spans
+# share the trace id of the outermost one (e.g. a chat turn). Durations feed
+# per-stage histograms that are aggregated in memory and added to SQLite in
+# the background every TRACING_FLUSH_INTERVAL seconds, so they survive
+# restarts and sum across processes. The last TRACING_RECENT_SPANS spans are
+# kept in memory for per-request breakdowns.
+
+# Upper bounds (seconds) of the histogram buckets; the last one is +Inf.
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, float("inf"))
+
+_current = contextvars.ContextVar("trace_span", default=None)
+_lock = threading.Lock()
+_pending: Dict[str, List[int]] = {}
+_pending_sum: Dict[str, float] = {}
+_recent = deque(maxlen=TRACING_RECENT_SPANS)
+_flusher = None
+
+
+def _connect():
+    # Imported here: utils.memory itself uses @traced. Tables come from memory.MIGRATIONS.
+    from utils.memory import get_conn
+    return get_conn()
+
+
+def record(stage: str, seconds: float):
+    """Add one observation to a stage's histogram."""
+    if not TRACING_ENABLED:
+        return
+    with _lock:
+        counts = _pending.get(stage)
+        if counts is None:
+            counts = _pending[stage] = [0] * len(BUCKETS)
+        counts[bisect_left(BUCKETS, seconds)] += 1
+        _pending_sum[stage] = _pending_sum.get(stage, 0.0) + seconds
+    _ensure_flusher()
+
+
+@contextmanager
+def span(stage: str, **attrs):
+    """Time the enclosed block as `stage`; yields a dict for extra attributes."""
+    if not TRACING_ENABLED:
+        yield attrs
+        return
+    parent = _current.get()
+    trace_id = parent["trace_id"] if parent else uuid.uuid4().hex[:16]
+    current = {"trace_id": trace_id, "span_id": uuid.uuid4().hex[:8], "parent_id": parent["span_id"] if parent else None}
+    token = _current.set(current)
+    start_wall, t0 = time.time(), time.perf_counter()
+    error = None
+    try:
+        yield attrs
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        duration = time.perf_counter() - t0
+        _current.reset(token)
+        record(stage, duration)
+        _recent.append({**current, "stage": stage, "start": start_wall, "duration_s": duration, "error": error, "attrs": attrs})
+
+
+def traced(stage: Optional[str] = None):
+    """Decorator form of `span`; works on plain and async functions."""
+    def decorate(fn):
+        name = stage or f"{fn.__module__}.{fn.__qualname__}"
+        if inspect.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def current_trace_id() -> Optional[str]:
+    cur = _current.get()
+    return cur["trace_id"] if cur else None
+
+
+def recent_spans(trace_id: Optional[str] = None) -> List[Dict]:
+    spans = list(_recent)
+    return [s for s in spans if s["trace_id"] == trace_id] if trace_id else spans
+
+
+def flush():
+    """Add pending observations to SQLite."""
+    with _lock:
+        pending, sums = dict(_pending), dict(_pending_sum)
+        _pending.clear()
+        _pending_sum.clear()
+    if not pending:
+        return
+    rows = [(stage, i, n) for stage, counts in pending.items() for i, n in enumerate(counts) if n]
+    totals = [(stage, sum(counts), sums.get(stage, 0.0)) for stage, counts in pending.items()]
+    conn = _connect()
+    conn.executemany(
+        "INSERT INTO trace_histograms (stage, bucket, count) VALUES (?, ?, ?) ON CONFLICT(stage, bucket) DO UPDATE SET count = count + excluded.count",
+        rows,
+    )
+    conn.executemany(
+        "INSERT INTO trace_stage_totals (stage, count, total) VALUES (?, ?, ?) ON CONFLICT(stage) DO UPDATE SET count = count + excluded.count, total = total + excluded.total",
+        totals,
+    )
+    conn.commit()
+
+
+def _flush_loop():
+    while True:
+        time.sleep(TRACING_FLUSH_INTERVAL)
+        try:
+            flush()
+        except Exception as e:
+            print(f"[tracing] flush failed: {e}")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None:
+        with _lock:
+            if _flusher is None:
+                _flusher = threading.Thread(target=_flush_loop, name="tracing-flush", daemon=True)
+                _flusher.start()
+
+
+def _quantile(counts: List[int], q: float) -> Optional[float]:
+    """Estimate a quantile from bucket counts, interpolating inside the bucket."""
+    total = sum(counts)
+    if not total:
+        return None
+    rank = q * total
+    seen = 0
+    for i, n in enumerate(counts):
+        if n and seen + n >= rank:
+            lo = BUCKETS[i - 1] if i else 0.0
+            hi = BUCKETS[i] if BUCKETS[i] != float("inf") else lo
+            return lo + (hi - lo) * (rank - seen) / n
+        seen += n
+    return BUCKETS[-2]
+
+
+def histograms() -> Dict[str, Dict]:
+    """Per stage: bucket counts, count, sum and p50/p95/p99 estimates (seconds)."""
+    flush()
+    conn = _connect()
+    rows = conn.execute("SELECT stage, bucket, count FROM trace_histograms").fetchall()
+    totals = conn.execute("SELECT stage, count, total FROM trace_stage_totals").fetchall()
+    out: Dict[str, Dict] = {}
+    for stage, count, total in totals:
+        out[stage] = {"buckets": [0] * len(BUCKETS), "count": count, "sum": total}
+    for stage, bucket, count in rows:
+        if stage in out and 0 <= bucket < len(BUCKETS):
+            out[stage]["buckets"][bucket] = count
+    for h in out.values():
+        for q in (0.5, 0.95, 0.99):
+            h[f"p{round(q * 100)}"] = _quantile(h["buckets"], q)
+    return dict(sorted(out.items()))
+
+
+def export_json() -> Dict:
+    return {"buckets": [b if b != float("inf") else "+Inf" for b in BUCKETS], "stages": histograms()}
+
+
+def export_prometheus(metric: str = "neostats_stage_duration_seconds") -> str:
+    lines = [f"# HELP {metric} Duration of chat pipeline stages.", f"# TYPE {metric} histogram"]
+    for stage, h in histograms().items():
+        cumulative = 0
+        for le, n in zip(BUCKETS, h["buckets"]):
+            cumulative += n
+            le_label = "+Inf" if le == float("inf") else repr(le)
+            lines.append(f'{metric}_bucket{{stage="{stage}",le="{le_label}"}} {cumulative}')
+        lines.append(f'{metric}_sum{{stage="{stage}"}} {h["sum"]}')
+        lines.append(f'{metric}_count{{stage="{stage}"}} {h["count"]}')
+    return "\n".join(lines) + "\n"
+
+
+def reset():
+    with _lock:
+        _pending.clear()
+        _pending_sum.clear()
+        _recent.clear()
+    conn = _connect()
+    conn.execute("DELETE FROM trace_histograms")
+    conn.execute("DELETE FROM trace_stage_totals")
+    conn.commit()
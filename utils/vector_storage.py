@@ -0,0 +1,260 @@
+# utils/vector_storage.py
+import os
+import json
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Tuple, Union
+
+import faiss
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+
+# On-disk layout of the "sqlite" storage format:
+#   index.<version>.faiss  raw FAISS index of one saved version, opened with
+#                          IO_FLAG_MMAP | IO_FLAG_MMAP_IFC so replicas share
+#                          the vector pages
+#   docstore.sqlite        chunk text + metadata, the position -> chunk id map
+#                          per version, and the current version (store_meta)
+#   store.version          copy of the current version number; the cheap
+#                          reload stamp, written after the commit
+# A save writes the new index file first and then switches the version,
+# positions and deletes in one SQLite transaction, which is the only commit
+# point: a reader (or a crash) sees either the old version or the new one.
+# Rows and index files of older versions are kept for KEEP_VERSIONS saves so
+# processes still serving the previous version can resolve their ids.
+# The legacy "pickle" format is FAISS.save_local's index.faiss + index.pkl;
+# index.faiss without a version is also how sqlite stores were first written.
+INDEX_FILE = "index.faiss"
+PICKLE_FILE = "index.pkl"
+DOCSTORE_FILE = "docstore.sqlite"
+VERSION_FILE = "store.version"
+KEEP_VERSIONS = 2
+
+
+def index_file(version: int) -> str:
+    return f"index.{version}.faiss"
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Chunk text and metadata in SQLite instead of a pickled dict. Deletes are
+    recorded at `commit()` as the version they stop being part of; the rows
+    themselves are removed once no retained version can reference them.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS chunks (chunk_id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, chunk_id TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS store_positions (
+                version INTEGER NOT NULL,
+                position INTEGER NOT NULL,
+                chunk_id TEXT NOT NULL,
+                PRIMARY KEY (version, position)
+            ) WITHOUT ROWID;
+            CREATE TABLE IF NOT EXISTS store_meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(chunks)")}
+        if "deleted_version" not in columns:
+            self._conn.execute("ALTER TABLE chunks ADD COLUMN deleted_version INTEGER")
+        self._pending_deletes = set()
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        # Rows nothing references yet are harmless, so adds commit right away.
+        rows = [(cid, doc.page_content, json.dumps(doc.metadata, default=str)) for cid, doc in texts.items()]
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, content, metadata, deleted_version) VALUES (?, ?, ?, NULL)", rows
+            )
+            self._pending_deletes.difference_update(texts)
+
+    def delete(self, ids: List) -> None:
+        with self._lock:
+            self._pending_deletes.update(ids)
+
+    def search(self, search: str) -> Union[str, Document]:
+        with self._lock:
+            if search in self._pending_deletes:
+                return f"ID {search} not found."
+            row = self._conn.execute("SELECT content, metadata FROM chunks WHERE chunk_id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def current(self) -> Tuple[int, str, Dict[int, str]]:
+        """(version, index file name, position map) of the committed version, read consistently."""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                row = self._conn.execute("SELECT value FROM store_meta WHERE key = 'version'").fetchone()
+                if row is None:
+                    # Store written before versioned index files.
+                    version, name = 0, INDEX_FILE
+                    positions = self._conn.execute("SELECT position, chunk_id FROM positions").fetchall()
+                else:
+                    version = int(row[0])
+                    name = index_file(version)
+                    positions = self._conn.execute(
+                        "SELECT position, chunk_id FROM store_positions WHERE version = ?", (version,)
+                    ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        return version, name, dict(positions)
+
+    def commit(self, version: int, index_to_docstore_id: Dict[int, str]):
+        """
+        Make `version` current: its position map, the held-back deletes and
+        the version pointer in one transaction. The index file for `version`
+        must already be on disk.
+        """
+        with self._lock:
+            ids = list(self._pending_deletes)
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO store_positions (version, position, chunk_id) VALUES (?, ?, ?)",
+                    [(version, pos, cid) for pos, cid in index_to_docstore_id.items()],
+                )
+                for i in range(0, len(ids), 500):
+                    part = ids[i:i + 500]
+                    self._conn.execute(
+                        f"UPDATE chunks SET deleted_version = ? WHERE chunk_id IN ({','.join('?' * len(part))})", [version, *part]
+                    )
+                self._conn.execute("INSERT OR REPLACE INTO store_meta (key, value) VALUES ('version', ?)", (str(version),))
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._pending_deletes.clear()
+
+    def prune(self, version: int) -> int:
+        """Drop rows only versions older than the last KEEP_VERSIONS can reference. Returns the oldest kept version."""
+        oldest = version - KEEP_VERSIONS + 1
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.execute("DELETE FROM store_positions WHERE version < ?", (oldest,))
+                self._conn.execute("DELETE FROM chunks WHERE deleted_version IS NOT NULL AND deleted_version <= ?", (oldest,))
+                self._conn.execute("DELETE FROM positions")
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return oldest
+
+    def positions(self) -> Dict[int, str]:
+        return self.current()[2]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def store_format(persist_directory: str) -> Optional[str]:
+    if os.path.exists(os.path.join(persist_directory, DOCSTORE_FILE)) and os.path.exists(os.path.join(persist_directory, VERSION_FILE)):
+        return "sqlite"
+    if os.path.exists(os.path.join(persist_directory, INDEX_FILE)) and os.path.exists(os.path.join(persist_directory, PICKLE_FILE)):
+        return "pickle"
+    return None
+
+
+def stamp(persist_directory: str) -> Optional[Tuple]:
+    """Cheap version stamp of a persisted store, or None if there is none."""
+    fmt = store_format(persist_directory)
+    if fmt is None:
+        return None
+    names = (VERSION_FILE,) if fmt == "sqlite" else (INDEX_FILE, PICKLE_FILE)
+    out = [fmt]
+    for name in names:
+        try:
+            st = os.stat(os.path.join(persist_directory, name))
+        except OSError:
+            return None
+        out.append((st.st_mtime_ns, st.st_size))
+    return tuple(out)
+
+
+def _vectors_mapped(index) -> bool:
+    """
+    Whether a read with the mmap flags left the vector data file-backed:
+    IO_FLAG_MMAP maps IVF inverted lists, IO_FLAG_MMAP_IFC (faiss >= 1.10)
+    the codes of flat indexes, including HNSW's flat storage. An HNSW graph
+    is always read into private memory; it is small next to the vectors.
+    """
+    from utils import faiss_index
+    return faiss_index.kind_of(index).startswith("ivf") or hasattr(faiss, "IO_FLAG_MMAP_IFC")
+
+
+def _read_index(path: str, mmap: bool):
+    """Returns (index, mmapped); mmapped only if the vectors are actually mapped."""
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            index = faiss.read_index(path, flags)
+            return index, _vectors_mapped(index)
+        except RuntimeError as e:
+            print(f"[vector_storage] mmap load failed, reading into memory: {e}")
+    return faiss.read_index(path), False
+
+
+def load_store(persist_directory: str, embeddings, mmap: bool = True) -> Tuple[FAISS, bool]:
+    """Open a sqlite-format store. Returns (FAISS store, whether the index is memory-mapped)."""
+    docstore = SQLiteDocstore(os.path.join(persist_directory, DOCSTORE_FILE))
+    for attempt in range(3):
+        version, name, positions = docstore.current()
+        try:
+            index, mmapped = _read_index(os.path.join(persist_directory, name), mmap)
+        except RuntimeError:
+            # Pruned by saves that landed between reading the version and the file.
+            if attempt == 2:
+                raise
+            continue
+        return FAISS(embeddings, index, docstore, positions), mmapped
+
+
+def _to_sqlite_docstore(db: FAISS, persist_directory: str) -> SQLiteDocstore:
+    """Move an in-memory (e.g. freshly created or unpickled) docstore into SQLite."""
+    docstore = SQLiteDocstore(os.path.join(persist_directory, DOCSTORE_FILE))
+    docs = {}
+    for cid in db.index_to_docstore_id.values():
+        doc = db.docstore.search(cid)
+        if isinstance(doc, Document):
+            docs[cid] = doc
+    docstore.add(docs)
+    return docstore
+
+
+def save_store(db: FAISS, persist_directory: str):
+    """
+    Persist `db` in the sqlite format as a new version. The version switch in
+    SQLite is the commit point; a legacy index.pkl is removed afterwards.
+    """
+    os.makedirs(persist_directory, exist_ok=True)
+    if not isinstance(db.docstore, SQLiteDocstore):
+        db.docstore = _to_sqlite_docstore(db, persist_directory)
+    version = db.docstore.current()[0] + 1
+    path = os.path.join(persist_directory, index_file(version))
+    faiss.write_index(db.index, path + ".tmp")
+    os.replace(path + ".tmp", path)
+    db.docstore.commit(version, db.index_to_docstore_id)
+    with open(os.path.join(persist_directory, VERSION_FILE + ".tmp"), "w", encoding="utf-8") as f:
+        f.write(str(version))
+    os.replace(os.path.join(persist_directory, VERSION_FILE + ".tmp"), os.path.join(persist_directory, VERSION_FILE))
+
+    oldest = db.docstore.prune(version)
+    for name in os.listdir(persist_directory):
+        parts = name.split(".")
+        if len(parts) == 3 and parts[0] == "index" and parts[2] == "faiss" and parts[1].isdigit() and int(parts[1]) < oldest:
+            os.remove(os.path.join(persist_directory, name))
+    # Pre-versioning files; processes that had them open keep their mapping.
+    for name in (PICKLE_FILE, INDEX_FILE):
+        legacy = os.path.join(persist_directory, name)
+        if os.path.exists(legacy):
+            os.remove(legacy)
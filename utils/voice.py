@@ -1,10 +1,11 @@
 # utils/voice.py
+import io
 import os
-import tempfile
 from config.config import OPENAI_API_KEY
-# FIX: Import the OpenAI client
-from openai import OpenAI
+from models.llm import get_openai_client
+from utils.tracing import traced
 
+@traced("audio.transcribe")
 def transcribe_with_openai(file_bytes: bytes, filename: str = "audio.wav"):
     """
     Transcribe audio file using OpenAI Whisper API.
@@ -13,24 +14,14 @@ def transcribe_with_openai(file_bytes: bytes, filename: str = "audio.wav"):
     if not OPENAI_API_KEY:
         return {"error": "OPENAI_API_KEY missing."}
     try:
-        # FIX: Instantiate the client with the API key
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        
-        # save temp file
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(filename)[1] or ".wav")
-        tmp.write(file_bytes)
-        tmp.flush()
-        tmp.close()
-        
-        with open(tmp.name, "rb") as fh:
-            # FIX: Use the modern client method for transcriptions
-            resp = client.audio.transcriptions.create(model="whisper-1", file=fh)
-            text = resp.text
-            
-        try:
-            os.unlink(tmp.name)
-        except Exception:
-            pass
+        # Shared client: keeps the HTTP connection pool warm between calls.
+        client = get_openai_client()
+
+        # Upload straight from memory; the name tells Whisper the audio format.
+        buf = io.BytesIO(file_bytes)
+        buf.name = filename if os.path.splitext(filename)[1] else filename + ".wav"
+        resp = client.audio.transcriptions.create(model="whisper-1", file=buf)
+        text = resp.text
         return {"text": text}
     except Exception as e:
         return {"error": str(e)}
@@ -1,17 +1,162 @@
 # utils/voice_tts.py
-from gtts import gTTS
-import tempfile
+import io
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Iterator, List, Optional
+from utils.tracing import traced
+from config.config import TTS_CACHE_DB, TTS_CACHE_MAX_BYTES, TTS_SEGMENT_CHARS
 
-def synthesize_text_to_mp3(text: str, lang: str = "en") -> str:
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+|\n{2,}")
+
+
+def split_sentences(text: str, max_chars: int = TTS_SEGMENT_CHARS) -> List[str]:
+    """
+    Group sentences into segments of at most `max_chars`. The first segment is
+    a single sentence so playback of long replies can start early.
+    """
+    sentences = [s.strip() for s in _SENTENCE_END.split(text) if s and s.strip()]
+    segments: List[str] = []
+    for sentence in sentences:
+        if len(segments) > 1 and len(segments[-1]) + 1 + len(sentence) <= max_chars:
+            segments[-1] += " " + sentence
+        else:
+            segments.append(sentence)
+    return segments
+
+
+class TTSCache:
+    """
+    MP3 bytes per (language, sha256(text)) in SQLite, evicting least recently
+    used entries once the total size exceeds `max_bytes`.
+    """
+
+    def __init__(self, db_path: str = TTS_CACHE_DB, max_bytes: int = TTS_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS tts_audio (
+                key TEXT PRIMARY KEY,
+                lang TEXT NOT NULL,
+                audio BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                last_used REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_tts_audio_last_used ON tts_audio(last_used)")
+        self._conn.commit()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(text: str, lang: str) -> str:
+        return hashlib.sha256(f"{lang}\x00{text}".encode("utf-8")).hexdigest()
+
+    def get(self, text: str, lang: str) -> Optional[bytes]:
+        key = self.key(text, lang)
+        with self._lock:
+            row = self._conn.execute("SELECT audio FROM tts_audio WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE tts_audio SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+            return row[0]
+
+    def put(self, text: str, lang: str, audio: bytes):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO tts_audio (key, lang, audio, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (self.key(text, lang), lang, audio, len(audio), time.time()),
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM tts_audio").fetchone()[0]
+            if total > self.max_bytes:
+                excess = total - self.max_bytes
+                victims, freed = [], 0
+                for key, size in self._conn.execute("SELECT key, size FROM tts_audio ORDER BY last_used"):
+                    if freed >= excess:
+                        break
+                    victims.append((key,))
+                    freed += size
+                self._conn.executemany("DELETE FROM tts_audio WHERE key = ?", victims)
+            self._conn.commit()
+
+    def stats(self):
+        with self._lock:
+            entries, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM tts_audio").fetchone()
+        return {"entries": entries, "bytes": size, "hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_tts_cache() -> TTSCache:
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            _cache = TTSCache()
+        return _cache
+
+
+def _synthesize(text: str, lang: str) -> bytes:
+    from gtts import gTTS
+    buf = io.BytesIO()
+    gTTS(text=text, lang=lang).write_to_fp(buf)
+    return buf.getvalue()
+
+
+@traced("audio.tts_segment")
+def synthesize_segment(text: str, lang: str = "en") -> bytes:
+    """MP3 bytes for one segment, from the cache when already synthesized."""
+    cache = get_tts_cache()
+    audio = cache.get(text, lang)
+    if audio is None:
+        try:
+            audio = _synthesize(text, lang)
+        except Exception as e:
+            raise RuntimeError(f"TTS synthesis failed: {e}")
+        cache.put(text, lang, audio)
+    return audio
+
+
+def synthesize_stream(text: str, lang: str = "en") -> Iterator[bytes]:
+    """Yield MP3 bytes segment by segment; concatenated they play as one file."""
+    for segment in split_sentences(text):
+        yield synthesize_segment(segment, lang)
+
+
+def cached_segments(text: str, lang: str = "en") -> List[bytes]:
+    """MP3 bytes of the leading segments that are already synthesized, in order."""
+    cache = get_tts_cache()
+    out = []
+    for segment in split_sentences(text):
+        audio = cache.get(segment, lang)
+        if audio is None:
+            break
+        out.append(audio)
+    return out
+
+
+def cached_reply(text: str, lang: str = "en") -> Optional[bytes]:
+    """The whole reply's MP3 if every segment is cached, else None."""
+    segments = split_sentences(text)
+    ready = cached_segments(text, lang)
+    return b"".join(ready) if segments and len(ready) == len(segments) else None
+
+
+@traced("audio.tts")
+def synthesize_text_to_mp3(text: str, lang: str = "en") -> bytes:
     """
-    Convert text to speech using gTTS and return path to generated MP3 file.
+    Convert text to speech using gTTS and return the MP3 bytes.
     """
-    try:
-        tts = gTTS(text=text, lang=lang)
-        tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".mp3")
-        tmp_path = tmp.name
-        tmp.close()
-        tts.save(tmp_path)
-        return tmp_path
-    except Exception as e:
-        raise RuntimeError(f"TTS synthesis failed: {e}")
+    if not text.strip():
+        raise RuntimeError("TTS synthesis failed: no text to speak")
+    return b"".join(synthesize_stream(text, lang))
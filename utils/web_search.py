@@ -1,45 +1,181 @@
 # utils/web_search.py
-from config.config import SERPAPI_KEY, GOOGLE_CSE_KEY, GOOGLE_CX
-import requests
+import re
+import json
+import time
+import asyncio
+import hashlib
+import threading
+from typing import Dict, List, Optional
+from config.config import (
+    SERPAPI_KEY, GOOGLE_CSE_KEY, GOOGLE_CX, SERPAPI_URL, GOOGLE_CSE_URL,
+    WEB_SEARCH_TIMEOUT, WEB_SEARCH_RACE, WEB_SEARCH_CACHE_TTL_SECONDS, WEB_SEARCH_CACHE_MAX_ENTRIES,
+)
+from models.http_pool import get_async_http_client, run_async
+from utils.memory import get_conn
+from utils.tracing import traced
 
-def serpapi_search(query: str, num_results: int = 3):
+# Provider calls are coroutines on the shared http_pool loop, so they reuse its
+# keep-alive connections. They are private because the async client is bound
+# to that loop; callers use the sync wrappers, which marshal onto it.
+# Successful results are cached in the chat memory SQLite file by normalized
+# query, for WEB_SEARCH_CACHE_TTL_SECONDS.
+
+# Guards the hit/miss counters; SQLite access uses memory's per-thread connections.
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0}
+
+
+def normalize_query(query: str) -> str:
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+
+def _cache_key(query: str, num_results: int) -> str:
+    return hashlib.sha256(f"{num_results}\x00{normalize_query(query)}".encode("utf-8")).hexdigest()
+
+
+def _cache_get(query: str, num_results: int) -> Optional[Dict]:
+    row = get_conn().execute(
+        "SELECT provider, results FROM web_search_cache WHERE key = ? AND created_at >= ?",
+        (_cache_key(query, num_results), time.time() - WEB_SEARCH_CACHE_TTL_SECONDS),
+    ).fetchone()
+    with _lock:
+        _stats["hits" if row else "misses"] += 1
+    if row is None:
+        return None
+    return {"results": json.loads(row[1]), "provider": row[0], "cached": True}
+
+
+def _cache_put(query: str, num_results: int, res: Dict):
+    conn = get_conn()
+    conn.execute(
+        "INSERT OR REPLACE INTO web_search_cache (key, query, provider, results, created_at) VALUES (?, ?, ?, ?, ?)",
+        (_cache_key(query, num_results), normalize_query(query), res.get("provider", ""), json.dumps(res["results"]), time.time()),
+    )
+    conn.execute("DELETE FROM web_search_cache WHERE created_at < ?", (time.time() - WEB_SEARCH_CACHE_TTL_SECONDS,))
+    conn.execute(
+        "DELETE FROM web_search_cache WHERE key IN (SELECT key FROM web_search_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+        (WEB_SEARCH_CACHE_MAX_ENTRIES,),
+    )
+    conn.commit()
+
+
+def cache_stats() -> Dict:
+    entries = get_conn().execute("SELECT COUNT(*) FROM web_search_cache").fetchone()[0]
+    with _lock:
+        return {**_stats, "entries": entries}
+
+
+def clear_cache():
+    conn = get_conn()
+    conn.execute("DELETE FROM web_search_cache")
+    conn.commit()
+
+
+async def _get_json(url: str, params: Dict) -> Dict:
+    resp = await get_async_http_client().get(url, params=params, timeout=WEB_SEARCH_TIMEOUT)
+    resp.raise_for_status()
+    return resp.json()
+
+
+@traced("web_search.serpapi")
+async def _aserpapi_search(query: str, num_results: int = 3):
     if not SERPAPI_KEY:
         return {"error": "SERPAPI_KEY not set."}
     try:
         params = {"engine": "google", "q": query, "api_key": SERPAPI_KEY, "num": num_results}
-        resp = requests.get("https://serpapi.com/search", params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = await _get_json(SERPAPI_URL, params)
         results = []
         for r in data.get("organic_results", [])[:num_results]:
             snippet = r.get("snippet") or r.get("title")
             link = r.get("link")
             results.append({"title": r.get("title"), "snippet": snippet, "link": link})
-        return {"results": results}
+        return {"results": results, "provider": "serpapi"}
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e) or type(e).__name__}
 
-def google_cse_search(query: str, num_results: int = 3):
+
+@traced("web_search.google_cse")
+async def _agoogle_cse_search(query: str, num_results: int = 3):
     if not (GOOGLE_CSE_KEY and GOOGLE_CX):
         return {"error": "GOOGLE_CSE_KEY or GOOGLE_CX not set."}
     try:
         params = {"key": GOOGLE_CSE_KEY, "cx": GOOGLE_CX, "q": query, "num": num_results}
-        resp = requests.get("https://www.googleapis.com/customsearch/v1", params=params, timeout=10)
-        resp.raise_for_status()
-        data = resp.json()
+        data = await _get_json(GOOGLE_CSE_URL, params)
         results = []
         for r in data.get("items", [])[:num_results]:
             snippet = r.get("snippet")
             link = r.get("link")
             title = r.get("title")
             results.append({"title": title, "snippet": snippet, "link": link})
-        return {"results": results}
+        return {"results": results, "provider": "google_cse"}
     except Exception as e:
-        return {"error": str(e)}
+        return {"error": str(e) or type(e).__name__}
+
 
-def web_search(query: str, num_results: int = 3):
+def _providers() -> List:
+    providers = []
     if SERPAPI_KEY:
-        return serpapi_search(query, num_results=num_results)
+        providers.append(_aserpapi_search)
     if GOOGLE_CSE_KEY and GOOGLE_CX:
-        return google_cse_search(query, num_results=num_results)
-    return {"error": "No web search API key configured. Set SERPAPI_KEY or GOOGLE_CSE_KEY+GOOGLE_CX in env."}
+        providers.append(_agoogle_cse_search)
+    return providers
+
+
+def _good(res: Dict) -> bool:
+    return not res.get("error") and bool(res.get("results"))
+
+
+async def _race(providers: List, query: str, num_results: int) -> Dict:
+    """Query every provider at once; the first good answer wins, the rest are cancelled."""
+    tasks = [asyncio.ensure_future(p(query, num_results)) for p in providers]
+    fallback = None
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            res = await next_done
+            if _good(res):
+                return res
+            if fallback is None or (fallback.get("error") and not res.get("error")):
+                fallback = res
+        return fallback
+    finally:
+        for t in tasks:
+            t.cancel()
+
+
+async def _aweb_search(query: str, num_results: int = 3, race: bool = WEB_SEARCH_RACE, use_cache: bool = True):
+    """
+    Search with the configured providers. Sequentially SerpAPI first, falling
+    back to Google CSE on failure; with `race`, both at once. Results carry
+    the "provider" that answered and "cached" when served from the cache.
+    """
+    providers = _providers()
+    if not providers:
+        return {"error": "No web search API key configured. Set SERPAPI_KEY or GOOGLE_CSE_KEY+GOOGLE_CX in env."}
+    if use_cache:
+        cached = await asyncio.get_running_loop().run_in_executor(None, _cache_get, query, num_results)
+        if cached:
+            return cached
+    if race and len(providers) > 1:
+        res = await _race(providers, query, num_results)
+    else:
+        res = None
+        for provider in providers:
+            res = await provider(query, num_results)
+            if _good(res):
+                break
+    if use_cache and _good(res):
+        await asyncio.get_running_loop().run_in_executor(None, _cache_put, query, num_results, res)
+    return res
+
+
+def serpapi_search(query: str, num_results: int = 3):
+    return run_async(_aserpapi_search(query, num_results))
+
+
+def google_cse_search(query: str, num_results: int = 3):
+    return run_async(_agoogle_cse_search(query, num_results))
+
+
+@traced("web_search")
+def web_search(query: str, num_results: int = 3, race: bool = WEB_SEARCH_RACE, use_cache: bool = True):
+    return run_async(_aweb_search(query, num_results, race=race, use_cache=use_cache))